@@ -16,7 +16,9 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from flask import Flask, request, jsonify
 
-from biz.gitlab.webhook_handler import slugify_url
+from biz.github.webhook_handler import PullRequestHandler as GithubPullRequestHandler, github_api_url
+from biz.gitlab.webhook_handler import MergeRequestHandler, slugify_url
+from biz.queue.generation import register_review_generation
 from biz.queue.worker import (
     handle_merge_request_event, handle_merge_request_event_v2, handle_push_event, 
     handle_github_pull_request_event, handle_github_push_event
@@ -24,6 +26,7 @@ from biz.queue.worker import (
 from biz.service.review_service import ReviewService
 from biz.utils.im import notifier
 from biz.utils.log import logger
+from biz.utils.protected_branches import protected_branch_cache
 from biz.utils.queue import handle_queue
 from biz.utils.reporter import Reporter
 
@@ -165,6 +168,8 @@ def handle_github_webhook(event_type, data):
 
     # 处理支持的事件类型
     if event_type == "pull_request":
+        if target_branch_ignored(GithubPullRequestHandler(data, github_token, github_url)):
+            return jsonify({'message': 'Pull Request target branch not match protected branches, ignored.'}), 200
         # 使用handle_queue进行异步处理
         handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug)
         # 立马返回响应
@@ -176,6 +181,10 @@ def handle_github_webhook(event_type, data):
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
+    elif event_type == "branch_protection_rule":
+        # 保护分支规则变更，使该仓库的保护分支缓存立即失效
+        protected_branch_cache.invalidate((github_api_url(), data.get('repository', {}).get('full_name')))
+        return jsonify({'message': 'Protected branch cache invalidated.'}), 200
     else:
         error_message = f'Only pull_request and push events are supported for GitHub webhook, but received: {event_type}.'
         logger.error(error_message)
@@ -213,6 +222,10 @@ def handle_gitlab_webhook(data):
 
     # 处理支持的事件类型
     if object_kind == "merge_request":
+        if target_branch_ignored(MergeRequestHandler(data, gitlab_token, gitlab_url)):
+            return jsonify({'message': 'Merge Request target branch not match protected branches, ignored.'}), 200
+        # 登记该MR最新的 head，正在执行的旧 head 的 review 任务会停止
+        register_merge_request_generation(data, gitlab_url_slug)
         # 创建一个新进程进行异步处理
         handle_queue(handle_merge_request_event_v2, data, gitlab_token, gitlab_url, gitlab_url_slug)
         # 立马返回响应
@@ -231,6 +244,36 @@ def handle_gitlab_webhook(data):
         return jsonify(error_message), 400
 
 
+def target_branch_ignored(handler) -> bool:
+    """
+    开启仅 review 保护分支时，在入队前判断 MR/PR 的目标分支（保护分支规则按项目缓存），不匹配的事件不再入队
+    判断出错时照常入队，由 worker 再判断
+    """
+    if os.environ.get('MERGE_REVIEW_ONLY_PROTECTED_BRANCHES_ENABLED', '0') != '1':
+        return False
+    try:
+        if handler.target_branch_protected():
+            return False
+    except Exception as e:
+        logger.warn(f"入队前判断保护分支失败: {e}")
+        return False
+    logger.info("Merge Request target branch not match protected branches, ignored.")
+    return True
+
+
+def register_merge_request_generation(data: dict, gitlab_url_slug: str):
+    object_attributes = data.get('object_attributes', {})
+    head_sha = (object_attributes.get('last_commit') or {}).get('id')
+    if not head_sha:
+        return
+    try:
+        register_review_generation(gitlab_url_slug, object_attributes.get('target_project_id'),
+                                   object_attributes.get('iid'), head_sha)
+    except Exception as e:
+        # 登记失败只影响旧任务的取消，不影响本次 review
+        logger.warn(f"登记 MR review generation 失败: {e}")
+
+
 # ---------------------- 存活探针（livenessProbe） ----------------------
 @api_app.route('/health/liveness', methods=['GET'])
 def liveness_check():
@@ -0,0 +1,186 @@
+"""
+GitHub PR 数据获取方式的性能对比：REST（files、commits 分页接口）与 GraphQL（一次查询 + 原始 diff）
+本地模拟的 GitHub 接口按录制的 PR 数据（fixture）返回，每次请求固定延迟，统计请求次数与耗时
+
+    1. REST：get_pull_request_changes + get_pull_request_commits（每页 100 条，并发分页，缺少 patch 的文件从原始 diff 补全）
+    2. GraphQL：get_pull_request_changes_and_commits（GITHUB_GRAPHQL_ENABLED=1）
+
+运行方式:
+    python -m biz.github.graphql_benchmark [文件数量] [提交数量] [每次请求的延迟毫秒]
+    python -m biz.github.graphql_benchmark --fixture fixture.json [每次请求的延迟毫秒]
+    python -m biz.github.graphql_benchmark --record owner/repo 123 fixture.json   # 从 GitHub 录制 PR 数据（需要 GITHUB_ACCESS_TOKEN）
+fixture 格式: {"files": [REST files 接口的数据], "commits": [REST commits 接口的数据]}
+"""
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from biz.github.webhook_handler import PullRequestHandler, get_all_pages, github_api_url
+
+FIXTURE = {'files': [], 'commits': []}
+LATENCY = 0.05
+CALLS = Counter()
+CALLS_LOCK = threading.Lock()
+
+
+def build_fixture(file_count: int, commit_count: int) -> dict:
+    files = []
+    for index in range(file_count):
+        file = {'filename': f'src/module_{index}.py', 'status': 'modified', 'additions': 1, 'deletions': 1,
+                'changes': 2}
+        # 每 100 个文件中有一个过大的文件，GitHub 不返回 patch
+        if index % 100 != 99:
+            file['patch'] = f'@@ -1,1 +1,1 @@\n-a = {index}\n+a = {index + 1}'
+        files.append(file)
+    commits = [{'sha': f'{index:040x}', 'html_url': f'https://github.com/demo/repo/commit/{index:040x}',
+                'commit': {'message': f'commit {index}\n\ndetail',
+                           'author': {'name': 'dev', 'email': 'dev@example.com', 'date': '2025-01-01T00:00:00Z'}}}
+               for index in range(commit_count)]
+    return {'files': files, 'commits': commits}
+
+
+def record_fixture(repo_full_name: str, number: int, path: str):
+    """从 GitHub 录制 PR 的 files、commits 数据"""
+    headers = {'Authorization': f"token {os.getenv('GITHUB_ACCESS_TOKEN')}",
+               'Accept': 'application/vnd.github.v3+json'}
+    base = f"{github_api_url()}/repos/{repo_full_name}/pulls/{number}"
+    fixture = {'files': get_all_pages(f"{base}/files", headers) or [],
+               'commits': get_all_pages(f"{base}/commits", headers) or []}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(fixture, file)
+    print(f"录制完成: {len(fixture['files'])} 个文件, {len(fixture['commits'])} 个提交 -> {path}")
+
+
+def raw_diff() -> str:
+    sections = []
+    for file in FIXTURE['files']:
+        path = file['filename']
+        patch = file.get('patch') or '@@ -1,1 +1,1 @@\n-a\n+b'
+        sections.append(f"diff --git a/{path} b/{path}\nindex 1111111..2222222 100644\n"
+                        f"--- a/{path}\n+++ b/{path}\n{patch}\n")
+    return ''.join(sections)
+
+
+def _cursor_page(items: list, cursor: str, size: int = 100):
+    start = int(base64.b64decode(cursor).decode()) if cursor else 0
+    end = start + size
+    return items[start:end], {'hasNextPage': end < len(items),
+                              'endCursor': base64.b64encode(str(end).encode()).decode()}
+
+
+def graphql_response(variables: dict) -> dict:
+    pull_request = {'headRefName': 'feature', 'headRefOid': 'h' * 40, 'baseRefName': 'main', 'baseRefOid': 'b' * 40}
+    if variables.get('withFiles'):
+        nodes, page_info = _cursor_page(FIXTURE['files'], variables.get('filesCursor'))
+        pull_request['files'] = {
+            'nodes': [{'path': file['filename'], 'additions': file['additions'], 'deletions': file['deletions'],
+                       'changeType': file['status'].upper()} for file in nodes],
+            'pageInfo': page_info}
+    if variables.get('withCommits'):
+        nodes, page_info = _cursor_page(FIXTURE['commits'], variables.get('commitsCursor'))
+        pull_request['commits'] = {
+            'nodes': [{'commit': {'oid': commit['sha'], 'message': commit['commit']['message'],
+                                  'messageHeadline': commit['commit']['message'].split('\n')[0],
+                                  'url': commit.get('html_url'), 'author': commit['commit']['author']}}
+                      for commit in nodes],
+            'pageInfo': page_info}
+    return {'data': {'repository': {'pullRequest': pull_request}}}
+
+
+class _GitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _count(self, name: str):
+        with CALLS_LOCK:
+            CALLS[name] += 1
+        time.sleep(LATENCY)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.endswith(('/files', '/commits')):
+            name = parsed.path.rsplit('/', 1)[1]
+            self._count(f"REST {name}")
+            query = parse_qs(parsed.query)
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            items = FIXTURE[name]
+            last_page = max(1, -(-len(items) // per_page))
+            links = []
+            if page < last_page:
+                base = f"http://{self.headers['Host']}{parsed.path}?per_page={per_page}"
+                links = [f'<{base}&page={page + 1}>; rel="next"', f'<{base}&page={last_page}>; rel="last"']
+            self._send(json.dumps(items[(page - 1) * per_page:page * per_page]).encode('utf-8'),
+                       'application/json', ', '.join(links))
+        else:
+            self._count("REST raw diff")
+            self._send(raw_diff().encode('utf-8'), 'text/plain')
+
+    def do_POST(self):
+        self._count("GraphQL")
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+        self._send(json.dumps(graphql_response(payload['variables'])).encode('utf-8'), 'application/json')
+
+    def _send(self, body: bytes, content_type: str, link: str = ''):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if link:
+            self.send_header("Link", link)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _measure(func):
+    CALLS.clear()
+    start = time.perf_counter()
+    changes, commits = func()
+    return changes, commits, time.perf_counter() - start, dict(CALLS)
+
+
+def run(latency_ms: float = 50):
+    global LATENCY
+    LATENCY = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GitHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['GITHUB_API_URL'] = f"http://127.0.0.1:{server.server_port}"
+    # 对比的是请求次数与耗时，关闭条件请求缓存与限流
+    os.environ['HTTP_CACHE_ENABLED'] = '0'
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    handler = PullRequestHandler({'pull_request': {'number': 1}, 'repository': {'full_name': 'demo/repo'}},
+                                 'benchmark', 'https://github.com')
+
+    os.environ['GITHUB_GRAPHQL_ENABLED'] = '0'
+    rest = _measure(lambda: (handler.get_pull_request_changes(), handler.get_pull_request_commits()))
+    os.environ['GITHUB_GRAPHQL_ENABLED'] = '1'
+    graphql = _measure(handler.get_pull_request_changes_and_commits)
+    server.shutdown()
+
+    print(f"files: {len(FIXTURE['files'])}, commits: {len(FIXTURE['commits'])}, 每次请求延迟: {latency_ms:.0f} ms")
+    for name, (changes, commits, elapsed, calls) in (('REST', rest), ('GraphQL', graphql)):
+        with_diff = sum(1 for change in changes if change['diff'])
+        print(f"{name}: {len(changes)} 个文件（{with_diff} 个有 diff）, {len(commits)} 个提交, "
+              f"{sum(calls.values())} 次请求 {calls}, {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['--record']:
+        record_fixture(args[1], int(args[2]), args[3])
+    elif args[:1] == ['--fixture']:
+        with open(args[1], encoding='utf-8') as fixture_file:
+            FIXTURE.update(json.load(fixture_file))
+        run(*(float(arg) for arg in args[2:3]))
+    else:
+        numbers = [int(arg) for arg in args[:3]]
+        FIXTURE.update(build_fixture(*(numbers[:2] or [500, 120])))
+        run(*numbers[2:3])
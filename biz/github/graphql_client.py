@@ -0,0 +1,125 @@
+import os
+from typing import List, NamedTuple, Optional
+
+from biz.utils.http_session import github_http
+from biz.utils.log import logger
+
+PULL_REQUEST_QUERY = '''
+query($owner: String!, $name: String!, $number: Int!, $filesCursor: String, $commitsCursor: String,
+      $withFiles: Boolean!, $withCommits: Boolean!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      headRefName
+      headRefOid
+      baseRefName
+      baseRefOid
+      files(first: 100, after: $filesCursor) @include(if: $withFiles) {
+        nodes { path additions deletions changeType }
+        pageInfo { hasNextPage endCursor }
+      }
+      commits(first: 100, after: $commitsCursor) @include(if: $withCommits) {
+        nodes {
+          commit {
+            oid
+            message
+            messageHeadline
+            url
+            author { name email date }
+          }
+        }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+  }
+}
+'''
+
+# GraphQL 的 changeType 与 REST files 接口 status 的对应关系
+CHANGE_TYPE_STATUS = {
+    'ADDED': 'added',
+    'DELETED': 'removed',
+    'MODIFIED': 'modified',
+    'RENAMED': 'renamed',
+    'COPIED': 'copied',
+    'CHANGED': 'changed',
+}
+
+
+class PullRequestSnapshot(NamedTuple):
+    """一次 GraphQL 查询得到的 PR 数据，commits 已转换为 GitLab 格式，files 为 {path, additions, deletions, status}"""
+    head_ref: str
+    head_sha: str
+    base_ref: str
+    base_sha: str
+    commits: List[dict]
+    files: List[dict]
+
+
+def github_graphql_enabled() -> bool:
+    return os.getenv('GITHUB_GRAPHQL_ENABLED', '0') == '1'
+
+
+def graphql_url(api_url: str) -> str:
+    """GitHub.com 为 https://api.github.com/graphql，GitHub Enterprise 为 https://<host>/api/graphql"""
+    if api_url.endswith('/api/v3'):
+        return api_url[:-len('/v3')] + '/graphql'
+    return f"{api_url}/graphql"
+
+
+def _to_gitlab_commit(node: dict) -> dict:
+    commit = node.get('commit', {})
+    author = commit.get('author') or {}
+    return {
+        'id': commit.get('oid'),
+        'title': commit.get('messageHeadline') or commit.get('message', '').split('\n')[0],
+        'message': commit.get('message', ''),
+        'author_name': author.get('name'),
+        'author_email': author.get('email'),
+        'created_at': author.get('date'),
+        'web_url': commit.get('url')
+    }
+
+
+def fetch_pull_request_snapshot(api_url: str, token: str, repo_full_name: str,
+                                number: int) -> Optional[PullRequestSnapshot]:
+    """
+    通过 GraphQL 获取 PR 的 head/base、全部 commits 与改动文件列表（路径、增删行数）
+    files、commits 各自按游标分页，每次查询只请求还有下一页的部分；100 个文件、100 个提交以内只需一次请求
+    查询失败时返回 None，由调用方退回 REST 接口
+    """
+    owner, name = repo_full_name.split('/', 1)
+    url = graphql_url(api_url)
+    headers = {'Authorization': f'bearer {token}'}
+    variables = {'owner': owner, 'name': name, 'number': int(number), 'filesCursor': None, 'commitsCursor': None,
+                 'withFiles': True, 'withCommits': True}
+    pull_request = None
+    files, commits = [], []
+    requests_count = 0
+    while variables['withFiles'] or variables['withCommits']:
+        response = github_http.post(url, headers=headers, json={'query': PULL_REQUEST_QUERY, 'variables': variables})
+        requests_count += 1
+        data = response.json() if response.status_code == 200 else {}
+        page = ((data.get('data') or {}).get('repository') or {}).get('pullRequest')
+        if response.status_code != 200 or data.get('errors') or not page:
+            logger.warn(f"GitHub GraphQL 查询 PR 失败: {response.status_code}, {data.get('errors') or response.text}")
+            return None
+        pull_request = pull_request or page
+        for connection, items, cursor, flag in (('files', files, 'filesCursor', 'withFiles'),
+                                                ('commits', commits, 'commitsCursor', 'withCommits')):
+            if not variables[flag]:
+                continue
+            items.extend(page[connection]['nodes'])
+            page_info = page[connection]['pageInfo']
+            variables[flag] = page_info['hasNextPage']
+            variables[cursor] = page_info['endCursor']
+    logger.info(f"GitHub GraphQL 获取 PR {repo_full_name}#{number}: {len(files)} 个文件、{len(commits)} 个提交，"
+                f"共 {requests_count} 次请求")
+    return PullRequestSnapshot(
+        head_ref=pull_request['headRefName'],
+        head_sha=pull_request['headRefOid'],
+        base_ref=pull_request['baseRefName'],
+        base_sha=pull_request['baseRefOid'],
+        commits=[_to_gitlab_commit(node) for node in commits],
+        files=[{'path': file['path'], 'additions': file['additions'], 'deletions': file['deletions'],
+                'status': CHANGE_TYPE_STATUS.get(file['changeType'], file['changeType'].lower())} for file in files],
+    )
@@ -0,0 +1,124 @@
+"""
+GitHub PR 文件列表分页的性能对比：500 个文件的 PR，本地模拟的 GitHub 接口每次请求固定延迟
+
+    1. 原实现：只请求第一页（默认每页 30 条），大 PR 只 review 了一部分文件
+    2. 顺序分页：per_page=100，按 Link 头的 next 逐页请求
+    3. 并发分页：per_page=100，从第一页的 Link 头得到总页数，其余页并发请求（get_all_pages）
+其中 5 个文件没有 patch 字段，从 PR 的原始 diff 中补全
+运行方式: python -m biz.github.pagination_benchmark [文件数量] [每次请求的延迟毫秒]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from biz.github.webhook_handler import PullRequestHandler
+from biz.utils.http_session import github_http
+
+FILES = []
+LATENCY = 0.05
+
+
+def build_fixture(file_count: int):
+    FILES.clear()
+    for index in range(file_count):
+        file = {'filename': f'src/module_{index}.py', 'status': 'modified', 'additions': 1, 'deletions': 1,
+                'changes': 2}
+        # 每 100 个文件中有一个过大的文件，GitHub 不返回 patch
+        if index % 100 != 99:
+            file['patch'] = f'@@ -1,1 +1,1 @@\n-a = {index}\n+a = {index + 1}'
+        FILES.append(file)
+
+
+def raw_diff() -> str:
+    return ''.join(f"diff --git a/{file['filename']} b/{file['filename']}\n"
+                   f"index 1111111..2222222 100644\n--- a/{file['filename']}\n+++ b/{file['filename']}\n"
+                   f"@@ -1,1 +1,1 @@\n-a = {index}\n+a = {index + 1}\n"
+                   for index, file in enumerate(FILES))
+
+
+class _GitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        parsed = urlparse(self.path)
+        if parsed.path.endswith('/files'):
+            query = parse_qs(parsed.query)
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            last_page = max(1, -(-len(FILES) // per_page))
+            body = json.dumps(FILES[(page - 1) * per_page:page * per_page]).encode('utf-8')
+            base = f"http://{self.headers['Host']}{parsed.path}?per_page={per_page}"
+            links = []
+            if page < last_page:
+                links.append(f'<{base}&page={page + 1}>; rel="next"')
+                links.append(f'<{base}&page={last_page}>; rel="last"')
+            self._send(body, 'application/json', ', '.join(links))
+        else:
+            self._send(raw_diff().encode('utf-8'), 'text/plain')
+
+    def _send(self, body: bytes, content_type: str, link: str = ''):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if link:
+            self.send_header("Link", link)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _first_page_only(handler: PullRequestHandler) -> list:
+    url = f"{handler.api_url}/repos/{handler.repo_full_name}/pulls/{handler.pull_request_number}/files"
+    return github_http.get(url).json()
+
+
+def _sequential_pages(handler: PullRequestHandler) -> list:
+    url = f"{handler.api_url}/repos/{handler.repo_full_name}/pulls/{handler.pull_request_number}/files"
+    response = github_http.get(url, params={'per_page': 100})
+    files = response.json()
+    while 'next' in response.links:
+        response = github_http.get(response.links['next']['url'])
+        files.extend(response.json())
+    return files
+
+
+def _measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run(file_count: int = 500, latency_ms: float = 50):
+    global LATENCY
+    LATENCY = latency_ms / 1000
+    build_fixture(file_count)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GitHubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['GITHUB_API_URL'] = f"http://127.0.0.1:{server.server_port}"
+    handler = PullRequestHandler({'pull_request': {'number': 1}, 'repository': {'full_name': 'demo/repo'}},
+                                 'benchmark', 'https://github.com')
+    # 预热连接
+    _first_page_only(handler)
+
+    first_page, first_page_time = _measure(_first_page_only, handler)
+    sequential, sequential_time = _measure(_sequential_pages, handler)
+    changes, concurrent_time = _measure(handler.get_pull_request_changes)
+    server.shutdown()
+
+    with_patch = sum(1 for change in changes if change['diff'])
+    print(f"files: {file_count}, 每次请求延迟: {latency_ms:.0f} ms")
+    print(f"原实现（仅第一页）: {len(first_page)} 个文件, {first_page_time * 1000:.1f} ms")
+    print(f"顺序分页: {len(sequential)} 个文件, {sequential_time * 1000:.1f} ms")
+    print(f"并发分页 + 补全 patch: {len(changes)} 个文件（{with_patch} 个有 diff）, {concurrent_time * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,96 @@
+import os
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from requests.exceptions import ChunkedEncodingError
+
+from biz.github.webhook_handler import PageFetchError, PullRequestHandler, get_all_pages
+
+URL = 'https://api.github.com/repos/owner/repo/pulls/1/files'
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, items: list = None, links: dict = None):
+        self.status_code = status_code
+        self.items = items or []
+        self.links = links or {}
+        self.text = ''
+
+    def json(self):
+        return self.items
+
+
+class TestGetAllPages(TestCase):
+    def setUp(self):
+        self.calls = {}
+        patcher = patch.dict(os.environ, {'GITHUB_PAGE_RETRIES': '1', 'GITHUB_PAGE_RETRY_INITIAL_DELAY': '0'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_get(self, pages: dict):
+        """pages 为 页码 -> [每次请求依次返回的 FakeResponse]"""
+
+        def get(url, headers=None, params=None):
+            page = int((params or {}).get('page', 1))
+            count = self.calls.get(page, 0)
+            self.calls[page] = count + 1
+            responses = pages[page]
+            response = responses[min(count, len(responses) - 1)]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        return patch('biz.github.webhook_handler.github_http.get', side_effect=get)
+
+    def first_page(self):
+        return FakeResponse(200, [1, 2], {'last': {'url': f'{URL}?per_page=100&page=3'}})
+
+    def test_retry_failed_page(self):
+        pages = {1: [self.first_page()], 2: [FakeResponse(520), FakeResponse(200, [3])], 3: [FakeResponse(200, [4])]}
+        with self.fake_get(pages):
+            self.assertEqual(get_all_pages(URL, {}), [1, 2, 3, 4])
+        self.assertEqual(self.calls[2], 2)
+
+    def test_failed_page_returns_none(self):
+        pages = {1: [self.first_page()], 2: [FakeResponse(520)], 3: [FakeResponse(200, [4])]}
+        with self.fake_get(pages):
+            self.assertIsNone(get_all_pages(URL, {}))
+        self.assertEqual(self.calls[2], 2)
+
+    def test_transport_retried_status_not_retried_again(self):
+        """502 已由连接层重试，404 等客户端错误重试也不会成功"""
+        for status_code in (502, 404):
+            self.calls = {}
+            pages = {1: [self.first_page()], 2: [FakeResponse(status_code)], 3: [FakeResponse(200, [4])]}
+            with self.fake_get(pages):
+                self.assertIsNone(get_all_pages(URL, {}))
+            self.assertEqual(self.calls[2], 1)
+
+    def test_retry_interrupted_response(self):
+        pages = {1: [self.first_page()], 2: [ChunkedEncodingError('connection broken'), FakeResponse(200, [3])],
+                 3: [FakeResponse(200, [4])]}
+        with self.fake_get(pages):
+            self.assertEqual(get_all_pages(URL, {}), [1, 2, 3, 4])
+        self.assertEqual(self.calls[2], 2)
+
+    def test_stream_failed_page_raises(self):
+        handler = PullRequestHandler({'pull_request': {'number': 1}, 'repository': {'full_name': 'owner/repo'}},
+                                     'token', 'https://github.com')
+        responses = {URL: [FakeResponse(200, [{'filename': 'a.py', 'patch': '@@ -1 +1 @@\n-a\n+b'}],
+                                        {'next': {'url': f'{URL}?page=2'}})],
+                     f'{URL}?page=2': [FakeResponse(520)]}
+
+        def get(url, headers=None, params=None):
+            self.calls[url] = self.calls.get(url, 0) + 1
+            return responses[url][0]
+
+        with patch('biz.github.webhook_handler.github_http.get', side_effect=get):
+            changes = handler.iter_pull_request_changes()
+            self.assertEqual(next(changes)['new_path'], 'a.py')
+            with self.assertRaises(PageFetchError):
+                next(changes)
+        self.assertEqual(self.calls[f'{URL}?page=2'], 2)
+
+
+if __name__ == '__main__':
+    main()
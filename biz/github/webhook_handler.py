@@ -1,10 +1,19 @@
 import os
-import re
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
 import requests
-import fnmatch
+
+from biz.github.graphql_client import fetch_pull_request_snapshot, github_graphql_enabled
+from biz.utils.diff_parser import parse_hunks
+from biz.utils.git_mirror import parse_git_diff
+from biz.utils.http_session import TRANSPORT_RETRY_STATUSES, github_http
 from biz.utils.log import logger
+from biz.utils.polling import backoff_delays
+from biz.utils.protected_branches import protected_branch_cache
 
 
 
@@ -27,18 +36,16 @@ def filter_changes(changes: list):
         # 如果没有status字段或status不为"removed"，继续检查diff模式
         diff = change.get('diff', '')
         if diff:
-            diff_header_match = re.match(r'@@ -\d+,\d+ \+0,0 @@', diff)
-            if diff_header_match:
-                # 检查除了diff头部外的所有行是否都以减号开头
-                diff_lines = diff.split('\n')[1:]  # 跳过diff头部
-                if all(line.startswith('-') or not line for line in diff_lines):
-                    logger.info(f"Detected file deletion via diff pattern: {change.get('new_path')}")
-                    continue
+            # 只有一个改动点，新文件一侧为 +0,0（没有新增行、上下文行）
+            hunks = parse_hunks(diff, keep_lines=False)
+            if len(hunks) == 1 and hunks[0].new_start == 0 and hunks[0].new_count == 0:
+                logger.info(f"Detected file deletion via diff pattern: {change.get('new_path')}")
+                continue
                     
         not_deleted_changes.append(change)
     
-    logger.info(f"SUPPORTED_EXTENSIONS: {supported_extensions}")
-    logger.info(f"After filtering deleted files: {not_deleted_changes}")
+    logger.debug(f"SUPPORTED_EXTENSIONS: {supported_extensions}")
+    logger.debug(f"After filtering deleted files: {not_deleted_changes}")
     
     # 过滤 `new_path` 以支持的扩展名结尾的元素, 仅保留diff和new_path字段
     filtered_changes = [
@@ -51,10 +58,89 @@ def filter_changes(changes: list):
         for item in not_deleted_changes
         if any(item.get('new_path', '').endswith(ext) for ext in supported_extensions)
     ]
-    logger.info(f"After filtering by extension: {filtered_changes}")
+    logger.debug(f"After filtering by extension: {filtered_changes}")
     return filtered_changes
 
 
+def github_api_url() -> str:
+    """GitHub API 地址，GitHub Enterprise 可通过 GITHUB_API_URL 配置（如 https://github.example.com/api/v3）"""
+    return os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+
+
+class PageFetchError(Exception):
+    """分页请求重试后仍失败，此前产出的数据不完整，调用方应重新获取或放弃"""
+
+
+def _get_page(url: str, headers: dict, params: dict = None):
+    """
+    请求一页数据，失败时返回 None
+    github_http 已经在连接层重试了连接错误、超时与 500/502/503/504，429 与限流的 403 由限流器等待后重试，
+    这里只对连接层不会重试的失败（读取响应体中断、其他 5xx）按指数退避再重试 GITHUB_PAGE_RETRIES 次（默认 2 次），
+    等待时间为 GITHUB_PAGE_RETRY_INITIAL_DELAY 起、不超过 GITHUB_PAGE_RETRY_MAX_DELAY；4xx 不重试
+    """
+    retries = max(0, int(os.getenv('GITHUB_PAGE_RETRIES', 2)))
+    delays = backoff_delays(initial=float(os.getenv('GITHUB_PAGE_RETRY_INITIAL_DELAY', 1)),
+                            max_delay=float(os.getenv('GITHUB_PAGE_RETRY_MAX_DELAY', 10)))
+    for attempt in range(retries + 1):
+        try:
+            response = github_http.get(url, headers=headers, params=params)
+            if response.status_code == 200:
+                return response
+            logger.warn(f"Failed to get {url} (params: {params}): {response.status_code}, {response.text}")
+            if response.status_code < 500 or response.status_code in TRANSPORT_RETRY_STATUSES:
+                return None
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError) as e:
+            logger.warn(f"Failed to get {url} (params: {params}): {e}")
+        except requests.exceptions.RequestException as e:
+            logger.warn(f"Failed to get {url} (params: {params}): {e}")
+            return None
+        if attempt < retries:
+            time.sleep(next(delays))
+    return None
+
+
+def get_all_pages(url: str, headers: dict, params: dict = None) -> Optional[list]:
+    """
+    获取 GitHub 列表接口的全部分页数据（per_page=100）
+        1. 先请求第一页，从 Link 头的 rel="last" 得到总页数，其余页并发请求（GITHUB_PAGE_CONCURRENCY，默认 4），按页码顺序合并
+        2. 没有 rel="last" 只有 rel="next" 时，按 next 顺序翻页
+    每一页失败时单独重试，任意一页重试后仍失败时返回 None（不返回不完整的数据）
+    """
+    params = dict(params or {}, per_page=100)
+    response = _get_page(url, headers, params)
+    if response is None:
+        return None
+    items = response.json()
+
+    last_url = response.links.get('last', {}).get('url')
+    if last_url:
+        last_page = int(parse_qs(urlparse(last_url).query).get('page', ['1'])[0])
+
+        def get_page(page: int) -> Optional[list]:
+            page_response = _get_page(url, headers, dict(params, page=page))
+            return page_response.json() if page_response is not None else None
+
+        concurrency = max(1, int(os.getenv('GITHUB_PAGE_CONCURRENCY', 4)))
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='github-page') as executor:
+            for page, page_items in enumerate(executor.map(get_page, range(2, last_page + 1)), start=2):
+                if page_items is None:
+                    logger.error(f"GitHub {url} 第 {page} 页获取失败，放弃本次获取")
+                    return None
+                items.extend(page_items)
+        logger.info(f"GitHub {url} 共 {last_page} 页，{len(items)} 条")
+        return items
+
+    next_url = response.links.get('next', {}).get('url')
+    while next_url:
+        response = _get_page(next_url, headers)
+        if response is None:
+            logger.error(f"GitHub {next_url} 获取失败，放弃本次获取")
+            return None
+        items.extend(response.json())
+        next_url = response.links.get('next', {}).get('url')
+    return items
+
+
 class PullRequestHandler:
     def __init__(self, webhook_data: dict, github_token: str, github_url: str):
         self.pull_request_number = None
@@ -64,6 +150,7 @@ class PullRequestHandler:
         self.event_type = None
         self.repo_full_name = None
         self.action = None
+        self.api_url = github_api_url()
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -86,62 +173,144 @@ class PullRequestHandler:
         # GitHub pull request changes API可能存在延迟，多次尝试
         max_retries = 3  # 最大重试次数
         retry_delay = 10  # 重试间隔时间（秒）
+        # 调用 GitHub API 获取 Pull Request 的 files（变更），获取全部分页
+        url = f"{self.api_url}/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/files"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
         for attempt in range(max_retries):
-            # 调用 GitHub API 获取 Pull Request 的 files（变更）
-            url = f"https://api.github.com/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/files"
-            headers = {
-                'Authorization': f'token {self.github_token}',
-                'Accept': 'application/vnd.github.v3+json'
-            }
-            response = requests.get(url, headers=headers)
-            logger.debug(
-                f"Get changes response from GitHub (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
-
-            # 检查请求是否成功
-            if response.status_code == 200:
-                files = response.json()
-                if files:
-                    # 转换成GitLab格式的changes
-                    changes = []
-                    for file in files:
-                        change = {
-                            'old_path': file.get('filename'),
-                            'new_path': file.get('filename'),
-                            'diff': file.get('patch', ''),
-                            'additions': file.get('additions', 0),
-                            'deletions': file.get('deletions', 0)
-                        }
-                        changes.append(change)
-                    return changes
-                else:
-                    logger.info(
-                        f"Changes is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
-                    time.sleep(retry_delay)
-            else:
-                logger.warn(f"Failed to get changes from GitHub (URL: {url}): {response.status_code}, {response.text}")
+            files = get_all_pages(url, headers)
+            if files is None:
                 return []
+            if files:
+                # 过大的文件 GitHub 不返回 patch，从整个 PR 的原始 diff 中补全
+                missing_patch = [file for file in files if 'patch' not in file and file.get('changes', 0) > 0]
+                raw_patches = self.get_pull_request_raw_patches() if missing_patch else {}
+                # 转换成GitLab格式的changes
+                return [self._to_change(file, raw_patches) for file in files]
+            logger.info(
+                f"Changes is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
+            time.sleep(retry_delay)
 
         logger.warning(f"Max retries ({max_retries}) reached. Changes is still empty.")
         return []  # 达到最大重试次数后返回空列表
 
+    @staticmethod
+    def _to_change(file: dict, raw_patches: dict) -> dict:
+        """将 files 接口的文件转换成GitLab格式的change"""
+        return {
+            'old_path': file.get('previous_filename') or file.get('filename'),
+            'new_path': file.get('filename'),
+            'diff': file.get('patch') or raw_patches.get(file.get('filename'), ''),
+            'status': file.get('status', ''),
+            'additions': file.get('additions', 0),
+            'deletions': file.get('deletions', 0)
+        }
+
+    def iter_pull_request_changes(self) -> Iterator[dict]:
+        """
+        流式获取 PR 的 changes：按 Link 头的 next 逐页请求（每页 DIFF_STREAM_PAGE_SIZE 个文件，默认 20），逐个文件产出，
+        调用方可以边下载边过滤，只保留需要的文件；缺少 patch 的文件第一次出现时再获取 PR 的原始 diff 补全
+        每一页与 get_all_pages 一样失败时单独重试：
+            1. 一个文件都没有获取到时（如 PR 刚创建、第一页请求失败），退回 get_pull_request_changes 的重试逻辑
+            2. 已产出部分文件后某一页重试后仍失败时抛出 PageFetchError，不把部分文件当作全部
+        """
+        url = f"{self.api_url}/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/files"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        params = {'per_page': int(os.getenv('DIFF_STREAM_PAGE_SIZE', 20))}
+        raw_patches = None
+        count = 0
+        while url:
+            response = _get_page(url, headers, params)
+            if response is None:
+                if count:
+                    raise PageFetchError(f"GitHub {url} 获取失败，已获取的 {count} 个文件不完整")
+                break
+            for file in response.json():
+                if raw_patches is None and 'patch' not in file and file.get('changes', 0) > 0:
+                    raw_patches = self.get_pull_request_raw_patches()
+                count += 1
+                yield self._to_change(file, raw_patches or {})
+            # next 链接中已包含分页参数
+            url, params = response.links.get('next', {}).get('url'), None
+        if not count:
+            yield from self.get_pull_request_changes()
+
+    def get_pull_request_raw_diffs(self) -> Optional[dict]:
+        """
+        通过 diff 媒体类型获取整个 PR 的原始 diff，返回 文件路径 -> GitLab diffs 结构（old_path、new_path、diff 等）
+        改动过大时 GitHub 不返回原始 diff，此时返回 None
+        """
+        url = f"{self.api_url}/repos/{self.repo_full_name}/pulls/{self.pull_request_number}"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3.diff'
+        }
+        response = github_http.get(url, headers=headers)
+        if response.status_code != 200:
+            logger.warn(f"Failed to get raw diff of pull request: {response.status_code}, {response.text}")
+            return None
+        return {item['new_path']: item for item in parse_git_diff(response.text)}
+
+    def get_pull_request_raw_patches(self) -> dict:
+        """
+        整个 PR 的原始 diff 中每个文件的改动内容（与 files 接口的 patch 格式一致），文件路径 -> 改动内容
+        files 接口对过大的文件不返回 patch 时使用
+        """
+        raw_diffs = self.get_pull_request_raw_diffs() or {}
+        return {path: item['diff'].rstrip('\n') for path, item in raw_diffs.items()}
+
+    def get_pull_request_changes_and_commits(self) -> Tuple[list, list]:
+        """
+        获取 PR 的 changes 与 commits
+        GITHUB_GRAPHQL_ENABLED=1 时通过 GraphQL 一次查询文件列表（路径、增删行数）与 commits，改动内容同时从 PR 的原始 diff 一次获取，
+        100 个文件、100 个提交以内只需 1 轮请求；GraphQL 或原始 diff 获取失败时退回 REST 接口
+        """
+        if github_graphql_enabled():
+            # GraphQL 查询与原始 diff 互不依赖，同时请求
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='github-raw-diff') as executor:
+                raw_diffs_future = executor.submit(self.get_pull_request_raw_diffs)
+                snapshot = fetch_pull_request_snapshot(self.api_url, self.github_token, self.repo_full_name,
+                                                       self.pull_request_number)
+                raw_diffs = raw_diffs_future.result()
+            if snapshot and snapshot.files and raw_diffs is not None:
+                changes = []
+                for file in snapshot.files:
+                    raw_diff = raw_diffs.get(file['path'], {})
+                    diff = raw_diff.get('diff', '')
+                    changes.append({
+                        'old_path': raw_diff.get('old_path') or file['path'],
+                        'new_path': file['path'],
+                        # 二进制文件与 REST 接口一致，没有改动内容
+                        'diff': '' if diff.startswith('Binary files') else diff.rstrip('\n'),
+                        'status': file['status'],
+                        'additions': file['additions'],
+                        'deletions': file['deletions']
+                    })
+                return changes, snapshot.commits
+            logger.info("GraphQL 获取 PR 数据失败，退回 REST 接口")
+        return self.get_pull_request_changes(), self.get_pull_request_commits()
+
     def get_pull_request_commits(self) -> list:
         # 检查是否为 Pull Request Hook 事件
         if self.event_type != 'pull_request':
             return []
 
         # 调用 GitHub API 获取 Pull Request 的 commits
-        url = f"https://api.github.com/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/commits"
+        url = f"{self.api_url}/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/commits"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
-        logger.debug(f"Get commits response from GitHub: {response.status_code}, {response.text}")
-        
+        github_commits = get_all_pages(url, headers)
+
         # 检查请求是否成功
-        if response.status_code == 200:
+        if github_commits is not None:
             # 将GitHub的commits转换为GitLab格式的commits
-            github_commits = response.json()
             gitlab_format_commits = []
             for commit in github_commits:
                 gitlab_commit = {
@@ -156,11 +325,10 @@ class PullRequestHandler:
                 gitlab_format_commits.append(gitlab_commit)
             return gitlab_format_commits
         else:
-            logger.warn(f"Failed to get commits: {response.status_code}, {response.text}")
             return []
 
     def add_pull_request_notes(self, review_result):
-        url = f"https://api.github.com/repos/{self.repo_full_name}/issues/{self.pull_request_number}/comments"
+        url = f"{self.api_url}/repos/{self.repo_full_name}/issues/{self.pull_request_number}/comments"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
@@ -168,7 +336,7 @@ class PullRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = github_http.post(url, headers=headers, json=data)
         logger.debug(f"Add comment to GitHub PR {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to pull request.")
@@ -176,21 +344,49 @@ class PullRequestHandler:
             logger.error(f"Failed to add comment: {response.status_code}")
             logger.error(response.text)
 
-    def target_branch_protected(self) -> bool:
-        url = f"https://api.github.com/repos/{self.repo_full_name}/branches?protected=true"
+    def create_pull_request_review(self, body: str, comments: list = None, commit_id: str = None) -> bool:
+        """
+        提交一次 PR review（COMMENT），总评与传入的行内评论一次写入（只发送一次通知）
+        GitHub PR 的 review 流程目前只生成一条整体结果，调用方不传 comments，提交的是不带行内评论的 review
+        API: POST /repos/{owner}/{repo}/pulls/{pull_number}/reviews
+        :param comments: 行内评论列表，每项为 {'path': 文件路径, 'line': 行号, 'side': 'RIGHT' | 'LEFT', 'body': 内容}
+        """
+        url = f"{self.api_url}/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/reviews"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-
-        response = requests.get(url, headers=headers)
+        data = {
+            'body': body,
+            'event': 'COMMENT',
+            'comments': comments or []
+        }
+        commit_id = commit_id or self.webhook_data.get('pull_request', {}).get('head', {}).get('sha')
+        if commit_id:
+            data['commit_id'] = commit_id
+        response = github_http.post(url, headers=headers, json=data)
+        logger.debug(f"Create review on GitHub PR {url}: {response.status_code}, {response.text}")
         if response.status_code == 200:
-            data = response.json()
-            target_branch = self.webhook_data['pull_request']['base']['ref']
-            return any(fnmatch.fnmatch(target_branch, item['name']) for item in data)
-        else:
-            logger.warn(f"Failed to get protected branches: {response.status_code}, {response.text}")
-            return False
+            logger.info(f"Review with {len(data['comments'])} inline comments successfully added to pull request.")
+            return True
+        logger.error(f"Failed to create review: {response.status_code}, {response.text}")
+        return False
+
+    def get_protected_branch_names(self) -> Optional[list]:
+        """获取仓库的所有保护分支名，没有保护分支时返回空列表，请求失败（任意一页）时返回 None（不缓存）"""
+        url = f"{self.api_url}/repos/{self.repo_full_name}/branches"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        branches = get_all_pages(url, headers, params={'protected': 'true'})
+        return [item['name'] for item in branches] if branches is not None else None
+
+    def target_branch_protected(self) -> bool:
+        # 保护分支规则按仓库缓存并编译为一个正则
+        target_branch = self.webhook_data['pull_request']['base']['ref']
+        return protected_branch_cache.is_protected((self.api_url, self.repo_full_name), target_branch,
+                                                   self.get_protected_branch_names)
 
 
 class PushHandler:
@@ -202,6 +398,7 @@ class PushHandler:
         self.repo_full_name = None
         self.branch_name = None
         self.commit_list = []
+        self.api_url = github_api_url()
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -247,7 +444,7 @@ class PushHandler:
             logger.error("Last commit ID not found.")
             return
 
-        url = f"https://api.github.com/repos/{self.repo_full_name}/commits/{last_commit_id}/comments"
+        url = f"{self.api_url}/repos/{self.repo_full_name}/commits/{last_commit_id}/comments"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
@@ -255,7 +452,7 @@ class PushHandler:
         data = {
             'body': message
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = github_http.post(url, headers=headers, json=data)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -265,12 +462,12 @@ class PushHandler:
 
     def __repository_commits(self, sha: str = "", per_page: int = 100, page: int = 1):
         # 获取仓库提交信息
-        url = f"https://api.github.com/repos/{self.repo_full_name}/commits?sha={sha}&per_page={per_page}&page={page}"
+        url = f"{self.api_url}/repos/{self.repo_full_name}/commits?sha={sha}&per_page={per_page}&page={page}"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = github_http.get(url, headers=headers)
         logger.debug(
             f"Get commits response from GitHub for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -282,12 +479,12 @@ class PushHandler:
             return []
 
     def get_parent_commit_id(self, commit_id: str) -> str:
-        url = f"https://api.github.com/repos/{self.repo_full_name}/commits/{commit_id}"
+        url = f"{self.api_url}/repos/{self.repo_full_name}/commits/{commit_id}"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = github_http.get(url, headers=headers)
         logger.debug(
             f"Get commit response from GitHub: {response.status_code}, {response.text}, URL: {url}")
 
@@ -297,12 +494,12 @@ class PushHandler:
 
     def repository_compare(self, base: str, head: str):
         # 比较两个提交之间的差异
-        url = f"https://api.github.com/repos/{self.repo_full_name}/compare/{base}...{head}"
+        url = f"{self.api_url}/repos/{self.repo_full_name}/compare/{base}...{head}"
         headers = {
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = github_http.get(url, headers=headers)
         logger.debug(
             f"Get changes response from GitHub for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
@@ -0,0 +1,153 @@
+import asyncio
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from biz.gitlab.pager import get_all
+from biz.utils.log import logger
+from biz.utils.polling import async_poll, backoff_delays, merge_request_ready
+from biz.utils.rate_limiter import get_rate_limiter
+
+
+class MergeRequestContext(NamedTuple):
+    """一次 MR review 需要的 GitLab 数据，未请求或请求失败的部分为 None"""
+    commits: Optional[List[dict]]
+    changes: Optional[List[dict]]
+    sha: Dict[str, str]
+
+
+class AsyncGitLabClient:
+    """
+    基于 httpx 的异步 GitLab 客户端，用于并发获取 MR 的元数据
+    原来的流程依次调用 get_merge_request_commits、get_merge_request_changes、get_merge_request_sha，
+    这几个接口互不依赖，并发后总耗时约等于最慢的一个接口
+    保护分支的判断不在这里，统一通过 MergeRequestHandler.target_branch_protected（按项目缓存规则）
+    超时、证书校验与 HttpClient 使用相同的配置（HTTP_CONNECT_TIMEOUT、HTTP_READ_TIMEOUT、GITLAB_SSL_VERIFY）
+    列表接口（commits 等）的分页复用 pager，不单独实现
+    """
+
+    def __init__(self, gitlab_url: str, gitlab_token: str, project_id, merge_request_iid, max_retries: int = 3):
+        self.gitlab_url = gitlab_url.rstrip('/')
+        self.gitlab_token = gitlab_token
+        self.project_id = project_id
+        self.merge_request_iid = merge_request_iid
+        self.max_retries = max_retries
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self):
+        timeout = httpx.Timeout(float(os.getenv('HTTP_READ_TIMEOUT', 60)),
+                                connect=float(os.getenv('HTTP_CONNECT_TIMEOUT', 5)))
+        self._client = httpx.AsyncClient(
+            base_url=f"{self.gitlab_url}/api/v4",
+            headers={'PRIVATE-TOKEN': self.gitlab_token or ''},
+            timeout=timeout,
+            verify=os.getenv('GITLAB_SSL_VERIFY', '0') == '1',
+            transport=httpx.AsyncHTTPTransport(retries=int(os.getenv('HTTP_MAX_RETRIES', 3))),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+        self._client = None
+
+    @property
+    def _host(self) -> str:
+        return urlparse(self.gitlab_url).netloc
+
+    @property
+    def _mr_path(self) -> str:
+        return f"/projects/{self.project_id}/merge_requests/{self.merge_request_iid}"
+
+    async def _get_json(self, path: str, params: dict = None) -> Tuple[int, Any]:
+        """GET 请求，5xx、429 时按指数退避重试，返回 (状态码, json)，网络异常时状态码为 0"""
+        status_code = 0
+        delays = backoff_delays()
+        rate_limiter = get_rate_limiter()
+        for attempt in range(self.max_retries):
+            try:
+                if rate_limiter:
+                    await rate_limiter.async_acquire(self._host)
+                response = await self._client.get(path, params=params)
+                status_code = response.status_code
+                if rate_limiter:
+                    rate_limiter.observe(self._host, status_code, response.headers)
+                logger.debug(f"GET {path} -> {status_code}")
+                if status_code == 200:
+                    return status_code, response.json()
+                if status_code < 500 and status_code != 429:
+                    logger.warn(f"Failed to get {path}: {status_code}, {response.text}")
+                    return status_code, None
+            except httpx.HTTPError as e:
+                logger.error(f"请求 {path} 异常: {e}")
+                status_code = 0
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(next(delays))
+        logger.warn(f"Failed to get {path} after {self.max_retries} attempts, status: {status_code}")
+        return status_code, None
+
+    async def _get_all(self, path: str, params: dict = None) -> Optional[List[dict]]:
+        """
+        获取列表接口的全部分页，分页逻辑与同步调用共用 pager.get_all（在线程中执行，不阻塞事件循环）
+        任意一页请求失败时返回 None，不返回不完整的数据
+        """
+        return await asyncio.to_thread(get_all, f"{self.gitlab_url}/api/v4{path}",
+                                       {'PRIVATE-TOKEN': self.gitlab_token or ''}, params)
+
+    async def merge_request_commits(self) -> Optional[List[dict]]:
+        return await self._get_all(f"{self._mr_path}/commits")
+
+    async def merge_request_changes(self) -> List[dict]:
+        """changes 接口在 MR 刚创建时可能为空，changes 为空且 MR 的 diff 尚未生成好时轮询"""
+
+        async def fetch():
+            status_code, data = await self._get_json(f"{self._mr_path}/changes", {'access_raw_diffs': 'true'})
+            return data if status_code == 200 else None
+
+        data, _ = await async_poll(fetch, lambda mr: mr is None or bool(mr.get('changes')) or merge_request_ready(mr),
+                                   description=f"MR #{self.merge_request_iid} changes")
+        changes = (data or {}).get('changes') or []
+        if data is not None and not changes:
+            logger.warning(f"MR #{self.merge_request_iid} changes is still empty.")
+        return changes
+
+    async def merge_request_sha(self) -> Dict[str, str]:
+        """从 MR 详情的 diff_refs 中获取 head_sha、base_sha、start_sha，diff_refs 未就绪时轮询"""
+
+        async def fetch():
+            status_code, data = await self._get_json(self._mr_path)
+            return data if status_code == 200 else None
+
+        data, _ = await async_poll(fetch, lambda mr: mr is None or merge_request_ready(mr),
+                                   description=f"MR #{self.merge_request_iid} diff_refs")
+        diff_refs = (data or {}).get('diff_refs') or {}
+        result = {key: diff_refs.get(key) or "" for key in ("head_sha", "base_sha", "start_sha")}
+        missing_fields = [k for k, v in result.items() if not v]
+        if missing_fields:
+            logger.error(f"MR #{self.merge_request_iid} 最终缺失SHA字段: {missing_fields}")
+        return result
+
+    async def fetch_merge_request_context(self, include_changes: bool = True) -> MergeRequestContext:
+        """并发获取 MR 的 commits、changes、sha"""
+
+        async def skipped():
+            return None
+
+        commits, changes, sha = await asyncio.gather(
+            self.merge_request_commits(),
+            self.merge_request_changes() if include_changes else skipped(),
+            self.merge_request_sha(),
+        )
+        return MergeRequestContext(commits=commits, changes=changes, sha=sha)
+
+
+def fetch_merge_request_context(handler, include_changes: bool = True) -> MergeRequestContext:
+    """同步调用入口：供 worker 等同步代码使用，根据 MergeRequestHandler 并发获取 MR 数据"""
+
+    async def run():
+        async with AsyncGitLabClient(handler.gitlab_url, handler.gitlab_token, handler.project_id,
+                                     handler.merge_request_iid) as client:
+            return await client.fetch_merge_request_context(include_changes)
+
+    return asyncio.run(run())
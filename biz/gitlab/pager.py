@@ -0,0 +1,87 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import requests
+
+from biz.utils.http_session import gitlab_http
+from biz.utils.log import logger
+
+
+class PageFetchError(Exception):
+    """分页请求失败（HttpClient 已按配置重试），此前产出的数据不完整，调用方应重试或放弃，不能当作全部数据使用"""
+
+    def __init__(self, url: str, page, status_code: int, message: str = ''):
+        super().__init__(f"Failed to get page {page} of {url}: {status_code}, {message}")
+        self.url = url
+        self.page = page
+        self.status_code = status_code
+
+
+def iter_pages(url: str, headers: dict, params: dict = None, per_page: int = 100,
+               concurrency: int = None) -> Iterator[dict]:
+    """
+    流式获取 GitLab 列表接口的全部数据，按页码顺序逐条产出
+        1. 先请求第一页，从 X-Total-Pages 得到总页数，其余页以有界并发（GITLAB_PAGE_CONCURRENCY，默认 4）请求
+        2. 结果过多时 GitLab 不返回 X-Total-Pages，此时按 X-Next-Page 顺序翻页
+    调用方提前停止迭代（如 any() 命中）时不会再请求后续的页；任意一页请求失败时抛出 PageFetchError
+    """
+    params = dict(params or {}, per_page=per_page)
+    response = _get_page(url, headers, params, 1)
+    yield from response.json()
+
+    total_pages = int(response.headers.get('X-Total-Pages') or 0)
+    if total_pages > 1:
+        yield from _iter_remaining_pages(url, headers, params, total_pages, concurrency)
+        return
+
+    next_page = response.headers.get('X-Next-Page')
+    while next_page:
+        response = _get_page(url, headers, params, next_page)
+        yield from response.json()
+        next_page = response.headers.get('X-Next-Page')
+
+
+def _get_page(url: str, headers: dict, params: dict, page) -> requests.Response:
+    try:
+        response = gitlab_http.get(url, headers=headers, params=dict(params, page=page))
+    except requests.exceptions.RequestException as e:
+        raise PageFetchError(url, page, 0, str(e)) from e
+    logger.debug(f"Get page {page} from GitLab: {response.status_code}, URL: {url}")
+    if response.status_code != 200:
+        raise PageFetchError(url, page, response.status_code, response.text)
+    return response
+
+
+def _get_page_items(url: str, headers: dict, params: dict, page: int) -> list:
+    return _get_page(url, headers, params, page).json()
+
+
+def _iter_remaining_pages(url: str, headers: dict, params: dict, total_pages: int,
+                          concurrency: int = None) -> Iterator[dict]:
+    concurrency = max(1, concurrency or int(os.getenv('GITLAB_PAGE_CONCURRENCY', 4)))
+    pages = iter(range(2, total_pages + 1))
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='gitlab-page') as executor:
+        try:
+            # 最多同时请求 concurrency 页，按页码顺序产出，最早的一页完成后再提交下一页
+            for page in pages:
+                pending.append(executor.submit(_get_page_items, url, headers, params, page))
+                if len(pending) >= concurrency:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+    logger.debug(f"GitLab {url} 共 {total_pages} 页")
+
+
+def get_all(url: str, headers: dict, params: dict = None, per_page: int = 100) -> Optional[list]:
+    """获取 GitLab 列表接口的全部数据，任意一页请求失败时返回 None（不返回不完整的数据）"""
+    try:
+        return list(iter_pages(url, headers, params=params, per_page=per_page))
+    except PageFetchError as e:
+        logger.warn(str(e))
+        return None
@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, main
+from urllib.parse import urlparse
+
+from biz.gitlab.async_client import fetch_merge_request_context
+from biz.gitlab.webhook_handler import MergeRequestHandler
+
+
+class MockGitLab(BaseHTTPRequestHandler):
+    """本地模拟的 GitLab API，每个接口固定延迟 delay 秒，routes 为 路径 -> [(状态码, 返回数据), ...]，按调用次数依次返回"""
+    protocol_version = 'HTTP/1.1'
+    delay = 0.2
+    routes = {}
+    calls = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        with self.lock:
+            count = self.calls.get(path, 0)
+            self.calls[path] = count + 1
+        time.sleep(self.delay)
+        responses = self.routes.get(path, [(404, {'message': '404 Not Found'})])
+        status, data = responses[min(count, len(responses) - 1)]
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncGitLabClient(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockGitLab)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.gitlab_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        mr = '/api/v4/projects/1/merge_requests/2'
+        MockGitLab.calls = {}
+        MockGitLab.routes = {
+            f'{mr}/commits': [(200, [{'id': 'c1', 'title': 'fix bug'}])],
+            f'{mr}/changes': [(200, {'changes': [{'new_path': 'a.py', 'diff': '@@ -1,1 +1,1 @@\n-a\n+b'}]})],
+            mr: [(200, {'diff_refs': {'base_sha': 'b', 'head_sha': 'h', 'start_sha': 's'}})],
+        }
+        webhook_data = {
+            'object_kind': 'merge_request',
+            'object_attributes': {'iid': 2, 'target_project_id': 1, 'state': 'opened',
+                                  'source_branch': 'feature', 'target_branch': 'release/1.0'},
+        }
+        self.handler = MergeRequestHandler(webhook_data, 'token', self.gitlab_url)
+
+    def test_fetch_concurrently(self):
+        """三个接口并发请求，总耗时接近单个接口的延迟"""
+        started_at = time.monotonic()
+        context = fetch_merge_request_context(self.handler)
+        elapsed = time.monotonic() - started_at
+
+        self.assertEqual(context.commits[0]['title'], 'fix bug')
+        self.assertEqual(context.changes[0]['new_path'], 'a.py')
+        self.assertEqual(context.sha, {'head_sha': 'h', 'base_sha': 'b', 'start_sha': 's'})
+        self.assertLess(elapsed, MockGitLab.delay * 3)
+
+    def test_skip_optional_parts(self):
+        context = fetch_merge_request_context(self.handler, include_changes=False)
+        self.assertIsNone(context.changes)
+        self.assertNotIn('/api/v4/projects/1/merge_requests/2/changes', MockGitLab.calls)
+
+    def test_retry_on_server_error(self):
+        MockGitLab.routes['/api/v4/projects/1/merge_requests/2/commits'] = [
+            (502, {'message': 'Bad Gateway'}), (200, [{'id': 'c1', 'title': 'fix bug'}])]
+        context = fetch_merge_request_context(self.handler, include_changes=False)
+        self.assertEqual(len(context.commits), 1)
+        self.assertEqual(MockGitLab.calls['/api/v4/projects/1/merge_requests/2/commits'], 2)
+
+    def test_poll_until_diff_ready(self):
+        """MR 刚创建时 diff 尚未生成，轮询到就绪后返回，不再固定等待 10 秒"""
+        mr = '/api/v4/projects/1/merge_requests/2'
+        preparing = {'merge_status': 'preparing', 'diff_refs': None, 'changes': []}
+        ready = {'merge_status': 'can_be_merged', 'diff_refs': {'base_sha': 'b', 'head_sha': 'h', 'start_sha': 's'},
+                 'changes': [{'new_path': 'a.py', 'diff': ''}]}
+        MockGitLab.routes[f'{mr}/changes'] = [(200, preparing), (200, preparing), (200, ready)]
+        MockGitLab.routes[mr] = [(200, preparing), (200, ready)]
+        started_at = time.monotonic()
+        context = fetch_merge_request_context(self.handler)
+        self.assertEqual(len(context.changes), 1)
+        self.assertEqual(context.sha['head_sha'], 'h')
+        self.assertEqual(MockGitLab.calls[f'{mr}/changes'], 3)
+        self.assertLess(time.monotonic() - started_at, 3)
+
+    def test_empty_changes_when_ready(self):
+        """MR 的 diff 已生成好但没有改动时，不再轮询"""
+        MockGitLab.routes['/api/v4/projects/1/merge_requests/2/changes'] = [
+            (200, {'merge_status': 'can_be_merged', 'diff_refs': {'base_sha': 'b', 'head_sha': 'h', 'start_sha': 's'},
+                   'changes': []})]
+        context = fetch_merge_request_context(self.handler)
+        self.assertEqual(context.changes, [])
+        self.assertEqual(MockGitLab.calls['/api/v4/projects/1/merge_requests/2/changes'], 1)
+
+    def test_client_error_returns_none(self):
+        MockGitLab.routes['/api/v4/projects/1/merge_requests/2/commits'] = [(403, {'message': 'Forbidden'})]
+        context = fetch_merge_request_context(self.handler, include_changes=False)
+        self.assertIsNone(context.commits)
+        self.assertEqual(MockGitLab.calls['/api/v4/projects/1/merge_requests/2/commits'], 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.gitlab.pager import PageFetchError, get_all, iter_pages
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, items: list = None, headers: dict = None):
+        self.status_code = status_code
+        self.items = items or []
+        self.headers = headers or {}
+        self.text = ''
+
+    def json(self):
+        return self.items
+
+
+class TestPager(TestCase):
+    def fake_get(self, pages: dict):
+        """pages 为 页码 -> FakeResponse"""
+
+        def get(url, headers=None, params=None):
+            return pages[int(params['page'])]
+
+        return patch('biz.gitlab.pager.gitlab_http.get', side_effect=get)
+
+    def test_total_pages(self):
+        pages = {1: FakeResponse(200, [1, 2], {'X-Total-Pages': '3'}), 2: FakeResponse(200, [3, 4]),
+                 3: FakeResponse(200, [5])}
+        with self.fake_get(pages):
+            self.assertEqual(get_all('https://gitlab.example.com/items', {}), [1, 2, 3, 4, 5])
+
+    def test_failed_page_is_not_truncated(self):
+        pages = {1: FakeResponse(200, [1, 2], {'X-Total-Pages': '3'}), 2: FakeResponse(500),
+                 3: FakeResponse(200, [5])}
+        with self.fake_get(pages):
+            self.assertIsNone(get_all('https://gitlab.example.com/items', {}))
+
+    def test_failed_next_page_raises(self):
+        pages = {1: FakeResponse(200, [1], {'X-Next-Page': '2'}), 2: FakeResponse(502)}
+        with self.fake_get(pages):
+            items = iter_pages('https://gitlab.example.com/items', {})
+            self.assertEqual(next(items), 1)
+            with self.assertRaises(PageFetchError) as context:
+                next(items)
+            self.assertEqual((context.exception.page, context.exception.status_code), ('2', 502))
+
+
+if __name__ == '__main__':
+    main()
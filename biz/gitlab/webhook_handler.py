@@ -1,14 +1,18 @@
 import json
 import os
 import re
-import time
 from urllib.parse import urljoin
-import fnmatch
 import requests
 
+from biz.gitlab.async_client import fetch_merge_request_context
+from biz.gitlab.pager import PageFetchError, get_all, iter_pages
+from biz.utils.diff_parser import count_changes, iter_hunks
+from biz.utils.http_session import gitlab_http
 from biz.utils.log import logger
-from typing import Optional, Dict
-from flask import Flask, request, jsonify
+from biz.utils.polling import merge_request_ready, poll
+from biz.utils.protected_branches import protected_branch_cache
+from typing import Optional, Dict, Iterator, Tuple
+from flask import Flask, request, jsonify, has_request_context
 
 def filter_changes(changes: list):
     '''
@@ -21,16 +25,18 @@ def filter_changes(changes: list):
     filter_deleted_files_changes = [change for change in changes if not change.get("deleted_file")]
 
     # 过滤 `new_path` 以支持的扩展名结尾的元素, 仅保留diff和new_path字段
-    filtered_changes = [
-        {
+    filtered_changes = []
+    for item in filter_deleted_files_changes:
+        if not any(item.get('new_path', '').endswith(ext) for ext in supported_extensions):
+            continue
+        # 一次遍历统计新增、删除行数
+        additions, deletions = count_changes(item.get('diff', ''))
+        filtered_changes.append({
             'diff': item.get('diff', ''),
             'new_path': item['new_path'],
-            'additions': len(re.findall(r'^\+(?!\+\+)', item.get('diff', ''), re.MULTILINE)),
-            'deletions': len(re.findall(r'^-(?!--)', item.get('diff', ''), re.MULTILINE))
-        }
-        for item in filter_deleted_files_changes
-        if any(item.get('new_path', '').endswith(ext) for ext in supported_extensions)
-    ]
+            'additions': additions,
+            'deletions': deletions
+        })
     return filtered_changes
 
 def filter_diffs_by_file_types(diffs: list):
@@ -78,28 +84,15 @@ def preprocessing_diffs(original_diffs: list) -> list:
         3. 最终组装为一个diffs进行返回
     """
     result = []
-    # 精准匹配diff块结构：
-    # @@ 行号信息（如-61,7 +61,7） @@ 函数定义（如def divide_numbers...）
-    # 然后匹配所有内容直到下一个@@或结束（包括空行、注释）
-    diff_pattern = re.compile(
-        r'@@ -?\d+,\d+ [+-]?\d+,\d+ @@.*?(?=@@|$)',  # 核心：匹配完整标记+内容
-        re.DOTALL  # 确保.匹配换行符
-    )
-    
     for item in original_diffs:
         diff_content = item['diff']
-        # 提取所有完整diff块
-        diff_blocks = diff_pattern.findall(diff_content)
-        
-        # 过滤空块，保留原始格式（不trim，避免丢失空行）
-        valid_blocks = [block for block in diff_blocks if block.strip()]
-        
-        # 生成拆分后的对象
-        for block in valid_blocks:
+        # 单次遍历拆分改动点，每个改动点从 @@ 头部到下一个改动点之前（保留原始内容，含换行、空格）
+        # 头部中省略行数的写法（如 @@ -1 +1 @@）同样支持
+        for hunk in iter_hunks(diff_content, keep_lines=False):
             new_item = item.copy()
-            new_item['diff'] = block  # 保留原始内容（含换行、空格）
+            new_item['diff'] = hunk.text(diff_content)
             result.append(new_item)
-    
+
     return result
 
 class MergeRequestHandler:
@@ -113,6 +106,9 @@ class MergeRequestHandler:
         self.action = None
         self.source_branch = None
         self.target_branch = None
+        self.event_action = None
+        self.oldrev = None
+        self.last_commit_id = None
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -129,11 +125,48 @@ class MergeRequestHandler:
         self.action = merge_request.get('state')
         self.source_branch = merge_request.get('source_branch')
         self.target_branch = merge_request.get('target_branch')
-        
+        # webhook 的 action（open/reopen/update/...），update 且带有 oldrev 时表示 MR 有新的提交
+        self.event_action = merge_request.get('action')
+        self.oldrev = merge_request.get('oldrev')
+        self.last_commit_id = (merge_request.get('last_commit') or {}).get('id')
+
+
+    def get_private_token(self) -> Optional[str]:
+        """
+        获取GitLab Token（优先级：请求头 > 环境变量 > webhook 传入的 token）
+        worker 的子进程、review 线程池中没有 Flask 请求上下文，此时直接跳过请求头
+        """
+        header_token = request.headers.get('X-Gitlab-Token') if has_request_context() else None
+        return header_token or os.getenv('GITLAB_ACCESS_TOKEN') or self.gitlab_token
+
+    def fetch_merge_request_context(self, include_changes: bool = True):
+        """
+        并发获取 commits、changes、sha（同步调用，内部使用 AsyncGitLabClient）
+        :return: MergeRequestContext
+        """
+        return fetch_merge_request_context(self, include_changes=include_changes)
+
+    def _get_merge_request_detail(self) -> Optional[dict]:
+        """
+        获取MR详情，请求失败时返回 None
+        API: GET /projects/:id/merge_requests/:merge_request_iid
+        """
+        url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}"
+        headers = {'PRIVATE-TOKEN': self.gitlab_token}
+        try:
+            response = gitlab_http.get(url, headers=headers)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"网络请求异常: {str(e)}")
+            return None
+        if response.status_code != 200:
+            logger.error(f"无法获取MR详情，HTTP错误: {response.status_code}, {response.text}")
+            return None
+        return response.json()
 
     def get_merge_request_sha(self) -> Dict[str, str]:
         """
         获取合并请求的相关SHA值（head_sha, base_sha, start_sha）
+        MR 刚创建时 GitLab 可能还没生成 diff_refs，按指数退避轮询直到就绪（见 biz.utils.polling）
         
         返回:
             Dict[str, str]: 包含三个SHA值的字典，若获取失败则值为空字符串
@@ -149,85 +182,20 @@ class MergeRequestHandler:
             logger.warning(f"不支持的事件类型: {self.event_type}，仅支持'merge_request'事件")
             return result
 
-        # 配置请求参数
-        max_retries = 3
-        headers = {'PRIVATE-TOKEN': self.gitlab_token}
-        mr_detail_url = f"{self.gitlab_url}/api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}"
-        
-        # 重试获取MR详情
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"第 {attempt + 1}/{max_retries} 次请求MR详情: {mr_detail_url}")
-                # 添加超时控制，防止请求无限阻塞
-                mr_response = requests.get(
-                    mr_detail_url,
-                    headers=headers,
-                    timeout=10  # 10秒超时
-                )
-                mr_response.raise_for_status()  # 触发HTTP错误
-                mr_detail = mr_response.json()
-                
-                # 提取diff_refs信息
-                diff_refs = mr_detail.get("diff_refs", {})
-                result["base_sha"] = diff_refs.get("base_sha", "")
-                result["head_sha"] = diff_refs.get("head_sha", "")
-                result["start_sha"] = diff_refs.get("start_sha", "")
-                
-                # 检查缺失的SHA字段
-                missing_fields = [k for k, v in result.items() if not v]
-                if not missing_fields:
-                    logger.info(f"成功获取MR #{self.merge_request_iid} 的SHA信息")
-                    break  # 全部获取成功，退出重试循环
-                
-                # 部分字段缺失，记录并准备重试
-                logger.warning(
-                    f"MR #{self.merge_request_iid} 缺失以下SHA字段: {missing_fields}，将重试"
-                )
-                if attempt < max_retries - 1:
-                    sleep_time = 2 **attempt  # 指数退避策略
-                    logger.info(f"等待 {sleep_time} 秒后重试")
-                    time.sleep(sleep_time)
-                    
-            except requests.exceptions.HTTPError as e:
-                status_code = mr_response.status_code
-                logger.error(f"HTTP错误 (状态码: {status_code}): {str(e)}")
-                
-                # 仅对服务器错误(5xx)和限流(429)进行重试
-                if status_code >= 500 or status_code == 429:
-                    if attempt < max_retries - 1:
-                        sleep_time = 2** attempt
-                        logger.info(f"服务器错误，等待 {sleep_time} 秒后重试")
-                        time.sleep(sleep_time)
-                        continue
-                
-                # 客户端错误无需重试，直接返回当前结果
-                logger.error(f"无法获取MR详情，HTTP错误: {status_code}")
-                break
-                
-            except requests.exceptions.RequestException as e:
-                # 处理其他网络请求异常（超时、连接错误等）
-                logger.error(f"网络请求异常: {str(e)}")
-                if attempt < max_retries - 1:
-                    sleep_time = 2 **attempt
-                    logger.info(f"网络错误，等待 {sleep_time} 秒后重试")
-                    time.sleep(sleep_time)
-                    continue
-                logger.error("达到最大重试次数，网络异常未解决")
-                break
-                
-            except Exception as e:
-                # 处理其他未知异常
-                logger.error(f"获取MR信息时发生未知错误: {str(e)}")
-                break
+        # 请求失败（返回 None）时不再轮询，HTTP 层已对 5xx、429、网络异常做过重试
+        mr_detail, _ = poll(self._get_merge_request_detail,
+                            lambda detail: detail is None or merge_request_ready(detail),
+                            description=f"MR #{self.merge_request_iid} diff_refs")
+        diff_refs = (mr_detail or {}).get("diff_refs") or {}
+        for key in result:
+            result[key] = diff_refs.get(key) or ""
 
         # 最终检查结果完整性
         missing_fields = [k for k, v in result.items() if not v]
         if missing_fields:
-            logger.error(
-                f"MR #{self.merge_request_iid} 最终缺失SHA字段: {missing_fields} "
-                f"(已尝试 {max_retries} 次)"
-            )
-        
+            logger.error(f"MR #{self.merge_request_iid} 最终缺失SHA字段: {missing_fields}")
+        else:
+            logger.info(f"成功获取MR #{self.merge_request_iid} 的SHA信息")
         return result
 
     def get_merge_request_changes(self) -> list:
@@ -243,37 +211,29 @@ class MergeRequestHandler:
             logger.warn(f"Invalid event type: {self.event_type}. Only 'merge_request' event is supported now.")
             return []
 
-        # Gitlab merge request changes API可能存在延迟，多次尝试
-        max_retries = 3  # 最大重试次数
-        retry_delay = 10  # 重试间隔时间（秒）
-        for attempt in range(max_retries):
-            # 调用 GitLab API 获取 Merge Request 的 changes
-            url = urljoin(f"{self.gitlab_url}/",
-                          f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/changes?access_raw_diffs=true")
-            headers = {
-                'PRIVATE-TOKEN': self.gitlab_token
-            }
-            response = requests.get(url, headers=headers, verify=False)
-            logger.debug(
-                f"Get changes response from GitLab (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
-
-            # 检查请求是否成功
-            if response.status_code == 200:
-                changes = response.json().get('changes', [])
-                if changes:
-                    return changes
-                else:
-                    logger.info(
-                        f"Changes is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
-                    time.sleep(retry_delay)
-            else:
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/changes?access_raw_diffs=true")
+        headers = {
+            'PRIVATE-TOKEN': self.gitlab_token
+        }
+
+        def fetch():
+            response = gitlab_http.get(url, headers=headers)
+            logger.debug(f"Get changes response from GitLab: {response.status_code}, {response.text}, URL: {url}")
+            if response.status_code != 200:
                 logger.warn(f"Failed to get changes from GitLab (URL: {url}): {response.status_code}, {response.text}")
-                return []
+                return None
+            return response.json()
 
-        logger.warning(f"Max retries ({max_retries}) reached. Changes is still empty.")
-        return []  # 达到最大重试次数后返回空列表
+        # Gitlab merge request changes API可能存在延迟：changes 为空且 MR 的 diff 尚未生成好时轮询
+        data, _ = poll(fetch, lambda mr: mr is None or bool(mr.get('changes')) or merge_request_ready(mr),
+                       description=f"MR #{self.merge_request_iid} changes")
+        changes = (data or {}).get('changes') or []
+        if data is not None and not changes:
+            logger.warning(f"Changes is still empty, URL: {url}")
+        return changes
 
-    def get_merge_request_diffs(self) -> list:
+    def get_merge_request_diffs(self) -> Optional[list]:
         """
         原方法: get_merge_request_changes，相较于原方法修改了获取改动的gitlab api 为 /diffs
         API: GET /projects/:id/merge_requests/:merge_request_iid/diffs
@@ -285,34 +245,34 @@ class MergeRequestHandler:
             logger.warn(f"Invalid event type: {self.event_type}. Only 'merge_request' event is supported now.")
             return []
 
-        # Gitlab merge request diffs API可能存在延迟，多次尝试
-        max_retries = 3  # 最大重试次数
-        retry_delay = 10  # 重试间隔时间（秒）
-        for attempt in range(max_retries):
-            # 调用 GitLab API 获取 Merge Request 的 diffs
-            url = urljoin(f"{self.gitlab_url}/",
-                          f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/diffs")
-            headers = {
-                'PRIVATE-TOKEN': self.gitlab_token
-            }
-            response = requests.get(url, headers=headers, verify=False)
-            logger.debug(
-                f"Get diffs response from GitLab (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
-            # 检查请求是否成功
-            if response.status_code == 200:
-                diffs = response.json()
-                if diffs:
-                    return diffs
-                else:
-                    logger.info(
-                        f"diffs is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
-                    time.sleep(retry_delay)
-            else:
-                logger.warn(f"Failed to get diffs from GitLab (URL: {url}): {response.status_code}, {response.text}")
-                return []
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/diffs")
+        headers = {
+            'PRIVATE-TOKEN': self.gitlab_token
+        }
 
-        logger.warning(f"Max retries ({max_retries}) reached. diffs is still empty.")
-        return []  # 达到最大重试次数后返回空列表
+        def fetch():
+            """返回 (diffs, 是否结束轮询)，请求失败时 diffs 为 None 并结束；diffs 为空时通过 MR 详情判断 diff 是否已生成好"""
+            diffs = get_all(url, headers)
+            return diffs, diffs is None or bool(diffs) or merge_request_ready(self._get_merge_request_detail())
+
+        # 请求失败时返回 None，由调用方决定重试或放弃
+        (diffs, _), _ = poll(fetch, lambda result: result[1], description=f"MR #{self.merge_request_iid} diffs")
+        return diffs
+
+    def iter_merge_request_diffs(self, per_page: int = None) -> Iterator[dict]:
+        """
+        流式获取MR的改动（/diffs 接口分页），按文件逐个产出，调用方可以边下载边过滤、review
+        最多同时持有 GITLAB_PAGE_CONCURRENCY 页（每页 DIFF_STREAM_PAGE_SIZE 个文件，默认 20）的数据
+        调用前应确认 MR 的 diff 已生成（如已获取到 diff_refs）；请求失败（包括 GitLab 不支持该接口）时抛出 PageFetchError
+        """
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/diffs")
+        headers = {
+            'PRIVATE-TOKEN': self.gitlab_token
+        }
+        per_page = per_page or int(os.getenv('DIFF_STREAM_PAGE_SIZE', 20))
+        return iter_pages(url, headers, per_page=per_page)
 
     def get_merge_request_diffs_from_base_sha_to_head_sha(self) -> list:
         """
@@ -323,58 +283,47 @@ class MergeRequestHandler:
         当前项目不支持diffs接口
 
         该方法暂时不使用了，还是使用changes接口...
+        get_merge_request_sha 已轮询到 diff_refs 就绪，两个提交之间的 compare 结果是确定的，不需要再重试
         """
-        max_retries = 3  # 最大重试次数
-        retry_delay = 10  # 重试间隔时间（秒）
-        headers = {
-            'PRIVATE-TOKEN': self.gitlab_token
-        }
         sha = self.get_merge_request_sha()
+        if not sha['base_sha'] or not sha['head_sha']:
+            return []
         # 根据获取的 mr 信息，通过 sha 获取完整的 diffs 内容
-        for attempt in range(max_retries):
-            # 调用 GitLab API 获取 Merge Request 的 diffs
-            url = urljoin(f"{self.gitlab_url}/",
-                          f"api/v4/projects/{self.project_id}/repository/compare?from={sha['base_sha']}&to={sha['head_sha']}")
-            response = requests.get(url, headers=headers, verify=False)
-            logger.debug(
-                f"Get diffs response from GitLab (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
-
-            # 检查请求是否成功
-            if response.status_code == 200:
-                diffs = response.json().get('diffs', [])
-                if diffs:
-                    return diffs
-                else:
-                    logger.info(
-                        f"diffs is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
-                    time.sleep(retry_delay)
-            else:
-                logger.warn(f"Failed to get diffs from GitLab (URL: {url}): {response.status_code}, {response.text}")
-                return []
+        return self.repository_compare(sha['base_sha'], sha['head_sha'])
 
-        logger.warning(f"Max retries ({max_retries}) reached. diffs is still empty.")
-        return []  # 达到最大重试次数后返回空列表
+    def repository_compare(self, from_sha: str, to_sha: str) -> list:
+        """
+        比较两个提交之间的差异，用于MR更新时获取两次head之间新增的改动
+        API: GET /projects/:id/repository/compare
+        """
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/repository/compare?from={from_sha}&to={to_sha}")
+        headers = {
+            'Private-Token': self.gitlab_token
+        }
+        response = gitlab_http.get(url, headers=headers)
+        logger.debug(
+            f"Get changes response from GitLab for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
+        if response.status_code == 200:
+            return response.json().get('diffs', [])
+        else:
+            logger.warn(
+                f"Failed to get changes for repository_compare: {response.status_code}, {response.text}")
+            return []
 
-    def get_merge_request_commits(self) -> list:
+    def get_merge_request_commits(self) -> Optional[list]:
         # 检查是否为 Merge Request Hook 事件
         if self.event_type != 'merge_request':
             return []
 
-        # 调用 GitLab API 获取 Merge Request 的 commits
+        # 调用 GitLab API 获取 Merge Request 的 commits（全部分页），请求失败时返回 None
         url = urljoin(f"{self.gitlab_url}/",
                       f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/commits")
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
-        logger.debug(f"Get commits response from gitlab: {response.status_code}, {response.text}")
-        # 检查请求是否成功
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.warn(f"Failed to get commits: {response.status_code}, {response.text}")
-            return []
+        return get_all(url, headers)
 
     def add_merge_request_notes(self, review_result):
         url = urljoin(f"{self.gitlab_url}/",
@@ -386,13 +335,33 @@ class MergeRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = gitlab_http.post(url, headers=headers, json=data)
         logger.debug(f"Add notes to gitlab {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Note successfully added to merge request.")
+            return response.json()
         else:
             logger.error(f"Failed to add note: {response.status_code}")
             logger.error(response.text)
+            return None
+
+    def update_merge_request_note(self, note_id, body: str) -> bool:
+        """
+        修改MR的评论内容
+        API: PUT /projects/:id/merge_requests/:merge_request_iid/notes/:note_id
+        """
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/notes/{note_id}")
+        headers = {
+            'Private-Token': self.gitlab_token,
+            'Content-Type': 'application/json'
+        }
+        response = gitlab_http.put(url, headers=headers, json={'body': body})
+        logger.debug(f"Update note {note_id} on gitlab {url}: {response.status_code}")
+        if response.status_code == 200:
+            return True
+        logger.error(f"Failed to update note {note_id}: {response.status_code}, {response.text}")
+        return False
 
     def add_merge_request_discussions_on_row(
         self,
@@ -417,7 +386,7 @@ class MergeRequestHandler:
         # Local URL: :4000/14.10/ee/api/discussions.html#create-new-merge-request-thread
 
         # 获取GitLab Token（优先级：请求头 > 环境变量 ）
-        private_token = request.headers.get('X-Gitlab-Token') or os.getenv('GITLAB_ACCESS_TOKEN')
+        private_token = self.get_private_token()
         if not private_token:
             # 可以根据实际场景选择返回None、空字符串或其他合适的值
             logger.error("Get GITLAB_ACCESS_TOKEN is None, please check env.")
@@ -432,22 +401,10 @@ class MergeRequestHandler:
         
         payload = {
             "body": content,
-            "position": {
-                "base_sha": base_sha,
-                "head_sha": head_sha,
-                "start_sha": start_sha,
-                "old_path": old_path,
-                "new_path": new_path,
-                "position_type": "text"  # 必须指定为 text（文本文件）
-            }
+            "position": self._build_position(base_sha, head_sha, start_sha, old_path, new_path, old_line, new_line)
         }
         
-        if old_line is not None:
-            payload["position"]["old_line"] = old_line
-        if new_line is not None:
-            payload["position"]["new_line"] = new_line
-        
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = gitlab_http.post(url, headers=headers, data=json.dumps(payload))
         
         if response.status_code == 201:
             logger.info(f"向文件{new_path}的{old_line}~{new_line}行添加评论成功")
@@ -460,23 +417,94 @@ class MergeRequestHandler:
             self.add_merge_request_notes(f"注意：本次行内评论由于异常原因未添加成功，请根据AICR查看对应的行：\n{content}")
             return None
 
-    def target_branch_protected(self) -> bool:
+    @staticmethod
+    def _build_position(base_sha, head_sha, start_sha, old_path, new_path, old_line=None, new_line=None) -> dict:
+        """行内评论的位置信息，discussions 与 draft_notes 接口通用"""
+        position = {
+            "base_sha": base_sha,
+            "head_sha": head_sha,
+            "start_sha": start_sha,
+            "old_path": old_path,
+            "new_path": new_path,
+            "position_type": "text"  # 必须指定为 text（文本文件）
+        }
+        if old_line is not None:
+            position["old_line"] = old_line
+        if new_line is not None:
+            position["new_line"] = new_line
+        return position
+
+    def add_merge_request_draft_note(self, content, base_sha, head_sha, start_sha, old_path, new_path,
+                                     old_line=None, new_line=None) -> Tuple[int, Optional[dict]]:
+        """
+        对MR的指定行添加草稿评论，草稿在 bulk_publish 之前对其他人不可见，也不会发送通知
+        API: POST /projects/:id/merge_requests/:merge_request_iid/draft_notes
+        :return: (状态码, 草稿评论)，失败时草稿评论为 None
+        """
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/draft_notes")
+        headers = {
+            'Private-Token': self.get_private_token(),
+            'Content-Type': 'application/json'
+        }
+        payload = {
+            'note': content,
+            'position': self._build_position(base_sha, head_sha, start_sha, old_path, new_path, old_line, new_line)
+        }
+        response = gitlab_http.post(url, headers=headers, json=payload)
+        if response.status_code == 201:
+            logger.debug(f"向文件{new_path}的{old_line}~{new_line}行添加草稿评论成功")
+            return response.status_code, response.json()
+        logger.error(f"向文件{new_path}的{old_line}~{new_line}行添加草稿评论失败: {response.status_code}, {response.text}")
+        return response.status_code, None
+
+    def bulk_publish_draft_notes(self) -> bool:
+        """
+        一次发布当前用户在MR上的所有草稿评论（只发送一次通知）
+        API: POST /projects/:id/merge_requests/:merge_request_iid/draft_notes/bulk_publish
+        """
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}"
+                      f"/draft_notes/bulk_publish")
+        response = gitlab_http.post(url, headers={'Private-Token': self.get_private_token()})
+        if response.status_code in (200, 204):
+            logger.info("Draft notes successfully published to merge request.")
+            return True
+        logger.error(f"Failed to publish draft notes: {response.status_code}, {response.text}")
+        return False
+
+    def delete_merge_request_draft_note(self, draft_note_id) -> bool:
+        """
+        删除草稿评论
+        API: DELETE /projects/:id/merge_requests/:merge_request_iid/draft_notes/:draft_note_id
+        """
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}"
+                      f"/draft_notes/{draft_note_id}")
+        response = gitlab_http.delete(url, headers={'Private-Token': self.get_private_token()})
+        if response.status_code == 204:
+            return True
+        logger.warn(f"Failed to delete draft note {draft_note_id}: {response.status_code}, {response.text}")
+        return False
+
+    def get_protected_branch_names(self) -> Optional[list]:
+        """获取项目的所有保护分支名（可能包含通配符），没有保护分支时返回空列表，请求失败（任意一页）时返回 None（不缓存）"""
         url = urljoin(f"{self.gitlab_url}/",
                       f"api/v4/projects/{self.project_id}/protected_branches")
         headers = {
             'Private-Token': self.gitlab_token,
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers, verify=False)
-        logger.debug(f"Get protected branches response from gitlab: {response.status_code}, {response.text}")
-        # 检查请求是否成功
-        if response.status_code == 200:
-            data = response.json()
-            target_branch = self.webhook_data['object_attributes']['target_branch']
-            return any(fnmatch.fnmatch(target_branch, item['name']) for item in data)
-        else:
-            logger.warn(f"Failed to get protected branches: {response.status_code}, {response.text}")
-            return False
+        items = get_all(url, headers)
+        if items is None:
+            return None
+        return [item['name'] for item in items]
+
+    def target_branch_protected(self) -> bool:
+        # 保护分支规则按项目缓存并编译为一个正则
+        target_branch = self.webhook_data['object_attributes']['target_branch']
+        return protected_branch_cache.is_protected((self.gitlab_url, self.project_id), target_branch,
+                                                   self.get_protected_branch_names)
 
     def get_gitlab_file_content(
         self,
@@ -503,7 +531,7 @@ class MergeRequestHandler:
             文件内容字符串；获取失败则返回None
         """
         # 获取GitLab Token（优先级：请求头 > 环境变量 ）
-        private_token = request.headers.get('X-Gitlab-Token') or os.getenv('GITLAB_ACCESS_TOKEN')
+        private_token = self.get_private_token()
         if not private_token:
             # 可以根据实际场景选择返回None、空字符串或其他合适的值
             logger.error("Get GITLAB_ACCESS_TOKEN is None, please check env.")
@@ -530,7 +558,7 @@ class MergeRequestHandler:
         }
         
         try:
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = gitlab_http.get(url, params=params, headers=headers, timeout=10)
             response.raise_for_status()  # 触发HTTP错误状态码的异常
             logger.debug(f"从{ref}获取{file_path}文件内容成功")
             logger.debug(f"文件内容为：\n{response.text}")
@@ -609,7 +637,7 @@ class PushHandler:
         data = {
             'note': message
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = gitlab_http.post(url, headers=headers, json=data)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -617,28 +645,23 @@ class PushHandler:
             logger.error(f"Failed to add comment: {response.status_code}")
             logger.error(response.text)
 
-    def __repository_commits(self, ref_name: str = "", since: str = "", until: str = "", pre_page: int = 100,
-                             page: int = 1):
-        # 获取仓库提交信息
-        url = f"{urljoin(f'{self.gitlab_url}/', f'api/v4/projects/{self.project_id}/repository/commits')}?ref_name={ref_name}&since={since}&until={until}&per_page={pre_page}&page={page}"
+    def __repository_commits(self, ref_name: str = "", since: str = "", until: str = "", pre_page: int = 100):
+        """流式获取仓库提交信息（全部分页），调用方只需要前几条时可以提前停止迭代"""
+        url = urljoin(f'{self.gitlab_url}/', f'api/v4/projects/{self.project_id}/repository/commits')
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
-        logger.debug(
-            f"Get commits response from GitLab for repository_commits: {response.status_code}, {response.text}, URL: {url}")
-
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.warn(
-                f"Failed to get commits for ref {ref_name}: {response.status_code}, {response.text}")
-            return []
+        params = {'ref_name': ref_name, 'since': since, 'until': until}
+        return iter_pages(url, headers, params=params, per_page=pre_page)
 
     def get_parent_commit_id(self, commit_id: str) -> str:
-        commits = self.__repository_commits(ref_name=commit_id, pre_page=1, page=1)
-        if commits and commits[0].get('parent_ids', []):
-            return commits[0].get('parent_ids', [])[0]
+        try:
+            commit = next(self.__repository_commits(ref_name=commit_id, pre_page=1), None)
+        except PageFetchError as e:
+            logger.warn(str(e))
+            return ""
+        if commit and commit.get('parent_ids', []):
+            return commit.get('parent_ids', [])[0]
         return ""
 
     def repository_compare(self, before: str, after: str):
@@ -647,7 +670,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = gitlab_http.get(url, headers=headers)
         logger.debug(
             f"Get changes response from GitLab for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
@@ -3,10 +3,13 @@ from typing import List, Dict, Optional, Union
 
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.log import logger
+from biz.utils.token_util import count_tokens
 
 
 class BaseClient:
     """ Base class for chat models client. """
+    provider = ''
+    default_model = ''
 
     def ping(self) -> bool:
         """Ping the model to check connectivity."""
@@ -26,6 +29,6 @@ class BaseClient:
         """
 
     # token计算接口
-    @abstractmethod
     def count_tokens(self, text: str) -> int:
-        """不同llm要提供对应的计算文本的token数量方法"""
\ No newline at end of file
+        """计算文本的token数量，分词器由 token_util 的注册表按 provider/model 选择并缓存"""
+        return count_tokens(text, self.provider, self.default_model)
\ No newline at end of file
@@ -10,6 +10,8 @@ import requests
 
 
 class DeepSeekClient(BaseClient):
+    provider = 'deepseek'
+
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
         self.base_url = os.getenv("DEEPSEEK_API_BASE_URL", "https://api.deepseek.com")
@@ -13,6 +13,7 @@ import requests
 
 class OllamaClient(BaseClient):
     """Ollama client for chat models."""
+    provider = 'ollama'
 
     def __init__(self, api_base_url: str = None):
         self.api_base_url = api_base_url or os.getenv("OLLAMA_API_BASE_URL", "http://localhost:11434")
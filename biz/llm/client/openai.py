@@ -1,18 +1,18 @@
 import os
 from typing import Dict, List, Optional, Union
-from transformers import AutoTokenizer, PreTrainedTokenizer
-import tiktoken
 
 from openai import OpenAI
 
 from biz.llm.client.base import BaseClient
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.log import logger
+from biz.utils.token_util import count_tokens
 import openai
 
 
 class OpenAIClient(BaseClient):
     """OpenAI client for chat models."""
+    provider = 'openai'
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
@@ -58,22 +58,11 @@ class EnhancedOpenAIClient(OpenAIClient):
         Returns:
             文本的token数量
         备注：
-            没有单独适配qwen模型, 未调通, gpt和qwen计算出来的token数为gpt多于qwen 10%左右
+            未配置 QWEN_TOKENIZER 时 qwen 模型使用 cl100k_base 计算，gpt和qwen计算出来的token数为gpt多于qwen 10%左右
         """
         used_model = model if model is not NOT_GIVEN else self.default_model
-        
-        if not text:
-            return 0
-            
-        try:
-            # 获取指定模型的编码方式
-            encoding = tiktoken.encoding_for_model(used_model)
-            # 计算token数量
-            return len(encoding.encode(text))
-        except KeyError:
-            # 未找到模型时，使用默认编码方式
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
+        # 分词器按 provider/model 在进程内缓存，qwen 模型配置 QWEN_TOKENIZER 后使用对应分词器
+        return count_tokens(text, self.provider, used_model)
 
     def completions(self,
                     messages: List[Dict[str, str]],
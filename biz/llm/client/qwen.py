@@ -11,6 +11,7 @@ import dashscope
 
 class QwenClient(BaseClient):
     """Qwen client for chat models."""
+    provider = 'qwen'
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("QWEN_API_KEY")
@@ -9,6 +9,7 @@ import zhipuai
 
 class ZhipuaiClient(BaseClient):
     """Zhipuai client for chat models."""
+    provider = 'zhipuai'
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("ZHIPUAI_API_KEY")
@@ -1,4 +1,5 @@
 import os
+import threading
 
 from biz.llm.client.base import BaseClient
 from biz.llm.client.deepseek import DeepSeekClient
@@ -8,10 +9,26 @@ from biz.llm.client.qwen import QwenClient
 from biz.llm.client.zhipuai import ZhipuaiClient as ZhipuAIClient
 from biz.utils.log import logger
 
+# 各供应商对应的模型环境变量，用于区分同一供应商下不同模型的客户端
+MODEL_ENV_KEYS = {
+    'zhipuai': 'ZHIPUAI_API_MODEL',
+    'openai': 'OPENAI_API_MODEL',
+    'deepseek': 'DEEPSEEK_API_MODEL',
+    'qwen': 'QWEN_API_MODEL',
+    'ollama': 'OLLAMA_API_MODEL',
+}
+
+# 进程级的客户端、reviewer 注册表，key 为 (provider, model)
+# 客户端内部持有 HTTP 连接池，复用后同一进程内的多次调用无需重复初始化和 TLS 握手
+_clients = {}
+_reviewers = {}
+_registry_lock = threading.RLock()
+
 
 class Factory:
     @staticmethod
-    def getClient(provider: str = None) -> BaseClient:
+    def createClient(provider: str = None) -> BaseClient:
+        """每次都创建一个新的客户端，一般情况请使用 getClient 复用已有客户端"""
         provider = provider or os.getenv("LLM_PROVIDER", "openai")
         chat_model_providers = {
             'zhipuai': lambda: ZhipuAIClient(),
@@ -26,3 +43,45 @@ class Factory:
             return provider_func()
         else:
             raise Exception(f'Unknown chat model provider: {provider}')
+
+    @staticmethod
+    def registry_key(provider: str = None) -> tuple:
+        provider = provider or os.getenv("LLM_PROVIDER", "openai")
+        return provider, os.getenv(MODEL_ENV_KEYS.get(provider, ''), '')
+
+    @staticmethod
+    def getClient(provider: str = None) -> BaseClient:
+        """获取进程内共享的客户端（线程安全），同一 provider/model 只初始化一次"""
+        key = Factory.registry_key(provider)
+        client = _clients.get(key)
+        if client is None:
+            with _registry_lock:
+                client = _clients.get(key)
+                if client is None:
+                    logger.info(f"初始化 LLM 客户端: provider={key[0]}, model={key[1]}")
+                    client = Factory.createClient(key[0])
+                    _clients[key] = client
+        return client
+
+    @staticmethod
+    def getReviewer(provider: str = None):
+        """获取进程内共享的 CodeReviewer，reviewer 本身无状态，可被多个线程同时使用"""
+        # 延迟导入，避免与 code_reviewer 循环引用
+        from biz.utils.code_reviewer import CodeReviewer
+
+        key = Factory.registry_key(provider)
+        reviewer = _reviewers.get(key)
+        if reviewer is None:
+            with _registry_lock:
+                reviewer = _reviewers.get(key)
+                if reviewer is None:
+                    reviewer = CodeReviewer()
+                    _reviewers[key] = reviewer
+        return reviewer
+
+    @staticmethod
+    def reset():
+        """清空注册表，配置变更后可调用使下次获取时重新初始化"""
+        with _registry_lock:
+            _clients.clear()
+            _reviewers.clear()
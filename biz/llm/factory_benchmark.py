@@ -0,0 +1,81 @@
+"""
+LLM 客户端注册表的性能对比：每个改动点重新创建客户端 vs 复用进程内共享的客户端
+
+使用本地模拟的 OpenAI 兼容接口，统计每个改动点的额外开销（客户端初始化 + 建立连接 + 请求）
+运行方式: python -m biz.llm.factory_benchmark [改动点数量]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from biz.llm.factory import Factory
+
+COMPLETION_BODY = json.dumps({
+    "id": "chatcmpl-benchmark",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION_BODY)))
+        self.end_headers()
+        self.wfile.write(COMPLETION_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _review_one_hunk(get_client):
+    # 与 v2 流程一致：count_tokens、review 各获取一次客户端，review 发起一次请求
+    # token 计算两种方式开销相同（且依赖 tiktoken 编码表下载），这里只统计客户端和连接的开销
+    get_client()
+    client = get_client()
+    client.client.chat.completions.create(model=client.default_model,
+                                          messages=[{"role": "user", "content": "review"}])
+
+
+def run(hunks: int = 50):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["LLM_PROVIDER"] = "openai"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_API_MODEL"] = "gpt-4o-mini"
+    os.environ["OPENAI_API_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    # 预热：SDK 导入等一次性开销不计入对比
+    _review_one_hunk(Factory.createClient)
+
+    start = time.perf_counter()
+    for _ in range(hunks):
+        _review_one_hunk(Factory.createClient)
+    before = (time.perf_counter() - start) / hunks
+
+    Factory.reset()
+    start = time.perf_counter()
+    for _ in range(hunks):
+        _review_one_hunk(Factory.getClient)
+    after = (time.perf_counter() - start) / hunks
+
+    server.shutdown()
+    print(f"hunks: {hunks}")
+    print(f"每个改动点新建客户端: {before * 1000:.2f} ms/hunk")
+    print(f"复用注册表中的客户端: {after * 1000:.2f} ms/hunk")
+    print(f"加速比: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,152 @@
+import fnmatch
+import os
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import lizard
+
+from biz.utils.diff_parser import count_changes, first_hunk
+from biz.utils.log import logger
+from biz.utils.token_util import token_estimate_label
+
+# 不同语言的风险权重，可通过 REVIEW_RISK_LANGUAGE_WEIGHTS=".py:1.1,.md:0.3" 覆盖
+DEFAULT_LANGUAGE_WEIGHTS = {
+    '.c': 1.3, '.cpp': 1.3, '.h': 1.3, '.go': 1.2, '.java': 1.2, '.php': 1.2, '.sql': 1.3,
+    '.py': 1.1, '.js': 1.1, '.ts': 1.1, '.vue': 1.0, '.proto': 0.8, '.yml': 0.6, '.yaml': 0.6, '.md': 0.3,
+}
+
+# 敏感路径，命中后提高风险分，可通过 REVIEW_SENSITIVE_PATHS 覆盖（逗号分隔的 glob）
+DEFAULT_SENSITIVE_PATHS = '*auth*,*login*,*password*,*secret*,*token*,*crypto*,*security*,*permission*,*payment*,*.sql'
+
+
+def _parse_language_weights() -> dict:
+    weights = dict(DEFAULT_LANGUAGE_WEIGHTS)
+    for item in os.getenv('REVIEW_RISK_LANGUAGE_WEIGHTS', '').split(','):
+        if ':' in item:
+            ext, weight = item.split(':', 1)
+            weights[ext.strip().lower()] = float(weight)
+    return weights
+
+
+def changed_lines(diff: dict) -> int:
+    return sum(count_changes(diff.get('diff', '')))
+
+
+class HunkRiskRanker:
+    """
+    按风险估算对改动点排序，风险分 = (改动规模分 + 所在函数圈复杂度分 + 敏感路径加分) * 语言权重
+        1. 改动规模：改动行数，200 行封顶，映射到 0~10 分
+        2. 圈复杂度：使用 lizard 分析修改后的文件，取与改动行重叠的函数中最大的圈复杂度，50 封顶，映射到 0~10 分
+        3. 敏感路径：文件路径命中 REVIEW_SENSITIVE_PATHS 时加 10 分
+    """
+
+    def __init__(self, file_content_getter: Callable[[str], Optional[str]]):
+        """
+        :param file_content_getter: file_content_getter(path) 返回修改后的文件内容，用于计算圈复杂度
+        """
+        self.file_content_getter = file_content_getter
+        self.language_weights = _parse_language_weights()
+        self.sensitive_patterns = [pattern.strip() for pattern in
+                                   os.getenv('REVIEW_SENSITIVE_PATHS', DEFAULT_SENSITIVE_PATHS).split(',')
+                                   if pattern.strip()]
+        self._functions = {}
+        self._lock = threading.Lock()
+
+    def _file_functions(self, path: str) -> list:
+        with self._lock:
+            if path in self._functions:
+                return self._functions[path]
+        functions = []
+        content = self.file_content_getter(path)
+        if content:
+            try:
+                functions = lizard.analyze_file.analyze_source_code(path, content).function_list
+            except Exception as e:
+                logger.warn(f"lizard 分析文件 {path} 失败: {e}")
+        with self._lock:
+            self._functions[path] = functions
+        return functions
+
+    def complexity(self, diff: dict) -> int:
+        hunk = first_hunk(diff.get('diff', ''))
+        if hunk is None:
+            return 0
+        start = hunk.new_start
+        end = start + max(hunk.new_count, 1) - 1
+        touched = [function.cyclomatic_complexity for function in self._file_functions(diff.get('new_path', ''))
+                   if function.start_line <= end and function.end_line >= start]
+        return max(touched, default=0)
+
+    def is_sensitive(self, path: str) -> bool:
+        path = (path or '').lower()
+        return any(fnmatch.fnmatch(path, pattern) for pattern in self.sensitive_patterns)
+
+    def score(self, diff: dict) -> float:
+        path = diff.get('new_path', '')
+        size_score = min(changed_lines(diff), 200) / 20
+        complexity_score = min(self.complexity(diff), 50) / 5
+        sensitive_score = 10 if self.is_sensitive(path) else 0
+        weight = self.language_weights.get(os.path.splitext(path)[1].lower(), 1.0)
+        return round((size_score + complexity_score + sensitive_score) * weight, 2)
+
+
+class ReviewBudget:
+    """
+    单个 MR 的 review 预算，按估算的输入 token 数（REVIEW_BUDGET_MAX_TOKENS）和耗时（REVIEW_BUDGET_MAX_SECONDS）限制，
+    值为 0 表示不限制；预算用完后剩余的 review 单元不再发起 LLM 请求，记录为跳过
+    改动内容的 token 数默认按字符估算（TOKEN_ESTIMATE_MODE=exact 时使用分词器），与实际计费的 token 数会有偏差，
+    日志与评论中的 token 数均标明为估算值
+    """
+
+    def __init__(self, max_tokens: int = None, max_seconds: float = None):
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv('REVIEW_BUDGET_MAX_TOKENS', 0))
+        self.max_seconds = max_seconds if max_seconds is not None else float(
+            os.getenv('REVIEW_BUDGET_MAX_SECONDS', 0))
+        self.started_at = time.monotonic()
+        self.used_tokens = 0
+        self.skipped: List = []
+        self.reason = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_tokens > 0 or self.max_seconds > 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def exhausted_reason(self, tokens: int) -> Optional[str]:
+        if self.max_seconds > 0 and self.elapsed() >= self.max_seconds:
+            return f"耗时已达 {self.max_seconds:.0f} 秒上限"
+        # 至少 review 一个单元，避免单个超大改动点导致整个 MR 一个都不 review
+        if self.max_tokens > 0 and self.used_tokens > 0 and self.used_tokens + tokens > self.max_tokens:
+            return f"估算输入 token 已达 {self.max_tokens} 上限（{token_estimate_label()}）"
+        return None
+
+    def admit(self, units: Iterable, estimate_tokens: Callable[[object], int]) -> Iterator:
+        """按顺序放行预算内的 review 单元，预算用完后其余单元全部记录到 skipped"""
+        reason = None
+        self.reason = None
+        for unit in units:
+            tokens = estimate_tokens(unit)
+            reason = reason or self.exhausted_reason(tokens)
+            if reason:
+                self.skipped.append(unit)
+                continue
+            self.used_tokens += tokens
+            yield unit
+        if reason:
+            self.reason = reason
+            logger.info(f"review 预算用完（{reason}），估算已用 {self.used_tokens} tokens，"
+                        f"跳过 {len(self.skipped)} 个 review 单元")
+
+    def skipped_summary(self, risk_of: Callable[[dict], float]) -> str:
+        """生成跳过的改动点汇总（markdown），用于评论到MR"""
+        lines = [f"**AI Code Review 预算已用完**（{self.reason}，估算已用约 {self.used_tokens} tokens，"
+                 f"耗时 {self.elapsed():.0f} 秒），以下改动点按风险排序未进行 review，请人工重点关注：", ""]
+        for unit in self.skipped:
+            for diff in unit:
+                hunk = first_hunk(diff.get('diff', ''))
+                line = hunk.new_start if hunk else '-'
+                lines.append(f"- `{diff.get('new_path')}` 第 {line} 行（风险分 {risk_of(diff)}）")
+        return "\n".join(lines)
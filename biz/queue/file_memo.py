@@ -0,0 +1,60 @@
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from biz.utils.log import logger
+
+
+class FileContent(NamedTuple):
+    content: Optional[str]
+    tokens: int
+
+
+class FileContentMemo:
+    """
+    任务级（单个 MR review 任务）的文件内容缓存
+        1. 以 (project_id, ref/sha, path) 为 key，同一文件的多个改动点共享一次下载和一次 token 计算
+        2. 线程安全：并发的多个改动点请求同一个文件时，只有一个线程真正去下载，其余线程等待结果
+        3. 获取失败（None）同样会被缓存，避免每个改动点都重复请求一个不存在的文件
+    生命周期与任务一致，任务结束即丢弃，不做淘汰
+    """
+
+    def __init__(self, fetcher: Callable[[str, str], Optional[str]], token_counter: Callable[[str], int]):
+        """
+        :param fetcher: fetcher(ref, path) 返回文件内容，获取失败返回 None
+        :param token_counter: token_counter(text) 返回文本的 token 数
+        """
+        self.fetcher = fetcher
+        self.token_counter = token_counter
+        self._entries: Dict[Tuple, FileContent] = {}
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, project_id, ref: str, path: str) -> FileContent:
+        key = (project_id, ref, path)
+        entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # 等待其他线程下载完成后再次检查
+            entry = self._entries.get(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return entry
+
+            content = self.fetcher(ref, path)
+            entry = FileContent(content=content, tokens=self.token_counter(content) if content else 0)
+            with self._lock:
+                self._entries[key] = entry
+                self.misses += 1
+            return entry
+
+    def log_stats(self):
+        logger.info(f"文件内容缓存统计: 命中 {self.hits} 次, 下载 {self.misses} 次")
@@ -0,0 +1,69 @@
+import os
+import time
+
+from biz.utils.log import logger
+from biz.utils.shared_state import get_state_store
+
+
+class ReviewSuperseded(Exception):
+    """同一个MR有更新的 head 入队后，旧的 review 任务抛出该异常终止"""
+
+
+def generation_key(url_slug: str, project_id, merge_request_iid) -> str:
+    return f"mr_generation:{url_slug}:{project_id}:{merge_request_iid}"
+
+
+def register_review_generation(url_slug: str, project_id, merge_request_iid, head_sha: str) -> int:
+    """
+    MR review 任务入队时登记最新的 head_sha，返回该MR的代数（generation）
+    之后正在执行的旧 head 的任务会在下一次检查时发现自己已过期
+    登记的记录在 REVIEW_GENERATION_TTL_SECONDS 内没有新的提交入队后过期删除（MR 关闭、合并后不再需要），
+    该时间应大于单次 review 的最长耗时
+    """
+
+    def bump(current):
+        generation = (current or {}).get('generation', 0) + 1
+        return {'generation': generation, 'head_sha': head_sha, 'updated_at': int(time.time())}
+
+    state = get_state_store().update(generation_key(url_slug, project_id, merge_request_iid), bump,
+                                     ttl=float(os.getenv('REVIEW_GENERATION_TTL_SECONDS', 86400)))
+    logger.info(f"MR {project_id}!{merge_request_iid} 登记 review 任务, generation={state['generation']}, "
+                f"head_sha={head_sha}")
+    return state['generation']
+
+
+class GenerationToken:
+    """
+    review 任务持有的代数令牌，用于判断同一个MR是否已有更新的 head 入队
+    为了减少对共享存储的访问，检查结果会缓存 check_interval 秒
+    """
+
+    def __init__(self, url_slug: str, project_id, merge_request_iid, head_sha: str, check_interval: float = 2.0):
+        self.key = generation_key(url_slug, project_id, merge_request_iid)
+        self.head_sha = head_sha
+        self.check_interval = check_interval
+        self._superseded = False
+        self._checked_at = 0.0
+
+    def is_superseded(self) -> bool:
+        if self._superseded or not self.head_sha:
+            return self._superseded
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        try:
+            latest = get_state_store().get(self.key) or {}
+        except Exception as e:
+            # 共享存储不可用时不影响 review 本身
+            logger.warn(f"检查 review 任务是否过期失败: {e}")
+            return False
+        latest_sha = latest.get('head_sha')
+        if latest_sha and latest_sha != self.head_sha:
+            logger.info(f"{self.key} 已有更新的 head {latest_sha} 入队，当前任务 head {self.head_sha} 已过期")
+            self._superseded = True
+        return self._superseded
+
+    def raise_if_superseded(self):
+        if self.is_superseded():
+            raise ReviewSuperseded(f"{self.key} head {self.head_sha} superseded")
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+from biz.utils.log import logger
+
+
+class ReviewProgress:
+    """
+    MR review 进度评论：任务开始时创建一条评论，review 过程中原地修改该评论展示进度
+    （已 review 的改动点数 / 总数、耗时、估算的 token 数），任务结束后更新为最终状态
+    为了避免频繁调用 GitLab API，两次修改之间至少间隔 REVIEW_PROGRESS_UPDATE_INTERVAL 秒
+    """
+
+    def __init__(self, handler, total: int, update_interval: float = None):
+        self.handler = handler
+        self.total = total
+        self.update_interval = update_interval if update_interval is not None else float(
+            os.getenv('REVIEW_PROGRESS_UPDATE_INTERVAL', 5))
+        self.enabled = os.getenv('REVIEW_PROGRESS_NOTE_ENABLED', '0') == '1'
+        self.done = 0
+        self.tokens = 0
+        self.started_at = time.monotonic()
+        self.note_id = None
+        self._updated_at = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if not self.enabled or not self.total:
+            return
+        note = self.handler.add_merge_request_notes(self.render())
+        self.note_id = (note or {}).get('id')
+        self._updated_at = time.monotonic()
+
+    def extend(self, hunks: int):
+        """流式 review 时总数随着改动的下载逐步增加，第一次有改动点时创建进度评论"""
+        if not hunks:
+            return
+        with self._lock:
+            self.total += hunks
+        if self.note_id is None and self.total == hunks:
+            self.start()
+
+    def advance(self, hunks: int = 1, tokens: int = 0):
+        with self._lock:
+            self.done += hunks
+            self.tokens += tokens
+            if time.monotonic() - self._updated_at < self.update_interval:
+                return
+            self._updated_at = time.monotonic()
+        self._update(self.render())
+
+    def finish(self, status: str = "已完成"):
+        self._update(self.render(status))
+
+    def render(self, status: str = "进行中") -> str:
+        return (f"**AI Code Review {status}**：已 review {self.done}/{self.total} 个改动点，"
+                f"耗时 {time.monotonic() - self.started_at:.0f} 秒，估算输入约 {self.tokens} tokens")
+
+    def _update(self, body: str):
+        if self.note_id is None:
+            return
+        try:
+            self.handler.update_merge_request_note(self.note_id, body)
+        except Exception as e:
+            # 进度评论只是展示用，失败不影响 review 本身
+            logger.warn(f"更新 review 进度评论失败: {e}")
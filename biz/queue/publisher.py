@@ -0,0 +1,61 @@
+import os
+import threading
+
+from biz.utils.log import logger
+
+
+def review_publish_mode() -> str:
+    """review 结果的发布方式：immediate（默认，每条结果立即发布）| batch（汇总后一次发布，只发送一次通知）"""
+    return os.getenv('REVIEW_PUBLISH_MODE', 'immediate')
+
+
+class MergeRequestCommentPublisher:
+    """
+    MR 行内评论的发布
+        1. immediate：每个改动点的 review 结果返回后立即创建 discussion，每条评论都会发送一次通知
+        2. batch：先创建草稿评论（draft notes，发布前对其他人不可见），review 结束后 bulk_publish 一次发布
+    GitLab 不支持草稿评论（如版本过低返回 404）时，自动退回 immediate 方式
+    """
+
+    def __init__(self, handler, sha: dict, mode: str = None):
+        self.handler = handler
+        self.sha = sha
+        self.batch = (mode or review_publish_mode()) == 'batch'
+        self.draft_note_ids = []
+        self._lock = threading.Lock()
+
+    def add(self, content, old_path, new_path, old_line=None, new_line=None):
+        position = dict(base_sha=self.sha["base_sha"], head_sha=self.sha["head_sha"], start_sha=self.sha["start_sha"],
+                        old_path=old_path, new_path=new_path, old_line=old_line, new_line=new_line)
+        if self.batch:
+            status_code, draft_note = self.handler.add_merge_request_draft_note(content=content, **position)
+            if draft_note:
+                with self._lock:
+                    self.draft_note_ids.append(draft_note.get('id'))
+                return
+            if status_code == 404:
+                logger.warn("GitLab 不支持草稿评论，改为逐条发布评论")
+                self.batch = False
+        self.handler.add_merge_request_discussions_on_row(content=content, **position)
+
+    def flush(self):
+        """review 结束后一次发布所有草稿评论"""
+        if not self.draft_note_ids:
+            return
+        try:
+            published = self.handler.bulk_publish_draft_notes()
+        except Exception as e:
+            logger.error(f"发布草稿评论失败: {e}")
+            return
+        if published:
+            logger.info(f"一次发布了 {len(self.draft_note_ids)} 条草稿评论")
+            self.draft_note_ids = []
+
+    def discard(self):
+        """review 被取代时删除未发布的草稿评论，避免残留在 review 账号的草稿中"""
+        for draft_note_id in self.draft_note_ids:
+            try:
+                self.handler.delete_merge_request_draft_note(draft_note_id)
+            except Exception as e:
+                logger.warn(f"删除草稿评论 {draft_note_id} 失败: {e}")
+        self.draft_note_ids = []
@@ -0,0 +1,82 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+from biz.utils.leased_semaphore import LeasedSemaphore
+from biz.utils.log import logger
+
+# 全局并发上限，所有 worker 进程（QUEUE_DRIVER=rq 时为所有机器）的 review 任务共享，避免瞬间打满 LLM 服务
+_global_semaphore = LeasedSemaphore('review_llm', int(os.getenv('REVIEW_GLOBAL_MAX_CONCURRENCY', 8)),
+                                   lease_seconds=float(os.getenv('REVIEW_GLOBAL_LEASE_SECONDS', 600)))
+
+
+class ReviewEngine:
+    """
+    有界并发的 review 执行器
+        1. 单个任务内最多同时发起 REVIEW_MAX_CONCURRENCY 个 LLM 调用
+        2. 所有 worker 进程的任务共享 REVIEW_GLOBAL_MAX_CONCURRENCY 的全局上限（基于共享存储的租约信号量）
+        3. 默认结果严格按照提交顺序返回，调用方可以按原顺序发布评论；ordered=False 时按完成顺序返回，尽早发布结果
+    并发数为 1 时直接在当前线程串行执行，与原来的串行逻辑完全一致
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max(1, max_workers or int(os.getenv('REVIEW_MAX_CONCURRENCY', 4)))
+
+    @staticmethod
+    def _run(func: Callable[[Any], Any], item: Any) -> Any:
+        with _global_semaphore.hold():
+            return func(item)
+
+    def map(self, func: Callable[[Any], Any], items: Iterable[Any], ordered: bool = True) -> Iterator[Tuple[Any, Any]]:
+        """
+        并发执行 func(item)，按 items 的顺序（ordered=False 时按完成的顺序）逐个产出 (item, result)
+        任意一个任务抛出异常时，异常会在产出到该任务时抛出，尚未开始的任务会被取消
+        """
+        if self.max_workers > 1 and not ordered:
+            yield from self._map_unordered(func, items)
+            return
+        if self.max_workers == 1:
+            for item in items:
+                yield item, self._run(func, item)
+            return
+
+        # 滑动窗口：最早提交的任务未完成时，最多再预取一个窗口的任务，避免一次性提交全部任务
+        window = self.max_workers * 2
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='review') as executor:
+            try:
+                for item in items:
+                    pending.append((item, executor.submit(self._run, func, item)))
+                    if len(pending) >= window:
+                        head_item, future = pending.popleft()
+                        yield head_item, future.result()
+                while pending:
+                    head_item, future = pending.popleft()
+                    yield head_item, future.result()
+            finally:
+                if pending:
+                    logger.info(f"review 任务提前结束，取消剩余 {len(pending)} 个未完成的任务")
+                for _, future in pending:
+                    future.cancel()
+
+    def _map_unordered(self, func: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Tuple[Any, Any]]:
+        window = self.max_workers * 2
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='review') as executor:
+            try:
+                for item in items:
+                    pending[executor.submit(self._run, func, item)] = item
+                    if len(pending) >= window:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield pending.pop(future), future.result()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+            finally:
+                if pending:
+                    logger.info(f"review 任务提前结束，取消剩余 {len(pending)} 个未完成的任务")
+                for future in pending:
+                    future.cancel()
@@ -1,18 +1,36 @@
 import os
 import traceback
 from datetime import datetime
+from typing import Iterable, Iterator, Optional, Tuple
 
 from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity
 from biz.event.event_manager import event_manager
 from biz.gitlab.webhook_handler import (
     filter_changes, filter_diffs_by_file_types, preprocessing_diffs, MergeRequestHandler, PushHandler
 )
+from biz.gitlab.pager import PageFetchError
+from biz.github.graphql_client import github_graphql_enabled
 from biz.github.webhook_handler import (
-    filter_changes as filter_github_changes, PullRequestHandler as GithubPullRequestHandler, PushHandler as GithubPushHandler
+    filter_changes as filter_github_changes, PageFetchError as GithubPageFetchError,
+    PullRequestHandler as GithubPullRequestHandler, PushHandler as GithubPushHandler
 )
+from biz.llm.factory import Factory
+from biz.queue.budget import HunkRiskRanker, ReviewBudget
+from biz.queue.file_memo import FileContentMemo
+from biz.queue.generation import GenerationToken, ReviewSuperseded
+from biz.queue.progress import ReviewProgress
+from biz.queue.publisher import MergeRequestCommentPublisher, review_publish_mode
+from biz.queue.review_engine import ReviewEngine
+from biz.service.review_service import ReviewService
 from biz.utils.code_reviewer import CodeReviewer
+from biz.utils.diff_parser import count_changes, iter_hunks
+from biz.utils.git_mirror import GitMirror, GitMirrorError, get_git_mirror_cache
+from biz.utils.http_cache import get_http_cache
+from biz.utils.hunk_classifier import TrivialHunkFilter
 from biz.utils.im import notifier
 from biz.utils.log import logger
+from biz.utils.review_cache import get_review_cache
+from biz.utils.token_util import estimate_tokens
 
 
 
@@ -41,7 +59,7 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
 
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
+                review_result = Factory.getReviewer().review_and_strip_code(changes, commits_text, changes)
                 score = CodeReviewer.parse_review_score(review_text=review_result)
                 for item in changes:
                     additions += item['additions']
@@ -83,16 +101,20 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         # 解析Webhook数据
         handler = MergeRequestHandler(webhook_data, gitlab_token, gitlab_url)
         logger.info('Merge Request Hook event received')
-        # 如果开启了仅review projected branches的，判断当前目标分支是否为projected branches
-        if merge_review_only_protected_branches and not handler.target_branch_protected():
-            logger.info("Merge Request target branch not match protected branches, ignored.")
-            return
 
         # 'updated' 状态的 MR 也先不处理，否则会重复review和评论
         if handler.action not in ['opened', 'reopened']:
             logger.info(f"Merge Request Hook event, action={handler.action}, ignored.")
             return
 
+        # 如果开启了仅review projected branches的，判断当前目标分支是否为projected branches（保护分支规则按项目缓存）
+        if merge_review_only_protected_branches and not handler.target_branch_protected():
+            logger.info("Merge Request target branch not match protected branches, ignored.")
+            return
+
+        # 并发获取 commits、sha
+        context = handler.fetch_merge_request_context(include_changes=False)
+
         # 仅仅在MR创建或更新时进行Code Review
         # 获取Merge Request的changes -> GitLab 15.7 废弃changes接口，直接使用diffs接口
         # diffs 在当前项目环境有点问题，获取不到数据，未查明根因，使用 get_merge_request_diffs_from_base_sha_to_head_sha 替代
@@ -111,7 +133,7 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
             deletions += item.get('deletions', 0)
 
         # 获取Merge Request的commits
-        commits = handler.get_merge_request_commits()
+        commits = context.commits
         if not commits:
             logger.error('Failed to get commits')
             return
@@ -119,7 +141,7 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
         logger.info('commits text: %s', commits_text)
-        review_result = CodeReviewer().review_and_strip_code(diffs_with_filter, commits_text, diffs)
+        review_result = Factory.getReviewer().review_and_strip_code(diffs_with_filter, commits_text, diffs)
 
         # 将review结果提交到Gitlab的 notes
         handler.add_merge_request_notes(f'Auto Review Result: \n{review_result}')
@@ -165,84 +187,180 @@ def handle_merge_request_event_v2(webhook_data: dict, gitlab_token: str, gitlab_
     2. 原添加review的评论到MR外层，现添加到具体的变更代码行
     '''
     merge_review_only_protected_branches = os.environ.get('MERGE_REVIEW_ONLY_PROTECTED_BRANCHES_ENABLED', '0') == '1'
+    progress = None
+    publisher = None
+    mirror = None
     try:
         # 解析Webhook数据
         handler = MergeRequestHandler(webhook_data, gitlab_token, gitlab_url)
         logger.info('Merge Request Hook event received')
-        # 如果开启了仅review projected branches的，判断当前目标分支是否为projected branches
-        if merge_review_only_protected_branches and not handler.target_branch_protected():
-            logger.info("Merge Request target branch not match protected branches, ignored.")
-            return
 
-        # 'updated' 状态的 MR 也先不处理，否则会重复review和评论
+        # handler.action 为 MR 的状态（object_attributes.state），只处理打开中的 MR，已合并、已关闭的 MR 不 review；
+        # 本次事件的动作（open、reopen、update 等）为 handler.event_action，由它决定完整 review 还是增量 review
         if handler.action not in ['opened', 'reopened']:
             logger.info(f"Merge Request Hook event, action={handler.action}, ignored.")
             return
 
-        # 获取 MR 的 commits 信息
-        commits = handler.get_merge_request_commits()
+        # 同一个MR有更新的 head 入队后，当前任务停止调用 LLM 和发布评论
+        generation = GenerationToken(gitlab_url_slug, handler.project_id, handler.merge_request_iid,
+                                     handler.last_commit_id)
+        generation.raise_if_superseded()
+
+        # MR 更新事件：只有推送了新提交（带 oldrev）才 review，并且只 review 上次 review 之后新增的改动
+        incremental = handler.event_action == 'update'
+        if incremental and not handler.oldrev:
+            logger.info("Merge Request update event without new commits, ignored.")
+            return
+
+        # 如果开启了仅review projected branches的，判断当前目标分支是否为projected branches（保护分支规则按项目缓存）
+        if merge_review_only_protected_branches and not handler.target_branch_protected():
+            logger.info("Merge Request target branch not match protected branches, ignored.")
+            return
+
+        # 增量 review 的起点为上次 review 的 head_sha；没有记录时（首次完整 review 被更新的提交取代、失败或没有执行）
+        # 改为完整 review，不能只 review 本次推送的改动（oldrev..head），否则 oldrev 之前的改动永远不会被 review
+        last_reviewed_sha = ReviewService.get_mr_last_reviewed_sha(
+            gitlab_url_slug, handler.project_id, handler.merge_request_iid) if incremental else None
+        if incremental and not last_reviewed_sha:
+            logger.info("Merge Request 没有上次 review 的记录，改为完整 review")
+            incremental = False
+
+        # 并发获取：commits、changes（仅完整 review 时）、sha（head_sha, base_sha, start_sha，用于定位行内评论的位置）
+        # 开启本地 git mirror 时，改动在本地计算，不需要再请求 changes 接口
+        # 开启流式 review 时，改动在 review 过程中通过 /diffs 接口分页获取（按风险排序的预算模式需要全部改动，不使用流式）
+        use_mirror = get_git_mirror_cache() is not None
+        streaming = (os.getenv('DIFF_STREAMING_ENABLED', '0') == '1' and not incremental and not use_mirror
+                     and not ReviewBudget().enabled)
+        context = handler.fetch_merge_request_context(include_changes=not incremental and not use_mirror
+                                                      and not streaming)
+
+        commits = context.commits
         if not commits:
             logger.error('Failed to get commits')
             return
         commits_text = ';'.join(commit['title'] for commit in commits)
         logger.info('commits text: %s', commits_text)
 
-        # 仅仅在MR创建或更新时进行Code Review
-        diffs = handler.get_merge_request_changes()
-        logger.info('origin diffs: %s', diffs)
+        sha = context.sha
+        incremental = incremental and bool(sha["head_sha"])
+        # 流式获取 /diffs 之前需要确认 diff 已生成好（已获取到 diff_refs）
+        streaming = streaming and bool(sha["head_sha"])
+        mirror = open_merge_request_mirror(handler, gitlab_url_slug, sha) if use_mirror else None
+
+        if incremental:
+            if last_reviewed_sha == sha["head_sha"]:
+                logger.info(f"Merge Request head {sha['head_sha']} has already been reviewed, ignored.")
+                return
+            logger.info(f"增量 review: 仅 review {last_reviewed_sha} -> {sha['head_sha']} 之间新增的改动")
+            diffs = mirror_diff(mirror, last_reviewed_sha, sha["head_sha"])
+            if diffs is None:
+                diffs = handler.repository_compare(last_reviewed_sha, sha["head_sha"])
+        elif streaming:
+            diffs = []
+        else:
+            # 仅仅在MR创建时进行完整的Code Review，MR 的完整改动即 base_sha（合并基准）到 head_sha 之间的改动
+            diffs = mirror_diff(mirror, sha["base_sha"], sha["head_sha"])
+            if diffs is None:
+                # 未开启 mirror 时 changes 已并发获取；增量 review 未能获取 head_sha 或 mirror 不可用时再请求
+                diffs = context.changes if context.changes is not None else handler.get_merge_request_changes()
+        logger.info('origin diffs: %s 个文件', len(diffs))
+        logger.debug('origin diffs: %s', diffs)
 
         # 过滤掉不 review 的文件类型
         diffs = filter_diffs_by_file_types(diffs)
-        logger.info("filter file type diffs: %s", diffs)
+        logger.debug("filter file type diffs: %s", diffs)
 
         # 将diffs拆为每个改动点为一个diff
         diffs = preprocessing_diffs(diffs) # 重新赋值修改新的diffs
-        logger.info("split diffs: %s", diffs)
-
-        # 获取 sha: head_sha, base_sha, start_sha，用于定位行内评论的位置
-        sha = handler.get_merge_request_sha()
-        # 0. 对每一个改动点进行语料补充，并提交ai review
-        for diff in diffs:
-            # 1. 提取文件路径、行号用于添加评论
-            old_path = diff.get("old_path")
-            new_path = diff.get("new_path")
-            old_line, new_line = extract_line_numbers(diff) # 获取添加评论的行号
-
-            # 2. 判断是否为新增文件，如果是新增的文件，则不需要传入diffs、file_content，因为diff就是完整内容
-            if diff.get("new_file") == True or diff.get("new_file") == "true":
-                diffs_tmp, file_content_tmp = "当前diff为新增文件", "当前diff为新增文件"
-            else:
-                file_content = handler.get_gitlab_file_content(branch_type="source_branch", file_path=new_path) # 获取修改后的完整文件内容
-                diffs_tmp, file_content_tmp = diffs, file_content
-            
-            # 3. 对获取到的diff文件做限制，如过滤文件大小、截断 【待完成，当前使用token做了限制】
-
-            # 4. 分析文件内容对应的token，如果超过限制，则取改动点前后 500 行的代码作为上下文传递给 ai，大概是 8-10k token
-            file_tokens_count = CodeReviewer().count_tokens(text=file_content_tmp)
-            if file_tokens_count >= 10000:
-                logger.debug(f"当前文件tokens为: {file_tokens_count}，超过限制的10k token, 截取改动点前后500行代码作为上下文")
-                file_content_tmp = extract_surrounding_lines(text=file_content, line_number=new_line, context_line_num=500)
-
-            # 5. 将单个 prompt: diff + file content 发到 ai review
-            review_result = CodeReviewer().review_code_simple(diff, diffs_tmp, file_content_tmp)
-
-            # 6. 添加评论
-            handler.add_merge_request_discussions_on_row(
-                content=review_result,
-                base_sha=sha["base_sha"],
-                head_sha=sha["head_sha"],
-                start_sha=sha["start_sha"],
-                old_path=old_path,
-                new_path=new_path,
-                old_line=old_line,
-                new_line=new_line
-            )
+        logger.info("split diffs: %s 个改动点", len(diffs))
+        logger.debug("split diffs: %s", diffs)
+
+        # 无实质逻辑变更的改动点（空白、注释、import 顺序、版本号等）不调用 LLM，按配置跳过或汇总评论
+        trivial_filter = TrivialHunkFilter()
+        review_diffs, trivial_diffs = trivial_filter.split(diffs)
+        trivial_ack = os.getenv('TRIVIAL_HUNK_ACTION', 'skip') == 'ack'
+        if trivial_diffs and trivial_ack:
+            handler.add_merge_request_notes(trivial_filter.summary(trivial_diffs))
+
+        # 0. 对每一个改动点进行语料补充，并发提交ai review；每个改动点的 review 结果返回后立即添加评论
+        # 同一文件的多个改动点共享文件内容和 token 数，优先使用 head_sha 固定文件版本
+        file_memo = FileContentMemo(
+            fetcher=lambda ref, path: read_file_content(handler, mirror, ref, path),
+            token_counter=lambda text: Factory.getReviewer().count_tokens(text=text),
+        )
+        file_ref = sha["head_sha"] or handler.source_branch
+        review_result = None
+        engine = ReviewEngine()
+        # 开启批量模式时，同一文件相邻的小改动点合并为一次 LLM 请求
+        units = build_review_units(review_diffs)
+        # 创建进度评论，review 过程中原地更新
+        progress = ReviewProgress(handler, total=len(review_diffs))
+        progress.start()
+        # review 单元与其上下文（非流式时为MR的全部改动点）
+        items = [(unit, diffs) for unit in units]
+        stream_stats = {'files': 0, 'additions': 0, 'deletions': 0}
+        if streaming:
+            # 流式：边下载边逐个文件过滤、拆分、review，上下文为同一文件的改动点，只持有少量文件的数据
+            items = stream_review_items(stream_merge_request_diffs(handler), trivial_filter, trivial_diffs, progress,
+                                        stream_stats)
+        # REVIEW_PUBLISH_MODE=batch 时行内评论先保存为草稿，review 结束后一次发布
+        publisher = MergeRequestCommentPublisher(handler, sha)
+        # 开启预算时，按风险从高到低 review，预算用完后跳过剩余的改动点
+        budget = ReviewBudget()
+        ranker = None
+        if budget.enabled:
+            ranker = HunkRiskRanker(lambda path: file_memo.get(handler.project_id, file_ref, path).content)
+            units = sorted(units, key=lambda unit: max(ranker.score(diff) for diff in unit), reverse=True)
+            units = budget.admit(units, lambda unit: estimate_unit_tokens(handler, unit, file_memo, file_ref))
+            items = ((unit, diffs) for unit in units)
+        # 每个单元的 review 结果返回后立即发布，不等待前面较慢的单元
+        for (unit, _), unit_results in engine.map(
+                lambda item: review_diff_unit(handler, item[0], item[1], file_memo, file_ref, generation), items,
+                ordered=False):
+            for diff, review_result in zip(unit, unit_results):
+                generation.raise_if_superseded()
+
+                # 1. 提取文件路径、行号用于添加评论
+                old_line, new_line = extract_line_numbers(diff)
+                if incremental:
+                    # 增量改动的旧行号基于上次 review 的 head，与 MR 的 base 不对应，改为用第一个新增行定位
+                    first_added_line = extract_first_added_line(diff)
+                    if first_added_line is not None:
+                        old_line, new_line = None, first_added_line
+
+                # 6. 添加评论
+                publisher.add(
+                    content=review_result,
+                    old_path=diff.get("old_path"),
+                    new_path=diff.get("new_path"),
+                    old_line=old_line,
+                    new_line=new_line
+                )
+            progress.advance(len(unit), estimate_unit_tokens(handler, unit, file_memo, file_ref))
+        publisher.flush()
+        if streaming:
+            logger.info(f"流式 review: 共 {stream_stats['files']} 个文件，{progress.total} 个改动点")
+            if trivial_diffs and trivial_ack:
+                handler.add_merge_request_notes(trivial_filter.summary(trivial_diffs))
+        progress.finish(f"已完成（{len(budget.skipped)} 个单元因超出预算跳过）" if budget.skipped else "已完成")
+        if budget.skipped:
+            handler.add_merge_request_notes(budget.skipped_summary(ranker.score))
+        file_memo.log_stats()
+        review_cache = get_review_cache()
+        if review_cache:
+            logger.info(f"review 缓存统计: {review_cache.stats()}")
+        http_cache = get_http_cache()
+        if http_cache:
+            logger.info(f"HTTP 缓存统计: {http_cache.stats()}")
         logger.info(f"Merge Request ai code review all done, its commits: {commits}!")
+        if sha["head_sha"]:
+            ReviewService.save_mr_reviewed_sha(gitlab_url_slug, handler.project_id, handler.merge_request_iid,
+                                               sha["head_sha"], int(datetime.now().timestamp()))
 
         # 结果统计到数据库
         # 统计本次新增、删除的代码总数
-        additions = 0
-        deletions = 0
+        additions = stream_stats['additions']
+        deletions = stream_stats['deletions']
         for item in diffs:
             additions += item.get('additions', 0)
             deletions += item.get('deletions', 0)
@@ -266,12 +384,206 @@ def handle_merge_request_event_v2(webhook_data: dict, gitlab_token: str, gitlab_
             )
         )
 
+    except ReviewSuperseded as e:
+        logger.info(f"Merge Request 已有更新的提交入队，停止本次 review: {e}")
+        if publisher:
+            publisher.discard()
+        if progress:
+            progress.finish("已停止（MR 有更新的提交，将重新 review）")
     except Exception as e:
         error_message = f'AI Code Review 服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
+        if publisher:
+            # 已 review 完成的部分照常发布
+            publisher.flush()
+        if progress:
+            progress.finish("出现错误")
         logger.error('出现未知错误: %s', error_message)
+    finally:
+        # 失败、被更新的提交取代时也要关闭 mirror 常驻的 git cat-file 进程
+        if mirror:
+            mirror.close()
+
 
 
+def count_changed_lines(diff: dict) -> int:
+    """统计单个改动点中新增、删除的行数"""
+    return sum(count_changes(diff.get('diff', '')))
+
+
+def build_review_units(diffs: list) -> list:
+    """
+    将改动点组合为 review 单元，每个单元对应一次 LLM 请求，组合后改动点的先后顺序不变
+        未开启批量模式（REVIEW_BATCH_ENABLED）时，每个改动点单独为一个单元
+        开启后，同一文件中相邻的小改动点（不超过 REVIEW_BATCH_SMALL_HUNK_LINES 行改动）在
+        REVIEW_BATCH_MAX_TOKENS、REVIEW_BATCH_MAX_HUNKS 的限制内合并为一个单元；新增文件不合并
+    """
+    if os.environ.get('REVIEW_BATCH_ENABLED', '0') != '1':
+        return [[diff] for diff in diffs]
+
+    small_hunk_lines = int(os.environ.get('REVIEW_BATCH_SMALL_HUNK_LINES', 10))
+    max_tokens = int(os.environ.get('REVIEW_BATCH_MAX_TOKENS', 4000))
+    max_hunks = int(os.environ.get('REVIEW_BATCH_MAX_HUNKS', 8))
+
+    units = []
+    batch, batch_tokens = [], 0
+    for diff in diffs:
+        is_new_file = diff.get("new_file") == True or diff.get("new_file") == "true"
+        if is_new_file or count_changed_lines(diff) > small_hunk_lines:
+            if batch:
+                units.append(batch)
+                batch, batch_tokens = [], 0
+            units.append([diff])
+            continue
+
+        tokens = estimate_tokens(diff.get('diff', ''))
+        if batch and (batch[0].get('new_path') != diff.get('new_path') or len(batch) >= max_hunks
+                      or batch_tokens + tokens > max_tokens):
+            units.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(diff)
+        batch_tokens += tokens
+    if batch:
+        units.append(batch)
+
+    logger.info(f"批量 review 模式: {len(diffs)} 个改动点合并为 {len(units)} 次 LLM 请求")
+    return units
+
+
+def stream_merge_request_diffs(handler: MergeRequestHandler) -> Iterator[dict]:
+    """
+    流式获取MR的改动，GitLab 不支持 /diffs 接口（第一页就请求失败或没有获取到数据）时退回 changes 接口
+    已产出部分改动后某一页请求失败时抛出 PageFetchError，中止本次 review，不把部分改动当作全部
+    """
+    count = 0
+    try:
+        for diff in handler.iter_merge_request_diffs():
+            count += 1
+            yield diff
+    except PageFetchError as e:
+        if count:
+            raise
+        logger.warn(str(e))
+    if not count:
+        logger.info("未能通过 /diffs 接口获取到改动，退回 changes 接口")
+        yield from handler.get_merge_request_changes()
+
+
+def stream_review_items(file_diffs: Iterable[dict], trivial_filter: TrivialHunkFilter, trivial_diffs: list,
+                        progress: ReviewProgress, stats: dict) -> Iterator[Tuple[list, list]]:
+    """
+    流式 review 流水线：逐个文件过滤 → 拆分改动点 → 过滤无实质变更的改动点 → 组合 review 单元
+    产出 (review 单元, 该文件的全部改动点)，后者作为 LLM 的上下文
+    """
+    for file_diff in file_diffs:
+        stats['files'] += 1
+        stats['additions'] += file_diff.get('additions', 0)
+        stats['deletions'] += file_diff.get('deletions', 0)
+        hunks = preprocessing_diffs(filter_diffs_by_file_types([file_diff]))
+        if not hunks:
+            continue
+        review_hunks, trivial = trivial_filter.split(hunks)
+        trivial_diffs.extend(trivial)
+        progress.extend(len(review_hunks))
+        for unit in build_review_units(review_hunks):
+            yield unit, hunks
+
+
+def open_merge_request_mirror(handler: MergeRequestHandler, gitlab_url_slug: str, sha: dict) -> Optional[GitMirror]:
+    """打开项目的本地 mirror 并增量 fetch MR 的 head 与目标分支，不可用时返回 None（退回 GitLab 接口）"""
+    remote_url = (handler.webhook_data.get('project') or {}).get('git_http_url')
+    if not remote_url or not sha["head_sha"]:
+        return None
+    mirror_cache = get_git_mirror_cache()
+    try:
+        mirror = mirror_cache.mirror(f"{gitlab_url_slug}_{handler.project_id}", remote_url,
+                                     token=handler.get_private_token(),
+                                     ssl_verify=os.getenv('GITLAB_SSL_VERIFY', '0') == '1')
+        mirror_cache.fetch_merge_request(mirror, handler.merge_request_iid, handler.target_branch,
+                                         shas=[sha["head_sha"], sha["base_sha"]])
+        return mirror
+    except GitMirrorError as e:
+        logger.warn(f"本地 git mirror 不可用，使用 GitLab 接口获取改动: {e}")
+        return None
+
+
+def mirror_diff(mirror: Optional[GitMirror], from_sha: str, to_sha: str) -> Optional[list]:
+    """通过本地 mirror 计算改动，mirror 不可用或计算失败时返回 None"""
+    if not mirror:
+        return None
+    try:
+        return mirror.diff(from_sha, to_sha)
+    except GitMirrorError as e:
+        logger.warn(f"本地 git mirror 计算改动失败，使用 GitLab 接口: {e}")
+        return None
+
+
+def read_file_content(handler: MergeRequestHandler, mirror: Optional[GitMirror], ref: str, path: str) -> Optional[str]:
+    """读取文件内容：优先从本地 mirror 读取，失败时使用 GitLab 接口"""
+    if mirror:
+        try:
+            return mirror.file_content(ref, path)
+        except GitMirrorError as e:
+            logger.warn(f"本地 git mirror 读取文件失败，使用 GitLab 接口: {e}")
+    return handler.get_gitlab_file_content(file_path=path, branch_type=None, ref=ref)
+
+
+def estimate_unit_tokens(handler: MergeRequestHandler, unit: list, file_memo: FileContentMemo, file_ref: str) -> int:
+    """估算一个 review 单元的输入 token 数：改动内容 + 文件上下文（超过 10k 时会被截取，按 10k 计）"""
+    tokens = sum(estimate_tokens(diff.get('diff', '')) for diff in unit)
+    is_new_file = unit[0].get("new_file") == True or unit[0].get("new_file") == "true"
+    if not is_new_file:
+        tokens += min(file_memo.get(handler.project_id, file_ref, unit[0].get("new_path")).tokens, 10000)
+    return tokens
+
+
+def review_diff_unit(handler: MergeRequestHandler, unit: list, diffs: list, file_memo: FileContentMemo,
+                     file_ref: str, generation: GenerationToken) -> list:
+    """review 一个单元（一个或多个同一文件的改动点），返回与 unit 顺序一致的 review 结果列表"""
+    if len(unit) == 1:
+        return [review_single_diff(handler, unit[0], diffs, file_memo, file_ref, generation)]
+
+    generation.raise_if_superseded()
+    cached = file_memo.get(handler.project_id, file_ref, unit[0].get("new_path"))
+    if cached.tokens >= 10000:
+        # 文件过大时每个改动点需要截取各自附近的上下文，不再合并
+        return [review_single_diff(handler, diff, diffs, file_memo, file_ref, generation) for diff in unit]
+    return Factory.getReviewer().review_code_batch(unit, diffs, cached.content)
+
+
+def review_single_diff(handler: MergeRequestHandler, diff: dict, diffs: list, file_memo: FileContentMemo,
+                       file_ref: str, generation: GenerationToken) -> str:
+    """
+    对单个改动点补充语料并提交 ai review，返回 review 结果
+    该方法会在 ReviewEngine 的线程池中并发执行，只做读取和 LLM 调用，不向 GitLab 写入
+    MR 有更新的 head 入队后抛出 ReviewSuperseded，不再发起 LLM 调用
+    """
+    generation.raise_if_superseded()
+    new_path = diff.get("new_path")
+    _, new_line = extract_line_numbers(diff)
+
+    # 2. 判断是否为新增文件，如果是新增的文件，则不需要传入diffs、file_content，因为diff就是完整内容
+    if diff.get("new_file") == True or diff.get("new_file") == "true":
+        diffs_tmp, file_content_tmp = "当前diff为新增文件", "当前diff为新增文件"
+        file_content = file_content_tmp
+        file_tokens_count = 0
+    else:
+        # 获取修改后的完整文件内容，同一文件只下载、计算 token 一次
+        cached = file_memo.get(handler.project_id, file_ref, new_path)
+        file_content, file_tokens_count = cached.content, cached.tokens
+        diffs_tmp, file_content_tmp = diffs, file_content
+
+    # 3. 对获取到的diff文件做限制，如过滤文件大小、截断 【待完成，当前使用token做了限制】
+
+    # 4. 分析文件内容对应的token，如果超过限制，则取改动点前后 500 行的代码作为上下文传递给 ai，大概是 8-10k token
+    if file_tokens_count >= 10000:
+        logger.debug(f"当前文件tokens为: {file_tokens_count}，超过限制的10k token, 截取改动点前后500行代码作为上下文")
+        file_content_tmp = extract_surrounding_lines(text=file_content, line_number=new_line, context_line_num=500)
+
+    # 5. 将单个 prompt: diff + file content 发到 ai review
+    generation.raise_if_superseded()
+    return Factory.getReviewer().review_code_simple(diff, diffs_tmp, file_content_tmp)
+
 
 def handle_github_push_event(webhook_data: dict, github_token: str, github_url: str, github_url_slug: str):
     push_review_enabled = os.environ.get('PUSH_REVIEW_ENABLED', '0') == '1'
@@ -298,7 +610,7 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
 
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
-                review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
+                review_result = Factory.getReviewer().review_and_strip_code(changes, commits_text, changes)
                 score = CodeReviewer.parse_review_score(review_text=review_result)
                 for item in changes:
                     additions += item.get('additions', 0)
@@ -350,10 +662,22 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
             return
 
         # 仅仅在PR创建或更新时进行Code Review
-        # 获取Pull Request的changes
-        changes = handler.get_pull_request_changes()
-        logger.info('changes: %s', changes)
-        changes = filter_github_changes(changes)
+        if os.getenv('DIFF_STREAMING_ENABLED', '0') == '1' and not github_graphql_enabled():
+            # 流式：边下载边逐个文件过滤，只保留需要 review 的文件
+            try:
+                changes = [change for file_change in handler.iter_pull_request_changes()
+                           for change in filter_github_changes([file_change])]
+            except GithubPageFetchError as e:
+                # 已获取的部分文件不完整，丢弃后通过非流式接口重新获取全部改动
+                logger.warn(f"{e}，重新获取全部改动")
+                changes = filter_github_changes(handler.get_pull_request_changes())
+            commits = handler.get_pull_request_commits()
+        else:
+            # 获取Pull Request的changes与commits（开启 GITHUB_GRAPHQL_ENABLED 时通过 GraphQL 一次获取）
+            changes, commits = handler.get_pull_request_changes_and_commits()
+            logger.debug('changes: %s', changes)
+            changes = filter_github_changes(changes)
+        logger.info('changes: %s 个文件', len(changes))
         if not changes:
             logger.info('未检测到有关代码的修改,修改文件可能不满足SUPPORTED_EXTENSIONS。')
             return
@@ -364,18 +688,19 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
             additions += item.get('additions', 0)
             deletions += item.get('deletions', 0)
 
-        # 获取Pull Request的commits
-        commits = handler.get_pull_request_commits()
         if not commits:
             logger.error('Failed to get commits')
             return
 
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
+        review_result = Factory.getReviewer().review_and_strip_code(changes, commits_text, changes)
 
-        # 将review结果提交到GitHub的 notes
-        handler.add_pull_request_notes(f'Auto Review Result: \n{review_result}')
+        # 将review结果提交到GitHub的 notes；REVIEW_PUBLISH_MODE=batch 时作为一次 PR review（不含行内评论，
+        # GitHub 流程只有整体结果）提交，失败时退回普通评论
+        review_body = f'Auto Review Result: \n{review_result}'
+        if review_publish_mode() != 'batch' or not handler.create_pull_request_review(review_body):
+            handler.add_pull_request_notes(review_body)
 
         # dispatch pull_request_reviewed event
         event_manager['merge_request_reviewed'].send(
@@ -418,43 +743,30 @@ def extract_line_numbers(diff_entry):
     注意：
         这里一定要是单个文件单个改动的才能提取到正确的行号，需经过 filter_diffs_by_file_types() 方法预处理
     """
-    diff_content = diff_entry.get('diff', '')
-    if not diff_content:
+    hunk = next(iter_hunks(diff_entry.get('diff', ''), keep_lines=False), None)
+    if hunk is None:
         return None, None
-    
-    # 查找包含行号信息的@@标记行
-    lines = diff_content.split('\n')
-    for line in lines:
-        if line.startswith('@@') and '@@' in line[2:]:
-            # 提取@@之间的内容，例如: -30,7 +30,7
-            line_info = line.split('@@')[1].strip()
-            
-            # 分割旧行和新行信息
-            parts = line_info.split()
-            if len(parts) != 2:
-                continue
-                
-            old_part, new_part = parts
-            
-            # 解析旧行号信息 (格式: -开始行,行数)
-            old_start = old_part[1:].split(',')[0] if ',' in old_part else old_part[1:]
-            # 解析新行号信息 (格式: +开始行,行数)
-            new_start = new_part[1:].split(',')[0] if ',' in new_part else new_part[1:]
-            
-            # 判断文件操作类型并返回对应行号
-            # 新增文件: 原文件无内容(-0,0)
-            if old_start == '0':
-                return None, int(new_start) if new_start.isdigit() else None
-            # 删除文件: 新文件无内容(+0,0)
-            elif new_start == '0':
-                return int(old_start) if old_start.isdigit() else None, None
-            # 修改文件: 正常返回新旧行号
-            else:
-                return (int(old_start) if old_start.isdigit() else None,
-                        int(new_start) if new_start.isdigit() else None)
-    
-    # 如果没有找到有效的行号信息
-    return None, None
+    # 新增文件: 原文件无内容(-0,0)
+    if hunk.old_start == 0:
+        return None, hunk.new_start
+    # 删除文件: 新文件无内容(+0,0)
+    if hunk.new_start == 0:
+        return hunk.old_start, None
+    # 修改文件: 正常返回新旧行号
+    return hunk.old_start, hunk.new_start
+
+
+def extract_first_added_line(diff_entry):
+    """
+    提取单个改动点中第一个新增行在新文件中的行号，没有新增行时返回None
+
+    注意：
+        与 extract_line_numbers() 一样，需要是单个文件单个改动的diff
+    """
+    for hunk in iter_hunks(diff_entry.get('diff', '')):
+        if hunk.first_added_line is not None:
+            return hunk.first_added_line
+    return None
 
 
 def extract_surrounding_lines(text, line_number: int, context_line_num: int = 50):
@@ -44,6 +44,17 @@ class ReviewService:
                             deletions INTEGER DEFAULT 0
                         )
                     ''')
+                # 记录每个MR最后一次review的head_sha，用于MR更新时只review新增的改动
+                cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS mr_review_state (
+                            url_slug TEXT,
+                            project_id TEXT,
+                            merge_request_iid INTEGER,
+                            head_sha TEXT,
+                            updated_at INTEGER,
+                            PRIMARY KEY (url_slug, project_id, merge_request_iid)
+                        )
+                    ''')
                 # 确保旧版本的mr_review_log、push_review_log表添加additions、deletions列
                 tables = ["mr_review_log", "push_review_log"]
                 columns = ["additions", "deletions"]
@@ -112,6 +123,36 @@ class ReviewService:
             print(f"Error retrieving review logs: {e}")
             return pd.DataFrame()
 
+    @staticmethod
+    def get_mr_last_reviewed_sha(url_slug: str, project_id, merge_request_iid) -> str:
+        """获取MR最后一次review时的head_sha，没有记录时返回空字符串"""
+        try:
+            with sqlite3.connect(ReviewService.DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                                SELECT head_sha FROM mr_review_state
+                                WHERE url_slug = ? AND project_id = ? AND merge_request_iid = ?
+                            ''', (url_slug, str(project_id), merge_request_iid))
+                row = cursor.fetchone()
+                return row[0] if row and row[0] else ""
+        except sqlite3.DatabaseError as e:
+            print(f"Error retrieving review state: {e}")
+            return ""
+
+    @staticmethod
+    def save_mr_reviewed_sha(url_slug: str, project_id, merge_request_iid, head_sha: str, updated_at: int):
+        """保存MR本次review的head_sha"""
+        try:
+            with sqlite3.connect(ReviewService.DB_FILE) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                                INSERT OR REPLACE INTO mr_review_state (url_slug, project_id, merge_request_iid, head_sha, updated_at)
+                                VALUES (?, ?, ?, ?, ?)
+                            ''', (url_slug, str(project_id), merge_request_iid, head_sha, updated_at))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error saving review state: {e}")
+
     @staticmethod
     def insert_push_review_log(entity: PushReviewEntity):
         """插入推送审核日志"""
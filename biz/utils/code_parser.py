@@ -1,4 +1,4 @@
-import re
+from biz.utils.diff_parser import parse_hunks
 
 
 class GitDiffParser:
@@ -8,29 +8,12 @@ class GitDiffParser:
         self.new_code = None
 
     def parse_diff(self):
+        # 删除的行组成旧代码，新增的行组成新代码（均已去掉开头的 -、+）
         old_code = []
         new_code = []
-
-        diff_lines = self.diff_string.splitlines()
-        parsing_old_code = False
-        parsing_new_code = False
-
-        for line in diff_lines:
-            # Identify the diff sections
-            if line.startswith('@@'):
-                parsing_old_code = False
-                parsing_new_code = False
-            elif line.startswith('-'):
-                old_code.append(line[1:])  # Remove the leading '-' which indicates removal
-                parsing_old_code = True
-            elif line.startswith('+'):
-                new_code.append(line[1:])  # Remove the leading '+' which indicates addition
-                parsing_new_code = True
-            else:
-                if parsing_old_code:
-                    old_code.append(line)
-                if parsing_new_code:
-                    new_code.append(line)
+        for hunk in parse_hunks(self.diff_string):
+            old_code.extend(hunk.removed.values())
+            new_code.extend(hunk.added.values())
 
         self.old_code = '\n'.join(old_code)
         self.new_code = '\n'.join(new_code)
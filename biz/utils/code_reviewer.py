@@ -1,4 +1,6 @@
 import abc
+import hashlib
+import json
 import os
 import re
 from typing import Dict, Any, List
@@ -7,10 +9,18 @@ import yaml
 from jinja2 import Template
 
 from biz.llm.factory import Factory
+from biz.utils.hunk_classifier import TrivialHunkFilter
+from biz.utils.language_detector import content_sniffing_enabled, detect_language, detect_language_from_content
 from biz.utils.log import logger
+from biz.utils.review_cache import get_review_cache
 from biz.utils.token_util import count_tokens, truncate_text_by_tokens
 
 
+SIMPLE_REVIEW_SYSTEM_PROMPT = '你是资深编程专家，针对提供的git diff和完整文件，仅指出重大代码问题（安全漏洞、逻辑错误、算法低效、重复代码等）。反馈需：1. 极致精简，直击要害；2. 建议具体且有洞见；3. 忽略类型提示、文档及注释问题；4. 用严谨Markdown格式（仅必要分级）5. 只给出问题和修改意见，不需要提供修改示例代码、总结；6. 中文回答，严格控制在200字内。回答模板参考： 1. **XX问题**\n   - **问题描述**: \n   - **影响**: \n   - **建议**: '
+
+BATCH_REVIEW_SYSTEM_PROMPT = '你是资深编程专家，针对提供的同一文件中的多个git diff（每个diff有唯一的hunk_id）和完整文件，分别对每个diff仅指出重大代码问题（安全漏洞、逻辑错误、算法低效、重复代码等）。每个diff的反馈需：1. 极致精简，直击要害；2. 建议具体且有洞见；3. 忽略类型提示、文档及注释问题；4. 用严谨Markdown格式（仅必要分级）5. 只给出问题和修改意见，不需要提供修改示例代码、总结；6. 中文回答，每个diff严格控制在200字内，没有问题时回答“未发现明显问题”。必须只返回JSON数组，不要返回其他内容，格式为：[{"hunk_id": 0, "review": "1. **XX问题**\n   - **问题描述**: \n   - **影响**: \n   - **建议**: "}]'
+
+
 class BaseReviewer(abc.ABC):
     """代码审查基类"""
 
@@ -81,128 +91,19 @@ class CodeReviewer(BaseReviewer):
             'yaml': 'yaml_review_prompt',
         }
 
-    def _detect_language_from_diff(self, diffs_text: str) -> str:
-        """从diff文本中检测主要编程语言"""
-        # 文件扩展名到语言的映射
-        file_extensions = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.ts': 'typescript',
-            '.jsx': 'javascript',
-            '.tsx': 'typescript',
-            '.vue': 'vue',
-            '.java': 'java',
-            '.go': 'go',
-            '.php': 'php',
-            '.cpp': 'cpp',
-            '.cc': 'cpp',
-            '.cxx': 'cpp',
-            '.c': 'c',
-            '.h': 'cpp',
-            '.hpp': 'cpp',
-            '.proto': 'protobuf ',
-            '.yaml': 'yaml',
-            '.yml': 'yaml ',
-        }
-        
-        # 统计各种语言的文件数量
-        language_counts = {}
-        vue3_indicators = 0
-        
-        # 尝试多种文件路径模式
-        file_patterns = [
-            r'^\+\+\+ b/(.+)$',  # Git diff格式: +++ b/file.vue
-            r'^\+\+\+ (.+)$',    # 简化格式: +++ file.vue
-            r'^--- a/(.+)$',     # Git diff格式: --- a/file.vue
-            r'^--- (.+)$',       # 简化格式: --- file.vue
-            r'^diff --git a/(.+) b/(.+)$',  # Git diff格式: diff --git a/file.vue b/file.vue
-        ]
-        
-        for line in diffs_text.split('\n'):
-            # 尝试所有文件路径模式
-            file_path = None
-            for pattern in file_patterns:
-                match = re.search(pattern, line)
-                if match:
-                    if pattern == r'^diff --git a/(.+) b/(.+)$':
-                        # 对于diff --git格式，取第一个文件路径
-                        file_path = match.group(1)
-                    else:
-                        file_path = match.group(1)
-                    break
-            
-            if file_path:
-                # 获取文件扩展名
-                ext = os.path.splitext(file_path)[1].lower()
-                if ext in file_extensions:
-                    lang = file_extensions[ext]
-                    language_counts[lang] = language_counts.get(lang, 0) + 1
-                    logger.info(f"检测到文件: {file_path}, 扩展名: {ext}, 语言: {lang}")
-            
-            # 检查代码内容中的Vue3特征
-            line_lower = line.lower()
-            if any(indicator in line_lower for indicator in [
-                'setup()', 'defineprops', 'defineemits', 'ref(', 'reactive(',
-                'computed(', 'watch(', 'onmounted', 'onunmounted',
-                'composition api', 'script setup', '<script setup'
-            ]):
-                vue3_indicators += 1
-                logger.info(f"检测到Vue3特征: {line.strip()}")
-        
-        # 如果没有通过文件路径检测到语言，尝试从内容中检测
-        if not language_counts:
-            # 检查是否包含Vue相关的内容
-            if any(indicator in diffs_text.lower() for indicator in [
-                '<template>', '<script>', '<style>', 'vue', '.vue'
-            ]):
-                language_counts['vue'] = 1
-                logger.info("通过内容检测到Vue文件")
-            
-            # 检查JavaScript特征
-            elif any(indicator in diffs_text.lower() for indicator in [
-                'function', 'var ', 'let ', 'const ', '=>', 'prompt(', 'alert(',
-                'console.log', 'document.', 'window.', 'addEventListener'
-            ]):
-                language_counts['javascript'] = 1
-                logger.info("通过内容检测到JavaScript代码")
-            
-            # 检查Python特征
-            elif any(indicator in diffs_text.lower() for indicator in [
-                'def ', 'import ', 'from ', 'class ', 'if __name__', 'print(',
-                'self.', 'return ', 'try:', 'except:', 'with open('
-            ]):
-                language_counts['python'] = 1
-                logger.info("通过内容检测到Python代码")
-        
-        # 返回出现最多的语言，如果没有检测到则返回默认
-        if language_counts:
-            primary_language = max(language_counts, key=language_counts.get)
-            
-            # 如果是Vue且有Vue3特征，记录日志
-            if primary_language == 'vue' and vue3_indicators > 0:
-                logger.info(f"检测到Vue3代码，Vue3特征数量: {vue3_indicators}")
-            elif primary_language == 'vue':
-                logger.info(f"检测到Vue文件，但未发现Vue3特征，Vue3特征数量: {vue3_indicators}")
-            
-            logger.info(f"检测到主要编程语言: {primary_language}")
-            return primary_language
-        
-        logger.info("未检测到特定编程语言，使用通用审查提示词")
-        return 'default'
-
     def _get_appropriate_prompt(self, diffs_text: str) -> str:
         """根据代码内容选择合适的提示词"""
-        detected_lang = self._detect_language_from_diff(diffs_text)
+        detected_lang = detect_language(diffs_text)
         prompt_key = self.language_prompts.get(detected_lang, 'vue3_review_prompt')
         
         # 添加详细的调试日志
-        logger.info(f"语言检测结果: {detected_lang}")
-        logger.info(f"语言映射: {detected_lang} -> {prompt_key}")
-        logger.info(f"可用的语言映射: {self.language_prompts}")
+        logger.debug(f"语言检测结果: {detected_lang}")
+        logger.debug(f"语言映射: {detected_lang} -> {prompt_key}")
+        logger.debug(f"可用的语言映射: {self.language_prompts}")
         
         # 临时修复：强制Vue文件使用Vue3提示词
         if detected_lang == 'vue':
-            logger.info("检测到Vue文件，强制使用vue3_review_prompt")
+            logger.debug("检测到Vue文件，强制使用vue3_review_prompt")
             return 'vue3_review_prompt'
         
         return prompt_key
@@ -283,6 +184,24 @@ class CodeReviewer(BaseReviewer):
         
         return "\n".join(diff_content)
 
+    @staticmethod
+    def _detect_review_language(diffs_text: str, changes: list = None, changes_data: list = None) -> str:
+        """
+        检测本次 review 的主要语言，每组改动只检测一次，结果传给 review_code
+            1. 有改动列表时直接按 new_path 检测，否则从 diff 文本的文件头部取路径检测（diff 文本只解析一次）
+            2. 没有可识别的文件路径时，按 diff 文本的内容特征判断，再按原始 changes 数据的路径检测
+        """
+        if changes is not None:
+            language = detect_language(changes)
+            if language == 'default' and content_sniffing_enabled():
+                language = detect_language_from_content(diffs_text)
+        else:
+            language = detect_language(diffs_text)
+        if language == 'default' and changes_data:
+            language = detect_language(changes_data)
+        logger.debug(f"检测到的语言: {language}")
+        return language
+
     def review_and_strip_code(self, changes_text: str, commits_text: str = "", changes_data: list = None) -> str:
         """
         Review判断changes_text超出取前REVIEW_MAX_TOKENS个token，超出则截断changes_text，
@@ -295,27 +214,29 @@ class CodeReviewer(BaseReviewer):
         # 保存原始的changes数据用于语言检测
         original_changes_data = changes_data
         
-        # 如果changes_text是列表格式，转换为diff格式
+        # 去掉无实质逻辑变更的文件改动（空白、注释、import 顺序、版本号等），全部无实质变更时不调用 LLM
+        if isinstance(changes_text, list) and changes_text:
+            changes_text, _ = TrivialHunkFilter().split(changes_text)
+            if not changes_text:
+                return "本次改动均为空白、注释、import 顺序、版本号等无实质逻辑的变更，跳过 AI review"
+
+        # 如果changes_text是列表格式，转换为diff格式；列表保留下来用于语言检测
+        changes_list = None
         if isinstance(changes_text, list):
-            changes_text = self._convert_changes_to_diff_format(changes_text)
+            changes_list = changes_text
         elif hasattr(changes_text, '__iter__') and not isinstance(changes_text, str):
             # 处理其他可迭代对象
-            changes_text = self._convert_changes_to_diff_format(list(changes_text))
+            changes_list = list(changes_text)
+        if changes_list is not None:
+            changes_text = self._convert_changes_to_diff_format(changes_list)
         
         # 如果changes为空,打印日志
         if not changes_text:
             logger.info("代码为空, diffs_text = %", str(changes_text))
             return "代码为空"
 
-        # 在截断之前先进行语言检测，确保能正确识别文件类型
-        detected_language = self._detect_language_from_diff(changes_text)
-        logger.info(f"在截断前检测到的语言: {detected_language}")
-        
-        # 如果从diff中检测失败，尝试从changes数据中检测
-        if detected_language == 'default' and original_changes_data:
-            logger.info("从diff中检测语言失败，尝试从changes数据中检测")
-            detected_language = self._detect_language_from_changes(original_changes_data)
-            logger.info(f"从changes数据中检测到的语言: {detected_language}")
+        # 语言检测结果与截断无关，整个流程只检测一次
+        final_language = self._detect_review_language(changes_text, changes_list, original_changes_data)
         
         # 如果超长，取前REVIEW_MAX_TOKENS个token
         review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
@@ -325,64 +246,55 @@ class CodeReviewer(BaseReviewer):
         if tokens_count > review_max_tokens:
             logger.info(f"代码过长，从 {tokens_count} tokens 截断到 {review_max_tokens} tokens")
             changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
-            # 截断后再次检测语言，以防截断破坏了文件路径信息
-            truncated_language = self._detect_language_from_diff(changes_text)
-            logger.info(f"截断后检测到的语言: {truncated_language}")
-            # 如果截断后检测不到语言，使用截断前的检测结果
-            if truncated_language == 'default' and detected_language != 'default':
-                logger.info(f"截断后语言检测失败，使用截断前的检测结果: {detected_language}")
-                final_language = detected_language
-            else:
-                final_language = truncated_language
-        else:
-            final_language = detected_language
+
+        # 相同的改动（去掉行号后）+ 提交信息 + 提示词 + 模型，直接返回缓存的结果
+        review_cache = get_review_cache()
+        cache_key = None
+        if review_cache:
+            prompt_key = self.language_prompts.get(final_language, 'vue3_review_prompt')
+            cache_key = review_cache.make_key(changes_text, commits_text,
+                                              self._prompt_version(prompt_key, self._prompt_templates_digest()),
+                                              self._model_name())
+            cached_result = review_cache.get(cache_key)
+            if cached_result is not None:
+                logger.info(f"命中 review 缓存，跳过 LLM 调用，缓存统计: {review_cache.stats()}")
+                return cached_result
 
         review_result = self.review_code(changes_text, commits_text, final_language, original_changes_data).strip()
         if review_result.startswith("```markdown") and review_result.endswith("```"):
-            return review_result[11:-3].strip()
+            review_result = review_result[11:-3].strip()
+        if cache_key:
+            review_cache.put(cache_key, review_result)
         return review_result
 
     def review_code(self, diffs_text: str, commits_text: str = "", pre_detected_language: str = None, changes_data: list = None) -> str:
         """Review 代码并返回结果"""
-        # 智能选择提示词
-        if pre_detected_language and pre_detected_language != 'default':
-            # 使用预先检测到的语言
-            detected_lang = pre_detected_language
-            logger.info(f"使用预先检测到的语言: {detected_lang}")
-        else:
-            # 重新检测语言
-            detected_lang = self._detect_language_from_diff(diffs_text)
-            logger.info(f"重新检测到的语言: {detected_lang}")
-            
-            # 如果从diff中检测失败，尝试从changes数据中检测
-            if detected_lang == 'default' and changes_data:
-                logger.info("从diff中检测语言失败，尝试从changes数据中检测")
-                detected_lang = self._detect_language_from_changes(changes_data)
-                logger.info(f"从changes数据中检测到的语言: {detected_lang}")
+        # 智能选择提示词，review_and_strip_code 已检测过的语言（包括 default）不再重复检测
+        detected_lang = pre_detected_language or self._detect_review_language(diffs_text, changes_data=changes_data)
         
         prompt_key = self.language_prompts.get(detected_lang, 'vue3_review_prompt')
         style = os.getenv("REVIEW_STYLE", "professional")
         
-        logger.info(f"检测到的语言对应的提示词: {prompt_key}")
-        logger.info(f"当前审查风格: {style}")
-        logger.info(f"可用的语言提示词映射: {self.language_prompts}")
+        logger.debug(f"检测到的语言对应的提示词: {prompt_key}")
+        logger.debug(f"当前审查风格: {style}")
+        logger.debug(f"可用的语言提示词映射: {self.language_prompts}")
         
         # 加载对应的提示词
         if prompt_key != "code_review_prompt":
-            logger.info(f"使用语言特定提示词: {prompt_key}")
+            logger.debug(f"使用语言特定提示词: {prompt_key}")
             try:
                 prompts = self._load_language_specific_prompts(prompt_key, style)
-                logger.info(f"成功加载语言特定提示词: {prompt_key}")
+                logger.debug(f"成功加载语言特定提示词: {prompt_key}")
             except Exception as e:
                 logger.error(f"加载语言特定提示词失败: {e}, 回退到通用提示词")
                 prompts = self._load_fallback_prompts(style)
         else:
-            logger.info("使用通用提示词: code_review_prompt")
+            logger.debug("使用通用提示词: code_review_prompt")
             prompts = self._load_fallback_prompts(style)
         
         # 记录实际使用的提示词内容（前100个字符）
         system_content = prompts["system_message"]["content"]
-        logger.info(f"实际使用的system prompt前100字符: {system_content[:100]}...")
+        logger.debug(f"实际使用的system prompt前100字符: {system_content[:100]}...")
         
         messages = [
             prompts["system_message"],
@@ -403,61 +315,115 @@ class CodeReviewer(BaseReviewer):
             2. 省略了异常处理
             3. 后续需要补充文件超过多少行、大小等的截断或者丢弃
         """
+        # 同一个改动点（去掉行号后）+ 文件内容 + 提示词 + 模型，直接返回缓存的结果
+        review_cache = get_review_cache()
+        cache_key = None
+        if review_cache:
+            diff_text = diff.get('diff', '') if isinstance(diff, dict) else str(diff)
+            cache_key = review_cache.make_key(diff_text, file_content,
+                                              self._prompt_version(SIMPLE_REVIEW_SYSTEM_PROMPT), self._model_name())
+            cached_result = review_cache.get(cache_key)
+            if cached_result is not None:
+                logger.info(f"命中 review 缓存，跳过 LLM 调用，缓存统计: {review_cache.stats()}")
+                return cached_result
+
         messages = [
             {
                 "role": "system",
-                'content': '你是资深编程专家，针对提供的git diff和完整文件，仅指出重大代码问题（安全漏洞、逻辑错误、算法低效、重复代码等）。反馈需：1. 极致精简，直击要害；2. 建议具体且有洞见；3. 忽略类型提示、文档及注释问题；4. 用严谨Markdown格式（仅必要分级）5. 只给出问题和修改意见，不需要提供修改示例代码、总结；6. 中文回答，严格控制在200字内。回答模板参考： 1. **XX问题**\n   - **问题描述**: \n   - **影响**: \n   - **建议**: '
+                'content': SIMPLE_REVIEW_SYSTEM_PROMPT
             },
             {
                 "role": "user",
                 "content": f"请专注review以下特定代码变更：\n【需审查的单个diff】：{diff}\n\n以下内容仅作为上下文参考，无需review，也无需提出任何问题或意见：\n1. 完整文件内容：{file_content}\n2. 该文件的全部git diff：{diffs}\n\n请仅针对【需审查的单个diff】分析代码问题并提供修改意见，忽略所有参考内容中的代码细节。"
             },
         ]
-        return self.call_llm(messages)
+        review_result = self.call_llm(messages)
+        if cache_key:
+            review_cache.put(cache_key, review_result)
+        return review_result
 
-    def _detect_language_from_changes(self, changes_data: list) -> str:
-        """从changes数据中检测主要编程语言"""
-        file_extensions = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.ts': 'typescript',
-            '.jsx': 'javascript',
-            '.tsx': 'typescript',
-            '.vue': 'vue',
-            '.java': 'java',
-            '.go': 'go',
-            '.php': 'php',
-            '.cpp': 'cpp',
-            '.cc': 'cpp',
-            '.cxx': 'cpp',
-            '.c': 'c',
-            '.h': 'cpp',
-            '.hpp': 'cpp',
-            '.proto': 'protobuf ',
-            '.yaml': 'yaml',
-            '.yml': 'yaml ',
-        }
-        
-        language_counts = {}
-        
-        for change in changes_data:
-            if isinstance(change, dict):
-                # 尝试从new_path获取文件路径
-                file_path = change.get('new_path') or change.get('old_path')
-                if file_path:
-                    ext = os.path.splitext(file_path)[1].lower()
-                    if ext in file_extensions:
-                        lang = file_extensions[ext]
-                        language_counts[lang] = language_counts.get(lang, 0) + 1
-                        logger.info(f"从changes数据检测到文件: {file_path}, 扩展名: {ext}, 语言: {lang}")
-        
-        if language_counts:
-            primary_language = max(language_counts, key=language_counts.get)
-            logger.info(f"从changes数据检测到主要编程语言: {primary_language}")
-            return primary_language
-        
-        logger.info("从changes数据中未检测到特定编程语言")
-        return 'default'
+    def review_code_batch(self, hunks: List[Dict[str, Any]], diffs, file_content) -> List[str]:
+        """
+        将同一文件的多个小改动点合并为一次 LLM 请求，返回与 hunks 顺序一致的 review 结果列表
+            1. 每个改动点分配一个编号，要求模型返回以编号为 key 的 JSON 结果
+            2. 已缓存的改动点不再发送，只发送未命中的改动点
+            3. 返回结果无法解析或缺少某个改动点时，缺失的改动点回退到 review_code_simple 单独 review
+        """
+        review_cache = get_review_cache()
+        prompt_version = self._prompt_version(BATCH_REVIEW_SYSTEM_PROMPT)
+        results: List[Any] = [None] * len(hunks)
+        cache_keys: List[Any] = [None] * len(hunks)
+        if review_cache:
+            for index, hunk in enumerate(hunks):
+                cache_keys[index] = review_cache.make_key(hunk.get('diff', ''), file_content, prompt_version,
+                                                          self._model_name())
+                results[index] = review_cache.get(cache_keys[index])
+
+        pending = [index for index, result in enumerate(results) if result is None]
+        if len(pending) == 1:
+            results[pending[0]] = self.review_code_simple(hunks[pending[0]], diffs, file_content)
+            return results
+        if pending:
+            hunks_text = "\n\n".join(f"【hunk_id: {index}】\n{hunks[index].get('diff', '')}" for index in pending)
+            messages = [
+                {"role": "system", "content": BATCH_REVIEW_SYSTEM_PROMPT},
+                {
+                    "role": "user",
+                    "content": f"请专注review以下同一文件（{hunks[0].get('new_path')}）中的多个代码变更，每个变更有唯一的hunk_id：\n{hunks_text}\n\n以下内容仅作为上下文参考，无需review，也无需提出任何问题或意见：\n1. 完整文件内容：{file_content}\n2. 该文件的全部git diff：{diffs}\n\n请对每个hunk_id分别给出review意见。"
+                },
+            ]
+            findings = self._parse_batch_result(self.call_llm(messages))
+            for index in pending:
+                review_result = findings.get(str(index))
+                if not review_result:
+                    logger.warn(f"批量 review 结果中缺少 hunk_id={index}，回退为单独 review")
+                    results[index] = self.review_code_simple(hunks[index], diffs, file_content)
+                    continue
+                results[index] = review_result
+                if cache_keys[index]:
+                    review_cache.put(cache_keys[index], review_result)
+        return results
+
+    @staticmethod
+    def _parse_batch_result(review_text: str) -> Dict[str, str]:
+        """解析批量 review 返回的 JSON：[{"hunk_id": 0, "review": "..."}]，解析失败返回空字典"""
+        text = (review_text or "").strip()
+        match = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+        if match:
+            text = match.group(1).strip()
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError:
+            logger.warn(f"批量 review 结果不是合法的 JSON: {review_text}")
+            return {}
+        if isinstance(items, dict):
+            items = items.get("findings", [])
+        findings = {}
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict) and "hunk_id" in item:
+                findings[str(item["hunk_id"])] = str(item.get("review") or "").strip()
+        return findings
+
+    def _model_name(self) -> str:
+        return str(getattr(self.client, 'default_model', '') or '')
+
+    @staticmethod
+    def _prompt_version(*templates: str) -> str:
+        """提示词版本：提示词内容的哈希，可通过 REVIEW_PROMPT_VERSION 手动使缓存失效"""
+        digest = hashlib.sha256(os.getenv("REVIEW_PROMPT_VERSION", "").encode('utf-8'))
+        digest.update(os.getenv("REVIEW_STYLE", "professional").encode('utf-8'))
+        for template in templates:
+            digest.update(template.encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _prompt_templates_digest() -> str:
+        """提示词配置文件的哈希，配置文件修改后缓存自动失效"""
+        try:
+            with open("conf/prompt_templates.yml", "rb") as file:
+                return hashlib.sha256(file.read()).hexdigest()
+        except FileNotFoundError:
+            return ""
 
     @staticmethod
     def parse_review_score(review_text: str) -> int:
@@ -0,0 +1,263 @@
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 改动点头部：@@ -旧起始行[,行数] +新起始行[,行数] @@ 函数定义等，行数省略时为 1
+HUNK_HEADER_PATTERN = re.compile(r'@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@([^\n]*)')
+FILE_HEADER = 'diff --git '
+
+
+def _iter_lines(text: str, start: int = 0, end: int = None) -> Iterator[Tuple[int, str]]:
+    """逐行产出 (行首偏移, 不含换行的行内容)，不一次性拆分整个文本"""
+    end = len(text) if end is None else end
+    pos = start
+    while pos < end:
+        newline = text.find('\n', pos, end)
+        if newline < 0:
+            newline = end
+        yield pos, text[pos:newline]
+        pos = newline + 1
+
+
+class Hunk:
+    """
+    一个改动点
+        old_start/old_count、new_start/new_count：头部的起始行与行数
+        start/end：改动点（含头部）在 diff 文本中的偏移，diff[start:end] 即该改动点的原始内容
+        header_end：头部中行号部分（@@ -a,b +c,d @@）结束的偏移，其后为函数定义等
+        additions/deletions：新增、删除的行数
+        added/removed：新文件行号 -> 新增行内容、旧文件行号 -> 删除行内容（keep_lines=False 时为 None）
+    """
+    __slots__ = ('old_start', 'old_count', 'new_start', 'new_count', 'section', 'start', 'header_end', 'end',
+                 'additions', 'deletions', 'added', 'removed')
+
+    def __init__(self, old_start: int, old_count: int, new_start: int, new_count: int, section: str, start: int,
+                 keep_lines: bool = True):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.section = section
+        self.start = start
+        self.header_end = start
+        self.end = start
+        self.additions = 0
+        self.deletions = 0
+        self.added: Optional[Dict[int, str]] = {} if keep_lines else None
+        self.removed: Optional[Dict[int, str]] = {} if keep_lines else None
+
+    def text(self, diff: str) -> str:
+        return diff[self.start:self.end]
+
+    def lines(self, diff: str) -> Iterator[Tuple[str, str]]:
+        """逐行产出改动点内容的 (标记, 去掉标记的行内容)，标记为 +、-、空格（上下文）或 \\"""
+        body_start = diff.find('\n', self.start, self.end) + 1
+        if body_start <= 0:
+            return
+        for _, line in _iter_lines(diff, body_start, self.end):
+            yield line[:1], line[1:]
+
+    @property
+    def first_added_line(self) -> Optional[int]:
+        return next(iter(self.added), None) if self.added else None
+
+    def __repr__(self):
+        return (f"Hunk(-{self.old_start},{self.old_count} +{self.new_start},{self.new_count}, "
+                f"+{self.additions} -{self.deletions})")
+
+
+class FileDiff:
+    """
+    git diff 输出中的一个文件：路径、模式、新增/删除/重命名标记，以及改动点列表
+    body_start/end 为改动内容（第一个改动点或 Binary files 行起，到下一个文件之前）在 diff 文本中的偏移
+    """
+    __slots__ = ('old_path', 'new_path', 'a_mode', 'b_mode', 'new_file', 'renamed_file', 'deleted_file',
+                 'body_start', 'end', 'hunks')
+
+    def __init__(self, old_path: str, new_path: str):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.a_mode = ''
+        self.b_mode = ''
+        self.new_file = False
+        self.renamed_file = False
+        self.deleted_file = False
+        self.body_start = 0
+        self.end = 0
+        self.hunks: List[Hunk] = []
+
+    @property
+    def additions(self) -> int:
+        return sum(hunk.additions for hunk in self.hunks)
+
+    @property
+    def deletions(self) -> int:
+        return sum(hunk.deletions for hunk in self.hunks)
+
+    def to_dict(self, diff: str) -> dict:
+        """GitLab compare/changes 接口的 diffs 结构"""
+        body = diff[self.body_start:self.end]
+        return {'old_path': self.old_path, 'new_path': self.new_path, 'a_mode': self.a_mode, 'b_mode': self.b_mode,
+                'new_file': self.new_file, 'renamed_file': self.renamed_file, 'deleted_file': self.deleted_file,
+                'diff': body if body.endswith('\n') or not body else body + '\n'}
+
+
+def iter_hunks(diff: str, keep_lines: bool = True, start: int = 0, end: int = None) -> Iterator[Hunk]:
+    """
+    单次遍历解析单个文件的改动内容（GitLab、GitHub 接口返回的 diff/patch 字段），逐个产出改动点
+        1. 用 str.find 定位以 @@ 开头的行，再用正则解析头部，得到每个改动点的起止偏移，不拆分整个文本
+        2. keep_lines=False 时只在改动点内统计以 +、- 开头的行数；否则逐行记录新增、删除行的行号与内容
+    """
+    end = len(diff) if end is None else end
+    hunk = None
+    pos = start if diff.startswith('@@', start, end) else _next_line_with(diff, '\n@@', start, end)
+    while pos >= 0:
+        next_pos = _next_line_with(diff, '\n@@', pos, end)
+        match = HUNK_HEADER_PATTERN.match(diff, pos, end)
+        if match:
+            if hunk is not None:
+                _fill_hunk(hunk, diff, pos, keep_lines)
+                yield hunk
+            old_start, old_count, new_start, new_count, section = match.groups()
+            hunk = Hunk(int(old_start), int(old_count) if old_count is not None else 1,
+                        int(new_start), int(new_count) if new_count is not None else 1,
+                        section.strip(), pos, keep_lines)
+            hunk.header_end = match.start(5)
+        pos = next_pos
+    if hunk is not None:
+        _fill_hunk(hunk, diff, end, keep_lines)
+        yield hunk
+
+
+def _next_line_with(diff: str, prefix: str, start: int, end: int) -> int:
+    """下一个以 prefix（不含开头的换行）开头的行的行首偏移，没有时返回 -1"""
+    pos = diff.find(prefix, start, end)
+    return pos + 1 if pos >= 0 else -1
+
+
+def _fill_hunk(hunk: Hunk, diff: str, end: int, keep_lines: bool):
+    hunk.end = end
+    body_start = diff.find('\n', hunk.start, end) + 1
+    if body_start <= 0:
+        return
+    body = diff[body_start:end]
+    if not keep_lines:
+        hunk.additions = body.count('\n+') + body.startswith('+')
+        hunk.deletions = body.count('\n-') + body.startswith('-')
+        return
+    old_line, new_line = hunk.old_start, hunk.new_start
+    added, removed = hunk.added, hunk.removed
+    for line in body.split('\n'):
+        marker = line[:1]
+        if marker == '+':
+            added[new_line] = line[1:]
+            new_line += 1
+        elif marker == '-':
+            removed[old_line] = line[1:]
+            old_line += 1
+        elif marker != '\\':
+            # 上下文行（\ No newline at end of file 不占行号）
+            old_line += 1
+            new_line += 1
+    hunk.additions, hunk.deletions = len(added), len(removed)
+
+
+def parse_hunks(diff: str, keep_lines: bool = True) -> List[Hunk]:
+    return list(iter_hunks(diff or '', keep_lines))
+
+
+def first_hunk(diff: str) -> Optional[Hunk]:
+    """第一个改动点（只统计行数），没有时返回 None"""
+    return next(iter_hunks(diff or '', keep_lines=False), None)
+
+
+def strip_line_numbers(diff: str) -> str:
+    """去掉所有改动点头部中的行号信息（@@ -a,b +c,d @@ 替换为 @@），内容不变"""
+    diff = diff or ''
+    parts = []
+    pos = 0
+    for hunk in iter_hunks(diff, keep_lines=False):
+        parts.append(diff[pos:hunk.start])
+        parts.append('@@')
+        pos = hunk.header_end
+    parts.append(diff[pos:])
+    return ''.join(parts)
+
+
+def count_changes(diff: str) -> Tuple[int, int]:
+    """统计改动内容的 (新增行数, 删除行数)"""
+    additions = deletions = 0
+    for hunk in iter_hunks(diff or '', keep_lines=False):
+        additions += hunk.additions
+        deletions += hunk.deletions
+    return additions, deletions
+
+
+def _strip_prefix(path: str) -> Optional[str]:
+    # 路径包含空格时 git 会在 ---/+++ 行的路径后追加一个制表符
+    path = path.rstrip('\t')
+    if path == '/dev/null':
+        return None
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    return path[2:] if path.startswith(('a/', 'b/')) else path
+
+
+def iter_file_diffs(diff: str, keep_lines: bool = True) -> Iterator[FileDiff]:
+    """
+    单次遍历解析 git diff 的完整输出（多个文件，以 diff --git 开头），逐个产出文件
+    文件头部逐行解析，改动内容交给 iter_hunks
+    """
+    if diff.startswith(FILE_HEADER):
+        pos = 0
+    else:
+        pos = diff.find('\n' + FILE_HEADER)
+        if pos < 0:
+            return
+        pos += 1
+    while True:
+        next_file = diff.find('\n' + FILE_HEADER, pos)
+        end = next_file + 1 if next_file >= 0 else len(diff)
+        file_diff = _parse_file_header(diff, pos, end)
+        file_diff.hunks = list(iter_hunks(diff, keep_lines, file_diff.body_start, end))
+        yield file_diff
+        if next_file < 0:
+            return
+        pos = end
+
+
+def _parse_file_header(diff: str, start: int, end: int) -> FileDiff:
+    header_end = diff.find('\n', start, end)
+    header_end = end if header_end < 0 else header_end
+    # diff --git a/<path> b/<path>，路径相同时可以从中间分开
+    header = diff[start + len(FILE_HEADER):header_end]
+    half = (len(header) - 5) // 2
+    path = header[2:2 + half] if len(header) >= 5 else header
+    file_diff = FileDiff(path, path)
+    file_diff.body_start = file_diff.end = end
+    for offset, line in _iter_lines(diff, header_end + 1, end):
+        if line.startswith('@@') or line.startswith('Binary files'):
+            file_diff.body_start = offset
+            break
+        if line.startswith('new file mode '):
+            file_diff.new_file, file_diff.b_mode = True, line[len('new file mode '):]
+        elif line.startswith('deleted file mode '):
+            file_diff.deleted_file, file_diff.a_mode = True, line[len('deleted file mode '):]
+        elif line.startswith('old mode '):
+            file_diff.a_mode = line[len('old mode '):]
+        elif line.startswith('new mode '):
+            file_diff.b_mode = line[len('new mode '):]
+        elif line.startswith('index ') and ' ' in line[6:]:
+            file_diff.a_mode = file_diff.b_mode = line.rsplit(' ', 1)[1]
+        elif line.startswith('rename from '):
+            file_diff.renamed_file, file_diff.old_path = True, line[len('rename from '):]
+        elif line.startswith('rename to '):
+            file_diff.new_path = line[len('rename to '):]
+        elif line.startswith('--- '):
+            file_diff.old_path = _strip_prefix(line[4:]) or file_diff.old_path
+        elif line.startswith('+++ '):
+            file_diff.new_path = _strip_prefix(line[4:]) or file_diff.new_path
+    if file_diff.new_file:
+        file_diff.old_path = file_diff.new_path
+    if file_diff.deleted_file:
+        file_diff.new_path = file_diff.old_path
+    return file_diff
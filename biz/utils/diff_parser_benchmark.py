@@ -0,0 +1,132 @@
+"""
+diff 处理的性能对比：原来的多次遍历（正则拆分改动点、正则统计增删行数、逐个改动点 split 解析行号）
+与 diff_parser 的单次遍历，使用生成的多 MB diff，统计耗时与峰值内存
+
+    1. 多次遍历：preprocessing_diffs 的正则拆分 + filter_changes 的两次 re.findall + extract_line_numbers、
+       extract_first_added_line、count_changed_lines 对每个改动点各 split 一次
+    2. 单次遍历：filter_changes、preprocessing_diffs 基于 iter_hunks，行号与增删行数直接取自 Hunk
+
+运行方式:
+    python -m biz.utils.diff_parser_benchmark [文件数量] [每个文件的改动点数量] [每个改动点的行数]
+    python -m biz.utils.diff_parser_benchmark --file changes.diff   # 使用 git diff 的输出
+"""
+import re
+import sys
+import time
+import tracemalloc
+
+from biz.gitlab.webhook_handler import filter_changes, preprocessing_diffs
+from biz.queue.worker import count_changed_lines, extract_first_added_line, extract_line_numbers
+from biz.utils.git_mirror import parse_git_diff
+
+LEGACY_HUNK_PATTERN = re.compile(r'@@ -?\d+,\d+ [+-]?\d+,\d+ @@.*?(?=@@|$)', re.DOTALL)
+
+
+def build_diffs(file_count: int, hunk_count: int, hunk_lines: int) -> list:
+    diffs = []
+    for file_index in range(file_count):
+        blocks = []
+        for hunk_index in range(hunk_count):
+            start = hunk_index * hunk_lines * 2 + 1
+            lines = [f'@@ -{start},{hunk_lines} +{start},{hunk_lines} @@ def func_{hunk_index}(self):']
+            for line_index in range(hunk_lines):
+                if line_index % 4 == 1:
+                    lines.append(f'-        value = compute_{line_index}(data, {line_index})')
+                    lines.append(f'+        value = compute_{line_index}(data, {line_index + 1})')
+                else:
+                    lines.append(f'         result.append(transform(value, index={line_index}))')
+            blocks.append('\n'.join(lines) + '\n')
+        diffs.append({'old_path': f'src/module_{file_index}.py', 'new_path': f'src/module_{file_index}.py',
+                      'new_file': False, 'deleted_file': False, 'diff': ''.join(blocks)})
+    return diffs
+
+
+def legacy_line_numbers(diff_content: str):
+    for line in diff_content.split('\n'):
+        if line.startswith('@@') and '@@' in line[2:]:
+            parts = line.split('@@')[1].strip().split()
+            if len(parts) != 2:
+                continue
+            old_start, new_start = parts[0][1:].split(',')[0], parts[1][1:].split(',')[0]
+            if old_start == '0':
+                return None, int(new_start)
+            if new_start == '0':
+                return int(old_start), None
+            return int(old_start), int(new_start)
+    return None, None
+
+
+def legacy_first_added_line(diff_content: str):
+    new_line = None
+    for line in diff_content.split('\n'):
+        if line.startswith('@@'):
+            parts = line.split('@@')[1].split() if '@@' in line[2:] else []
+            new_part = next((part for part in parts if part.startswith('+')), None)
+            if new_part is None:
+                return None
+            new_line = int(new_part[1:].split(',')[0])
+            continue
+        if new_line is None or line.startswith('\\'):
+            continue
+        if line.startswith('+'):
+            return new_line
+        if not line.startswith('-'):
+            new_line += 1
+    return None
+
+
+def legacy_pipeline(diffs: list) -> list:
+    """原来的实现：每个步骤各自遍历一次 diff 文本"""
+    [{'diff': item['diff'], 'new_path': item['new_path'],
+      'additions': len(re.findall(r'^\+(?!\+\+)', item['diff'], re.MULTILINE)),
+      'deletions': len(re.findall(r'^-(?!--)', item['diff'], re.MULTILINE))} for item in diffs]
+    hunks = [dict(item, diff=block) for item in diffs for block in LEGACY_HUNK_PATTERN.findall(item['diff'])]
+    results = []
+    for diff in hunks:
+        old_line, new_line = legacy_line_numbers(diff['diff'])
+        changed = sum(1 for line in diff['diff'].split('\n')
+                      if line.startswith(('+', '-')) and not line.startswith(('+++', '---')))
+        results.append((old_line, new_line, legacy_first_added_line(diff['diff']), changed))
+    return results
+
+
+def single_pass_pipeline(diffs: list) -> list:
+    filter_changes(diffs)
+    results = []
+    for diff in preprocessing_diffs(diffs):
+        old_line, new_line = extract_line_numbers(diff)
+        results.append((old_line, new_line, extract_first_added_line(diff), count_changed_lines(diff)))
+    return results
+
+
+def _measure(func, diffs: list):
+    start = time.perf_counter()
+    result = func(diffs)
+    elapsed = time.perf_counter() - start
+    # 峰值内存单独统计，避免 tracemalloc 的开销计入耗时
+    tracemalloc.start()
+    func(diffs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run(diffs: list):
+    size = sum(len(item['diff']) for item in diffs)
+    print(f"{len(diffs)} 个文件, diff 共 {size / 1024 / 1024:.1f} MB")
+    legacy, legacy_elapsed, legacy_peak = _measure(legacy_pipeline, diffs)
+    single, single_elapsed, single_peak = _measure(single_pass_pipeline, diffs)
+    for name, result, elapsed, peak in (('多次遍历', legacy, legacy_elapsed, legacy_peak),
+                                        ('单次遍历', single, single_elapsed, single_peak)):
+        print(f"{name}: {len(result)} 个改动点, {elapsed * 1000:.1f} ms, 峰值内存 {peak / 1024 / 1024:.1f} MB")
+    # 原来的正则会在代码行中出现的 @@ 处截断改动点，真实 diff 中可能不一致
+    print(f"结果一致: {legacy == single}")
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args[:1] == ['--file']:
+        with open(args[1], encoding='utf-8') as diff_file:
+            run(parse_git_diff(diff_file.read()))
+    else:
+        run(build_diffs(*([int(arg) for arg in args[:3]] or [200, 40, 24])))
@@ -0,0 +1,267 @@
+import base64
+import fcntl
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from biz.utils.diff_parser import iter_file_diffs
+from biz.utils.log import logger
+
+
+class GitMirrorError(Exception):
+    """git 命令执行失败，调用方应退回到 REST 接口"""
+
+
+class GitMirror:
+    """
+    单个项目的本地 bare mirror
+        1. 首次使用时 git init --bare，之后只增量 fetch 需要的 ref（MR 的 head、目标分支）
+        2. 改动通过 git diff 在本地计算，输出与 GitLab compare/changes 接口的 diffs 字段格式一致
+        3. 文件内容通过常驻的 git cat-file --batch 进程读取，同一 mirror 的多次读取共用一个进程
+    认证信息通过 GIT_CONFIG_COUNT/GIT_CONFIG_KEY_n/GIT_CONFIG_VALUE_n 环境变量传给 git，
+    不会出现在命令行参数（ps 可见）中，也不会写入 mirror 的配置文件
+    读取（diff、file_content）时持有 mirror 的共享文件锁，避免被 GitMirrorCache.evict 删除
+    """
+
+    def __init__(self, path: str, remote_url: str, token: str = None, ssl_verify: bool = True):
+        self.path = path
+        self.remote_url = remote_url
+        self.token = token
+        self.ssl_verify = ssl_verify
+        self._batch = None
+        self._batch_lock = threading.Lock()
+
+    def _env(self) -> Dict[str, str]:
+        """通过环境变量传入的 git 配置（需要 git >= 2.31）"""
+        config = [('core.quotePath', 'false')]
+        if self.token:
+            credential = base64.b64encode(f"oauth2:{self.token}".encode('utf-8')).decode('ascii')
+            config.append(('http.extraHeader', f'Authorization: Basic {credential}'))
+        if not self.ssl_verify:
+            config.append(('http.sslVerify', 'false'))
+        env = dict(os.environ, GIT_CONFIG_COUNT=str(len(config)))
+        for index, (key, value) in enumerate(config):
+            env[f'GIT_CONFIG_KEY_{index}'] = key
+            env[f'GIT_CONFIG_VALUE_{index}'] = value
+        return env
+
+    def _git(self, *args: str, timeout: float = None) -> str:
+        command = ['git', '--git-dir', self.path, *args]
+        timeout = timeout if timeout is not None else float(os.getenv('GIT_MIRROR_COMMAND_TIMEOUT', 300))
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, env=self._env(),
+                                    encoding='utf-8', errors='replace', timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise GitMirrorError(f"git {args[0]} 执行失败: {e}")
+        if result.returncode != 0:
+            raise GitMirrorError(f"git {args[0]} 执行失败: {result.stderr.strip()}")
+        return result.stdout
+
+    def ensure(self):
+        """mirror 不存在时初始化（只创建空的 bare 仓库，不做全量 clone）"""
+        if os.path.exists(os.path.join(self.path, 'HEAD')):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._git('init', '--bare', '--quiet')
+        self._git('remote', 'add', 'origin', self.remote_url)
+
+    def has_commit(self, sha: str) -> bool:
+        try:
+            self._git('cat-file', '-e', f'{sha}^{{commit}}')
+            return True
+        except GitMirrorError:
+            return False
+
+    def fetch(self, *refs: str, shas: List[str] = ()):
+        """
+        增量 fetch 指定的 ref 到本地同名 ref（如 refs/merge-requests/1/head、refs/heads/main）
+        shas 中的提交都已存在时跳过 fetch
+        """
+        if shas and all(self.has_commit(sha) for sha in shas if sha):
+            logger.debug(f"mirror {self.path} 已包含 {shas}，跳过 fetch")
+            return
+        refspecs = [f'+{ref}:{ref}' for ref in refs]
+        started_at = time.monotonic()
+        self._git('fetch', '--quiet', '--no-tags', 'origin', *refspecs)
+        logger.info(f"mirror {self.path} fetch {refs} 耗时 {time.monotonic() - started_at:.2f}s")
+
+    def fetch_merge_request(self, merge_request_iid, target_branch: str, shas: List[str] = ()):
+        self.fetch(f'refs/merge-requests/{merge_request_iid}/head', f'refs/heads/{target_branch}', shas=shas)
+
+    def diff(self, from_sha: str, to_sha: str) -> List[dict]:
+        """计算两个提交之间的改动，返回与 GitLab compare 接口 diffs 相同结构的列表"""
+        with mirror_lock(self.path, shared=True):
+            self._check_exists()
+            output = self._git('diff', '--no-color', '--no-ext-diff', '-M', '--full-index', from_sha, to_sha)
+        return parse_git_diff(output)
+
+    def _check_exists(self):
+        if not os.path.exists(os.path.join(self.path, 'HEAD')):
+            raise GitMirrorError(f"mirror {self.path} 不存在或已被删除")
+
+    def _batch_process(self) -> subprocess.Popen:
+        if self._batch is None or self._batch.poll() is not None:
+            self._batch = subprocess.Popen(['git', '--git-dir', self.path, 'cat-file', '--batch'],
+                                           stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=self._env())
+        return self._batch
+
+    def file_content(self, ref: str, path: str) -> Optional[str]:
+        """
+        读取 ref 下文件的内容，文件在 ref 中不存在时返回 None
+        ref 本身不存在（未 fetch、mirror 已被删除）时抛出 GitMirrorError，调用方退回到 REST 接口，
+        不能当作文件不存在而缺少文件上下文
+        """
+        with mirror_lock(self.path, shared=True), self._batch_lock:
+            self._check_exists()
+            process = self._batch_process()
+            try:
+                process.stdin.write(f"{ref}:{path}\n".encode('utf-8'))
+                process.stdin.flush()
+                header = process.stdout.readline().decode('utf-8').rstrip('\n')
+                if not header:
+                    raise ValueError('git cat-file 进程已退出')
+                if header.endswith(' ambiguous'):
+                    raise GitMirrorError(f"git cat-file 读取 {ref}:{path} 失败: ref 不唯一")
+                if header.endswith(' missing'):
+                    if not self.has_commit(ref):
+                        raise GitMirrorError(f"mirror 中不存在 {ref}，无法读取 {path}")
+                    return None
+                _, object_type, size = header.rsplit(' ', 2)
+                content = process.stdout.read(int(size))
+                process.stdout.read(1)  # 内容后的换行
+            except (OSError, ValueError) as e:
+                self.close()
+                raise GitMirrorError(f"git cat-file 读取 {ref}:{path} 失败: {e}")
+        if object_type != 'blob':
+            return None
+        return content.decode('utf-8', errors='replace')
+
+    def close(self):
+        if self._batch is not None:
+            try:
+                self._batch.stdin.close()
+                self._batch.wait(timeout=5)
+            except Exception:
+                self._batch.kill()
+            self._batch = None
+
+
+@contextmanager
+def mirror_lock(path: str, shared: bool = False, blocking: bool = True):
+    """
+    mirror 的文件锁：fetch、删除持有排他锁，读取持有共享锁
+    blocking 为 False 且锁被占用时 yield False
+    """
+    flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+    with open(f"{path}.lock", 'a') as lock:
+        try:
+            fcntl.flock(lock, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def parse_git_diff(output: str) -> List[dict]:
+    """将 git diff 的输出解析为 GitLab diffs 结构：old_path、new_path、a_mode、b_mode、new_file、renamed_file、deleted_file、diff"""
+    return [file_diff.to_dict(output) for file_diff in iter_file_diffs(output, keep_lines=False)]
+
+
+class GitMirrorCache:
+    """
+    本地 mirror 的管理：每个项目一个 bare mirror，保存在 GIT_MIRROR_DIR 下
+    所有 mirror 的总大小超过 GIT_MIRROR_QUOTA_MB 时，按最近使用时间（LRU）删除最久未使用的 mirror
+    同一 mirror 的 fetch、删除通过排他文件锁串行，读取持有共享锁，正在读取的 mirror 不会被删除，
+    多个 worker 进程可以安全共用同一目录
+    """
+
+    ACCESS_FILE = 'ai_codereview_last_access'
+
+    def __init__(self, root: str = None, quota_bytes: int = None):
+        self.root = root or os.getenv('GIT_MIRROR_DIR', 'data/git_mirrors')
+        self.quota_bytes = quota_bytes if quota_bytes is not None else int(
+            os.getenv('GIT_MIRROR_QUOTA_MB', 2048)) * 1024 * 1024
+        os.makedirs(self.root, exist_ok=True)
+
+    def _mirror_path(self, key: str) -> str:
+        return os.path.join(self.root, re.sub(r'[^a-zA-Z0-9_.-]', '_', key) + '.git')
+
+    def mirror(self, key: str, remote_url: str, token: str = None, ssl_verify: bool = True) -> GitMirror:
+        path = self._mirror_path(key)
+        mirror = GitMirror(path, remote_url, token=token, ssl_verify=ssl_verify)
+        with mirror_lock(path):
+            mirror.ensure()
+            self.touch(mirror)
+        return mirror
+
+    def fetch_merge_request(self, mirror: GitMirror, merge_request_iid, target_branch: str, shas: List[str] = ()):
+        """加锁 fetch MR 的 ref，完成后检查磁盘配额"""
+        with mirror_lock(mirror.path):
+            mirror.fetch_merge_request(merge_request_iid, target_branch, shas=shas)
+            self.touch(mirror)
+        self.evict(keep=mirror.path)
+
+    def touch(self, mirror: GitMirror):
+        with open(os.path.join(mirror.path, self.ACCESS_FILE), 'w') as file:
+            file.write(str(time.time()))
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dir_path, _, file_names in os.walk(path):
+            for file_name in file_names:
+                try:
+                    total += os.path.getsize(os.path.join(dir_path, file_name))
+                except OSError:
+                    pass
+        return total
+
+    def _last_access(self, path: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(path, self.ACCESS_FILE))
+        except OSError:
+            return 0.0
+
+    def evict(self, keep: str = None) -> List[str]:
+        """总大小超过配额时，按最近使用时间从旧到新删除 mirror（正在使用的 mirror 除外），返回删除的路径"""
+        mirrors = [os.path.join(self.root, name) for name in os.listdir(self.root) if name.endswith('.git')]
+        sizes: Dict[str, int] = {path: self._dir_size(path) for path in mirrors}
+        total = sum(sizes.values())
+        evicted = []
+        for path in sorted(mirrors, key=self._last_access):
+            if total <= self.quota_bytes:
+                break
+            if path == keep:
+                continue
+            with mirror_lock(path, blocking=False) as acquired:
+                if not acquired:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+            evicted.append(path)
+            logger.info(f"git mirror 超出磁盘配额，删除最久未使用的 mirror: {path}")
+        return evicted
+
+
+_mirror_cache = None
+_mirror_cache_lock = threading.Lock()
+
+
+def get_git_mirror_cache() -> Optional[GitMirrorCache]:
+    """获取进程内共享的 mirror 管理器，GIT_MIRROR_ENABLED 不为 1 时返回 None"""
+    global _mirror_cache
+    if os.getenv('GIT_MIRROR_ENABLED', '0') != '1':
+        return None
+    if _mirror_cache is None:
+        with _mirror_cache_lock:
+            if _mirror_cache is None:
+                _mirror_cache = GitMirrorCache()
+    return _mirror_cache
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from biz.utils.log import logger
+
+# 参与缓存 key 计算的请求头：不同 token、不同返回格式（如 GitHub 的 diff 格式）的响应不能混用
+VARY_HEADERS = ('PRIVATE-TOKEN', 'Authorization', 'Accept')
+# 缓存命中时不应沿用的响应头（requests 已解压内容，长度也以缓存内容为准）
+DROP_HEADERS = ('Content-Encoding', 'Content-Length', 'Transfer-Encoding')
+
+
+class HttpResponseCache:
+    """
+    GitLab、GitHub GET 接口的条件请求缓存（持久化到 sqlite，多个 worker 进程共享）
+        1. 缓存返回了 ETag 或 Last-Modified 的 200 响应，再次请求时带上 If-None-Match / If-Modified-Since
+        2. 服务端返回 304 时直接使用缓存的内容，节省带宽；GitHub 的 304 响应不消耗 API 限额
+        3. TTL 过期淘汰 + 缓存内容总大小超过 HTTP_CACHE_MAX_MB 时按最近访问时间（LRU）淘汰
+        4. 进程内统计命中（304）、未命中、写入、淘汰次数与节省的字节数
+    每次请求都会向服务端确认（条件请求），不会返回过期的数据
+    """
+
+    def __init__(self, db_file: str = None, ttl_seconds: int = None, max_bytes: int = None):
+        self.db_file = db_file or os.getenv('HTTP_CACHE_DB', 'data/http_cache.db')
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv('HTTP_CACHE_TTL_SECONDS', 24 * 3600))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.getenv('HTTP_CACHE_MAX_MB', 256)) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_bytes = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=10)
+
+    def _init_db(self):
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS http_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            url TEXT,
+                            etag TEXT,
+                            last_modified TEXT,
+                            headers TEXT,
+                            body BLOB,
+                            size INTEGER,
+                            created_at INTEGER,
+                            last_access INTEGER
+                        )
+                    ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_http_cache_last_access ON http_cache (last_access)')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"HTTP 缓存初始化失败: {e}")
+
+    @staticmethod
+    def make_key(url: str, params: dict = None, headers: dict = None) -> str:
+        full_url = requests.Request('GET', url, params=params).prepare().url
+        headers = CaseInsensitiveDict(headers or {})
+        parts = [full_url] + [f"{name}={headers.get(name, '')}" for name in VARY_HEADERS]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """返回未过期的缓存记录（etag、last_modified、headers、body），不存在或已过期时返回 None"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT etag, last_modified, headers, body, created_at FROM http_cache '
+                               'WHERE cache_key = ?', (key,))
+                row = cursor.fetchone()
+                if row and int(time.time()) - row[4] <= self.ttl_seconds:
+                    return {'etag': row[0], 'last_modified': row[1], 'headers': json.loads(row[2]), 'body': row[3]}
+                if row:
+                    cursor.execute('DELETE FROM http_cache WHERE cache_key = ?', (key,))
+                    conn.commit()
+                    self._count('evictions')
+        except sqlite3.DatabaseError as e:
+            logger.error(f"读取 HTTP 缓存失败: {e}")
+        return None
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def serve(self, key: str, entry: dict, not_modified: requests.Response) -> requests.Response:
+        """服务端返回 304 时，用缓存的内容构造 200 响应；响应头以缓存的为准，并用 304 中的新值（如限额信息）覆盖"""
+        response = requests.Response()
+        response.status_code = 200
+        response._content = entry['body']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        for name, value in not_modified.headers.items():
+            if name not in DROP_HEADERS:
+                response.headers[name] = value
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.elapsed = not_modified.elapsed
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        self._touch(key)
+        self._count('hits')
+        self._count('saved_bytes', len(entry['body'] or b''))
+        logger.debug(f"HTTP 缓存命中（304）: {response.url}")
+        return response
+
+    def store(self, key: str, response: requests.Response):
+        """缓存带 ETag 或 Last-Modified 的 200 响应"""
+        self._count('misses')
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return
+        body = response.content
+        if len(body) > self.max_bytes:
+            return
+        headers = {name: value for name, value in response.headers.items() if name not in DROP_HEADERS}
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                        INSERT OR REPLACE INTO http_cache
+                        (cache_key, url, etag, last_modified, headers, body, size, created_at, last_access)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (key, response.url, etag, last_modified, json.dumps(headers), body, len(body), now, now))
+                self._evict_overflow(cursor)
+                conn.commit()
+            self._count('stores')
+        except sqlite3.DatabaseError as e:
+            logger.error(f"写入 HTTP 缓存失败: {e}")
+
+    def _evict_overflow(self, cursor):
+        # 总大小超过上限时，从最久未访问的记录开始淘汰
+        cursor.execute('SELECT COALESCE(SUM(size), 0) FROM http_cache')
+        overflow = cursor.fetchone()[0] - self.max_bytes
+        if overflow <= 0:
+            return
+        cursor.execute('SELECT cache_key, size FROM http_cache ORDER BY last_access ASC')
+        keys = []
+        for cache_key, size in cursor.fetchall():
+            if overflow <= 0:
+                break
+            keys.append(cache_key)
+            overflow -= size
+        cursor.executemany('DELETE FROM http_cache WHERE cache_key = ?', [(cache_key,) for cache_key in keys])
+        self._count('evictions', len(keys))
+
+    def _touch(self, key: str):
+        try:
+            with self._connect() as conn:
+                conn.execute('UPDATE http_cache SET last_access = ? WHERE cache_key = ?', (int(time.time()), key))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"更新 HTTP 缓存失败: {e}")
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'saved_bytes': self.saved_bytes,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpResponseCache]:
+    """获取进程内共享的 HTTP 缓存，HTTP_CACHE_ENABLED 不为 1 时返回 None"""
+    global _http_cache
+    if os.getenv('HTTP_CACHE_ENABLED', '0') != '1':
+        return None
+    if _http_cache is None:
+        with _http_cache_lock:
+            if _http_cache is None:
+                _http_cache = HttpResponseCache()
+    return _http_cache
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from biz.utils.http_cache import get_http_cache
+from biz.utils.log import logger
+from biz.utils.rate_limiter import get_rate_limiter, is_rate_limited, retry_after_seconds
+
+# 幂等请求由连接层（urllib3 Retry）自动重试的状态码，调用方不需要再重试
+TRANSPORT_RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    按 host 复用连接的 HTTP 客户端，GitLab、GitHub 的所有接口调用都通过它发起
+        1. 每个 host 一个 requests.Session，连接池大小为 HTTP_POOL_MAXSIZE（默认 16，不低于 review 并发数）
+        2. 默认连接/读取超时：HTTP_CONNECT_TIMEOUT（默认 5 秒）、HTTP_READ_TIMEOUT（默认 60 秒）
+        3. 幂等的 GET/HEAD 请求遇到连接错误、5xx 时按指数退避自动重试（HTTP_MAX_RETRIES，默认 3 次）
+        4. RATE_LIMIT_ENABLED=1 时请求前经过按 host 的限流器（RateLimiter）；遇到 429 或限流的 403 时所有方法都等待（限流器放行或 Retry-After）后重试，最多 HTTP_MAX_RETRIES 次
+        5. 记录每次调用的耗时，超过 HTTP_SLOW_REQUEST_SECONDS（默认 3 秒）时输出 info 日志
+        6. 是否校验证书由 verify_env 对应的环境变量统一配置，调用方不再单独传 verify
+        7. GET 请求经过条件请求缓存（HttpResponseCache），HTTP_CACHE_ENABLED=1 且调用时没有传 cache=False 时使用
+    worker 以子进程运行时，会在子进程中重新创建 Session，不复用父进程的连接
+    """
+
+    def __init__(self, name: str, verify_env: str, verify_default: str = '1'):
+        self.name = name
+        self.verify_env = verify_env
+        self.verify_default = verify_default
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def verify(self) -> bool:
+        return os.getenv(self.verify_env, self.verify_default) == '1'
+
+    @staticmethod
+    def _timeout():
+        return float(os.getenv('HTTP_CONNECT_TIMEOUT', 5)), float(os.getenv('HTTP_READ_TIMEOUT', 60))
+
+    def _new_session(self) -> requests.Session:
+        retry = Retry(
+            total=int(os.getenv('HTTP_MAX_RETRIES', 3)),
+            backoff_factor=0.3,
+            status_forcelist=TRANSPORT_RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        pool_size = int(os.getenv('HTTP_POOL_MAXSIZE', 16))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.verify = self.verify
+        if not session.verify:
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        return session
+
+    def session(self, url: str) -> requests.Session:
+        parsed = urlparse(url)
+        key = (os.getpid(), parsed.scheme, parsed.netloc)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = self._new_session()
+                    self._sessions[key] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self._timeout())
+        host = urlparse(url).netloc
+        rate_limiter = get_rate_limiter()
+        max_retries = int(os.getenv('HTTP_MAX_RETRIES', 3))
+        for attempt in range(max_retries + 1):
+            if rate_limiter:
+                rate_limiter.acquire(host)
+            response = self._send(method, url, **kwargs)
+            if rate_limiter:
+                rate_limiter.observe(host, response.status_code, response.headers)
+            if not is_rate_limited(response.status_code, response.headers) or attempt == max_retries:
+                return response
+            logger.warn(f"[{self.name}] {method} {url} 触发限流（{response.status_code}），第 {attempt + 1} 次重试")
+            if not rate_limiter:
+                time.sleep(min(retry_after_seconds(response.headers), 60))
+        return response
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        started_at = time.monotonic()
+        try:
+            response = self.session(url).request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"[{self.name}] {method} {url} 请求失败，耗时 {time.monotonic() - started_at:.3f}s: {e}")
+            raise
+        elapsed = time.monotonic() - started_at
+        message = f"[{self.name}] {method} {url} -> {response.status_code}，耗时 {elapsed:.3f}s"
+        if elapsed >= float(os.getenv('HTTP_SLOW_REQUEST_SECONDS', 3)):
+            logger.info(f"慢请求: {message}")
+        else:
+            logger.debug(message)
+        return response
+
+    def get(self, url: str, cache: bool = True, **kwargs) -> requests.Response:
+        http_cache = get_http_cache() if cache and not kwargs.get('stream') else None
+        if http_cache is None:
+            return self.request('GET', url, **kwargs)
+
+        key = http_cache.make_key(url, kwargs.get('params'), kwargs.get('headers'))
+        entry = http_cache.lookup(key)
+        if entry:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **http_cache.conditional_headers(entry))
+        response = self.request('GET', url, **kwargs)
+        if entry and response.status_code == 304:
+            return http_cache.serve(key, entry, response)
+        http_cache.store(key, response)
+        return response
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# GitLab 原来的调用均为 verify=False，默认保持不校验证书；GitHub 默认校验
+gitlab_http = HttpClient('gitlab', verify_env='GITLAB_SSL_VERIFY', verify_default='0')
+github_http = HttpClient('github', verify_env='GITHUB_SSL_VERIFY', verify_default='1')
@@ -0,0 +1,260 @@
+import os
+import re
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from biz.utils.diff_parser import Hunk, first_hunk, parse_hunks
+from biz.utils.log import logger
+
+WHITESPACE = 'whitespace'
+COMMENT = 'comment'
+IMPORT_REORDER = 'import_reorder'
+RENAME = 'rename'
+VERSION_BUMP = 'version_bump'
+
+ALL_CATEGORIES = (WHITESPACE, COMMENT, IMPORT_REORDER, RENAME, VERSION_BUMP)
+
+CATEGORY_NAMES = {
+    WHITESPACE: '仅空白/格式调整',
+    COMMENT: '仅注释修改',
+    IMPORT_REORDER: '仅调整 import 顺序',
+    RENAME: '仅文件重命名',
+    VERSION_BUMP: '仅版本号变更',
+}
+
+# 各语言的单行注释前缀
+LINE_COMMENT_PREFIXES = {
+    '.py': ('#',),
+    '.java': ('//',),
+    '.php': ('//', '#'),
+    '.go': ('//',),
+    '.js': ('//',),
+    '.ts': ('//',),
+    '.vue': ('//',),
+    '.c': ('//',),
+    '.cpp': ('//',),
+    '.h': ('//',),
+    '.sql': ('--',),
+    '.yml': ('#',),
+    '.yaml': ('#',),
+    '.properties': ('#', '!'),
+}
+
+# 各语言的块注释（开始, 结束）；块注释中间以 * 开头的行只有在块内时才算注释，避免把 *p = x 这样的指针解引用当作注释
+C_BLOCK_COMMENT = ('/*', '*/')
+BLOCK_COMMENT_DELIMITERS = {
+    '.py': (('"""', '"""'), ("'''", "'''")),
+    '.java': (C_BLOCK_COMMENT,),
+    '.php': (C_BLOCK_COMMENT,),
+    '.go': (C_BLOCK_COMMENT,),
+    '.js': (C_BLOCK_COMMENT,),
+    '.ts': (C_BLOCK_COMMENT,),
+    '.vue': (C_BLOCK_COMMENT, ('<!--', '-->')),
+    '.c': (C_BLOCK_COMMENT,),
+    '.cpp': (C_BLOCK_COMMENT,),
+    '.h': (C_BLOCK_COMMENT,),
+    '.sql': (C_BLOCK_COMMENT,),
+}
+
+# 各语言的 import 语句
+IMPORT_PATTERNS = {
+    '.py': re.compile(r'^(import\s+\S|from\s+\S+\s+import\s)'),
+    '.java': re.compile(r'^import\s+[\w.*]+\s*;$'),
+    '.php': re.compile(r'^use\s+[\w\\]+(\s+as\s+\w+)?\s*;$'),
+    '.go': re.compile(r'^(import\s+)?(\w+\s+)?"[\w./\-]+"$'),
+    '.js': re.compile(r'^import\s.+$|^const\s+.+=\s*require\(.+\);?$'),
+    '.ts': re.compile(r'^import\s.+$'),
+    '.vue': re.compile(r'^import\s.+$'),
+}
+
+# 缩进有语义的语言，空白调整只认行尾空白与空行的变化
+INDENT_SENSITIVE_EXTENSIONS = ('.py', '.yml', '.yaml')
+
+# 词法单元：字符串、字符字面量整体作为一个单元，其中的空白也参与比较
+TOKEN_PATTERN = re.compile(r'''"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`|\w+|[^\w\s]''')
+
+# 版本号：不带引号时只能是数字与点，带引号时为语义化版本（可带 v 前缀与 -rc.1、+build 等后缀）
+VERSION_VALUE = r'v?\d+(?:\.\d+)*(?:[-+][\w.\-+]*)?'
+VERSION_LINE_PATTERN = re.compile(
+    r'''^(?P<key_quote>["']?)(?:__version__|version|VERSION)(?P=key_quote)\s*[:=]\s*'''
+    r'''(?:\d+(?:\.\d+)*|(?P<quote>["'])''' + VERSION_VALUE + r'''(?P=quote)),?$'''
+    r'''|^<version>''' + VERSION_VALUE + r'''</version>$''')
+
+
+def _parse_language_categories() -> dict:
+    """解析 TRIVIAL_HUNK_CATEGORIES_BY_LANGUAGE，如 ".py=comment|import_reorder;.md=whitespace" """
+    result = {}
+    for item in os.getenv('TRIVIAL_HUNK_CATEGORIES_BY_LANGUAGE', '').split(';'):
+        if '=' in item:
+            ext, categories = item.split('=', 1)
+            result[ext.strip().lower()] = {c.strip() for c in categories.split('|') if c.strip()}
+    return result
+
+
+def changed_lines(hunks: List[Hunk]) -> Tuple[List[str], List[str]]:
+    """返回改动点中删除的行与新增的行（不含 +/- 前缀）"""
+    removed, added = [], []
+    for hunk in hunks:
+        removed.extend(hunk.removed.values())
+        added.extend(hunk.added.values())
+    return removed, added
+
+
+def _comment_flags(lines: List[str], line_prefixes: tuple, blocks: tuple) -> List[bool]:
+    """
+    按顺序跟踪块注释的开始、结束，返回每一行是否为注释（空行视为注释）
+    改动点可能从块注释中间开始：结束标记先于开始标记出现时，视为从块注释内开始
+    """
+    text = '\n'.join(lines)
+    closing = None
+    for start, end in blocks:
+        start_pos, end_pos = text.find(start), text.find(end)
+        if start != end and end_pos >= 0 and (start_pos < 0 or end_pos < start_pos):
+            closing = end
+            break
+    flags = []
+    for line in lines:
+        stripped = line.strip()
+        rest = ''
+        if closing:
+            is_comment = True
+            end_pos = stripped.find(closing)
+            if end_pos >= 0:
+                rest, closing = stripped[end_pos + len(closing):].strip(), None
+        elif not stripped or stripped.startswith(line_prefixes):
+            is_comment = True
+        else:
+            block = next(((start, end) for start, end in blocks if stripped.startswith(start)), None)
+            is_comment = block is not None
+            if block:
+                start, end = block
+                end_pos = stripped.find(end, len(start))
+                if end_pos < 0:
+                    closing = end
+                else:
+                    rest = stripped[end_pos + len(end):].strip()
+        # 块注释在行中结束、之后还有代码时不算注释
+        if rest and not rest.startswith(line_prefixes):
+            is_comment = False
+        flags.append(is_comment)
+    return flags
+
+
+class TrivialHunkFilter:
+    """
+    无实质逻辑变更的改动点分类器（纯文本规则，不调用 LLM）
+        whitespace: 仅空白/格式调整；缩进有语义的语言（python、yaml）只认行尾空白、空行的变化
+        comment: 仅修改注释（按语言识别单行注释前缀，并跟踪块注释的开始、结束）
+        import_reorder: 仅调整 import 顺序（删除与新增的 import 语句完全相同）
+        rename: 仅文件重命名，没有内容修改
+        version_bump: 仅修改版本号
+    开启的分类由 TRIVIAL_HUNK_CATEGORIES 配置，可通过 TRIVIAL_HUNK_CATEGORIES_BY_LANGUAGE 按文件扩展名覆盖
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('TRIVIAL_HUNK_FILTER_ENABLED', '0') == '1'
+        self.categories = {c.strip() for c in os.getenv('TRIVIAL_HUNK_CATEGORIES', ','.join(ALL_CATEGORIES)).split(',')
+                           if c.strip()}
+        self.language_categories = _parse_language_categories()
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def categories_for(self, path: str) -> set:
+        return self.language_categories.get(os.path.splitext(path or '')[1].lower(), self.categories)
+
+    def classify(self, diff: dict) -> Optional[str]:
+        """返回改动点的无实质变更分类，需要 review 时返回 None"""
+        if not self.enabled:
+            return None
+        path = diff.get('new_path') or diff.get('old_path') or ''
+        ext = os.path.splitext(path)[1].lower()
+        categories = self.categories_for(path)
+        diff_text = diff.get('diff', '')
+        hunks = parse_hunks(diff_text)
+        removed, added = changed_lines(hunks)
+
+        if not removed and not added:
+            is_rename = diff.get('renamed_file') in (True, 'true')
+            return RENAME if is_rename and RENAME in categories else None
+
+        if WHITESPACE in categories and self._is_whitespace_only(removed, added, ext):
+            return WHITESPACE
+        if COMMENT in categories and self._is_comment_only(hunks, diff_text, ext):
+            return COMMENT
+        if IMPORT_REORDER in categories and self._is_import_reorder(removed, added, ext):
+            return IMPORT_REORDER
+        if VERSION_BUMP in categories and self._is_version_bump(removed, added):
+            return VERSION_BUMP
+        return None
+
+    @staticmethod
+    def _is_whitespace_only(removed: List[str], added: List[str], ext: str) -> bool:
+        if ext in INDENT_SENSITIVE_EXTENSIONS:
+            def normalize(lines):
+                return [line.rstrip() for line in lines if line.strip()]
+        else:
+            def normalize(lines):
+                # 按词法单元比较，避免把 "return x" 与 "returnx" 视为相同；字符串字面量中的空白需完全一致
+                return TOKEN_PATTERN.findall('\n'.join(lines))
+        return normalize(removed) == normalize(added)
+
+    @staticmethod
+    def _is_comment_only(hunks: List[Hunk], diff_text: str, ext: str) -> bool:
+        line_prefixes = LINE_COMMENT_PREFIXES.get(ext)
+        if not line_prefixes:
+            return False
+        blocks = BLOCK_COMMENT_DELIMITERS.get(ext, ())
+        for hunk in hunks:
+            # 旧文件（上下文 + 删除行）与新文件（上下文 + 新增行）分别跟踪块注释状态
+            for changed_marker in ('-', '+'):
+                side = [(marker, content) for marker, content in hunk.lines(diff_text)
+                        if marker in (' ', changed_marker)]
+                flags = _comment_flags([content for _, content in side], line_prefixes, blocks)
+                if not all(flag for (marker, _), flag in zip(side, flags) if marker == changed_marker):
+                    return False
+        return True
+
+    @staticmethod
+    def _is_import_reorder(removed: List[str], added: List[str], ext: str) -> bool:
+        pattern = IMPORT_PATTERNS.get(ext)
+        if not pattern:
+            return False
+        removed = sorted(line.strip() for line in removed if line.strip())
+        added = sorted(line.strip() for line in added if line.strip())
+        return bool(added) and removed == added and all(pattern.match(line) for line in added)
+
+    @staticmethod
+    def _is_version_bump(removed: List[str], added: List[str]) -> bool:
+        removed = [line.strip() for line in removed if line.strip()]
+        added = [line.strip() for line in added if line.strip()]
+        return (bool(added) and len(removed) == len(added)
+                and all(VERSION_LINE_PATTERN.match(line) for line in removed + added))
+
+    def split(self, diffs: list) -> Tuple[list, list]:
+        """
+        将改动点分为需要 review 的和无实质变更的两部分，并累加各分类的计数
+        :return: (需要 review 的改动点, [(无实质变更的改动点, 分类)])
+        """
+        to_review, trivial = [], []
+        for diff in diffs:
+            category = self.classify(diff)
+            if category:
+                trivial.append((diff, category))
+            else:
+                to_review.append(diff)
+        if trivial:
+            with self._lock:
+                self.counters.update(category for _, category in trivial)
+            logger.info(f"无实质变更的改动点 {len(trivial)} 个，跳过 AI review，分类统计: {dict(self.counters)}")
+        return to_review, trivial
+
+    @staticmethod
+    def summary(trivial: list) -> str:
+        """生成无实质变更改动点的汇总（markdown），用于一次性评论到MR"""
+        lines = ["**以下改动点为无实质逻辑的变更，未进行 AI review：**", ""]
+        for diff, category in trivial:
+            hunk = first_hunk(diff.get('diff', ''))
+            line = f" 第 {hunk.new_start} 行" if hunk else ""
+            lines.append(f"- `{diff.get('new_path')}`{line}：{CATEGORY_NAMES.get(category, category)}")
+        return "\n".join(lines)
@@ -0,0 +1,98 @@
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Union
+
+from biz.utils.diff_parser import iter_file_diffs
+from biz.utils.log import logger
+
+# 文件扩展名到语言的映射
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python',
+    '.js': 'javascript',
+    '.ts': 'typescript',
+    '.jsx': 'javascript',
+    '.tsx': 'typescript',
+    '.vue': 'vue',
+    '.java': 'java',
+    '.go': 'go',
+    '.php': 'php',
+    '.cpp': 'cpp',
+    '.cc': 'cpp',
+    '.cxx': 'cpp',
+    '.c': 'c',
+    '.h': 'cpp',
+    '.hpp': 'cpp',
+    '.proto': 'protobuf',
+    '.yaml': 'yaml',
+    '.yml': 'yaml',
+}
+
+# 没有文件路径时按内容特征判断，按顺序优先：Vue > JavaScript > Python
+CONTENT_KEYWORDS = (
+    ('vue', ('<template>', '<script>', '<style>', 'vue')),
+    ('javascript', ('function', 'var ', 'let ', 'const ', '=>', 'prompt(', 'alert(', 'console.log', 'document.',
+                    'window.', 'addEventListener')),
+    ('python', ('def ', 'import ', 'from ', 'class ', 'if __name__', 'print(', 'self.', 'return ', 'try:', 'except:',
+                'with open(')),
+)
+# 所有关键字合并为一个正则，一次遍历即可得到出现过的语言
+CONTENT_PATTERN = re.compile('|'.join(f"(?P<{language}>{'|'.join(re.escape(keyword) for keyword in keywords)})"
+                                      for language, keywords in CONTENT_KEYWORDS), re.IGNORECASE)
+# 没有 diff --git 头部时，从 +++ 行取文件路径
+NEW_PATH_PATTERN = re.compile(r'^\+\+\+ (?:b/)?(.+)$', re.MULTILINE)
+
+
+def content_sniffing_enabled() -> bool:
+    return os.getenv('LANGUAGE_CONTENT_SNIFFING', '1') == '1'
+
+
+@lru_cache(maxsize=1024)
+def detect_language_from_paths(paths: Tuple[str, ...]) -> str:
+    """按文件扩展名统计，返回文件数最多的语言，没有可识别的扩展名时返回 default；同一组文件的结果会被缓存"""
+    language_counts = {}
+    for path in paths:
+        language = LANGUAGE_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+        if language:
+            language_counts[language] = language_counts.get(language, 0) + 1
+    if not language_counts:
+        return 'default'
+    return max(language_counts, key=language_counts.get)
+
+
+def detect_language_from_content(text: str) -> str:
+    """一次遍历内容匹配所有语言的关键字，按优先级返回出现过的语言，都没有时返回 default"""
+    seen = set()
+    for match in CONTENT_PATTERN.finditer(text):
+        seen.add(match.lastgroup)
+        if match.lastgroup == CONTENT_KEYWORDS[0][0]:
+            break
+    return next((language for language, _ in CONTENT_KEYWORDS if language in seen), 'default')
+
+
+def paths_from_diff(diffs_text: str) -> List[str]:
+    """从 diff 文本的文件头部中取出改动文件的路径"""
+    paths = [file_diff.new_path for file_diff in iter_file_diffs(diffs_text, keep_lines=False)]
+    return paths or [path.rstrip('\t') for path in NEW_PATH_PATTERN.findall(diffs_text) if path != '/dev/null']
+
+
+def paths_from_changes(changes: Iterable) -> List[str]:
+    return [change.get('new_path') or change.get('old_path') for change in changes
+            if isinstance(change, dict) and (change.get('new_path') or change.get('old_path'))]
+
+
+def detect_language(changes: Union[str, list]) -> str:
+    """
+    检测改动的主要编程语言
+        1. changes 为改动列表时直接取 new_path，为 diff 文本时从文件头部取路径，按扩展名统计
+        2. 没有可识别的文件路径时，按内容特征判断（LANGUAGE_CONTENT_SNIFFING=0 时关闭）
+    """
+    if isinstance(changes, str):
+        paths = paths_from_diff(changes)
+    else:
+        paths = paths_from_changes(changes or [])
+    language = detect_language_from_paths(tuple(paths))
+    if language == 'default' and isinstance(changes, str) and content_sniffing_enabled():
+        language = detect_language_from_content(changes)
+    logger.debug(f"检测到主要编程语言: {language}, 文件数: {len(paths)}")
+    return language
@@ -0,0 +1,84 @@
+"""
+语言检测的性能对比：原来的逐行正则检测（每行最多 5 次 re.search + 12 个 Vue3 关键字扫描）与 language_detector
+
+    1. 逐行检测：一次 review 调用 2~3 次（截断前、截断后、review_code 中），这里按 3 次统计；原实现每次匹配都记录 INFO 日志，
+       这里去掉了日志，只比较检测本身
+    2. 改动列表：按 new_path 检测，同一组文件第二次调用命中缓存
+    3. diff 文本：从文件头部取路径检测
+
+运行方式:
+    python -m biz.utils.language_detector_benchmark [文件数量] [每个文件的行数]
+"""
+import os
+import re
+import sys
+import time
+
+from biz.utils.language_detector import LANGUAGE_BY_EXTENSION, detect_language, detect_language_from_paths
+
+LEGACY_FILE_PATTERNS = [r'^\+\+\+ b/(.+)$', r'^\+\+\+ (.+)$', r'^--- a/(.+)$', r'^--- (.+)$',
+                        r'^diff --git a/(.+) b/(.+)$']
+LEGACY_VUE3_INDICATORS = ['setup()', 'defineprops', 'defineemits', 'ref(', 'reactive(', 'computed(', 'watch(',
+                          'onmounted', 'onunmounted', 'composition api', 'script setup', '<script setup']
+
+
+def legacy_detect(diffs_text: str) -> str:
+    language_counts = {}
+    vue3_indicators = 0
+    for line in diffs_text.split('\n'):
+        file_path = None
+        for pattern in LEGACY_FILE_PATTERNS:
+            match = re.search(pattern, line)
+            if match:
+                file_path = match.group(1)
+                break
+        if file_path:
+            language = LANGUAGE_BY_EXTENSION.get(os.path.splitext(file_path)[1].lower())
+            if language:
+                language_counts[language] = language_counts.get(language, 0) + 1
+        line_lower = line.lower()
+        if any(indicator in line_lower for indicator in LEGACY_VUE3_INDICATORS):
+            vue3_indicators += 1
+    return max(language_counts, key=language_counts.get) if language_counts else 'default'
+
+
+def build_changes(file_count: int, file_lines: int) -> list:
+    changes = []
+    for index in range(file_count):
+        path = f'web/src/components/Widget{index}.vue' if index % 3 == 0 else f'service/module_{index}.py'
+        lines = [f'@@ -1,{file_lines} +1,{file_lines} @@']
+        lines += [f'+    value_{line} = compute(ref({line}), watch(data))' for line in range(file_lines)]
+        changes.append({'new_path': path, 'old_path': path, 'diff': '\n'.join(lines)})
+    return changes
+
+
+def to_diff_text(changes: list) -> str:
+    return '\n'.join(f"diff --git a/{change['new_path']} b/{change['new_path']}\nindex 0000000..0000000 100644\n"
+                     f"--- a/{change['new_path']}\n+++ b/{change['new_path']}\n{change['diff']}" for change in changes)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(file_count: int = 500, file_lines: int = 100):
+    changes = build_changes(file_count, file_lines)
+    diffs_text = to_diff_text(changes)
+    print(f"{file_count} 个文件, diff 共 {diffs_text.count(chr(10)) + 1} 行, {len(diffs_text) / 1024 / 1024:.1f} MB")
+
+    legacy, elapsed = _timed(lambda: [legacy_detect(diffs_text) for _ in range(3)][-1])
+    print(f"逐行检测 x3: {legacy}, {elapsed:.1f} ms")
+    detect_language_from_paths.cache_clear()
+    language, elapsed = _timed(lambda: detect_language(changes))
+    print(f"改动列表（首次）: {language}, {elapsed:.2f} ms")
+    language, elapsed = _timed(lambda: detect_language(changes))
+    print(f"改动列表（缓存）: {language}, {elapsed:.2f} ms")
+    detect_language_from_paths.cache_clear()
+    language, elapsed = _timed(lambda: detect_language(diffs_text))
+    print(f"diff 文本: {language}, {elapsed:.2f} ms")
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
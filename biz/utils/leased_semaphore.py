@@ -0,0 +1,89 @@
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+from biz.utils.log import logger
+from biz.utils.polling import backoff_delays
+from biz.utils.shared_state import get_state_store
+
+
+class LeasedSemaphore:
+    """
+    跨进程的计数信号量，状态保存在共享存储中（QUEUE_DRIVER=rq 时为 Redis，否则为加文件锁的本地文件），所有 worker 共用
+        1. 每次获取得到一个带过期时间的租约（lease_seconds），释放时删除；进程异常退出未释放的租约过期后自动回收
+        2. 未过期的租约数达到上限时按指数退避等待，直到有租约释放或过期
+    共享存储不可用时记录日志并直接放行，不阻塞 review
+    """
+
+    def __init__(self, name: str, limit: int, lease_seconds: float = 600, store=None):
+        self.name = name
+        self.limit = max(1, limit)
+        self.lease_seconds = lease_seconds
+        self._store = store
+
+    @property
+    def store(self):
+        return self._store or get_state_store()
+
+    @property
+    def _key(self) -> str:
+        return f"semaphore:{self.name}"
+
+    def try_acquire(self) -> Optional[str]:
+        """尝试获取一个租约：成功时返回租约 id，已达上限时返回 None"""
+        lease_id = uuid.uuid4().hex
+        granted = False
+
+        def take(current):
+            nonlocal granted
+            now = time.time()
+            leases = {key: expires_at for key, expires_at in ((current or {}).get('leases') or {}).items()
+                      if expires_at > now}
+            granted = len(leases) < self.limit
+            if granted:
+                leases[lease_id] = now + self.lease_seconds
+            return {'leases': leases}
+
+        self.store.update(self._key, take)
+        return lease_id if granted else None
+
+    def acquire(self) -> Optional[str]:
+        """获取一个租约，达到上限时阻塞等待；共享存储不可用时返回 None（不做限制）"""
+        delays = backoff_delays(initial=0.05, max_delay=1)
+        waited = 0.0
+        while True:
+            try:
+                lease_id = self.try_acquire()
+            except Exception as e:
+                logger.warn(f"读取信号量 {self.name} 的状态失败，不做全局并发限制: {e}")
+                return None
+            if lease_id:
+                if waited:
+                    logger.debug(f"信号量 {self.name} 已达上限 {self.limit}，等待 {waited:.2f}s")
+                return lease_id
+            delay = next(delays)
+            time.sleep(delay)
+            waited += delay
+
+    def release(self, lease_id: Optional[str]):
+        if not lease_id:
+            return
+
+        def drop(current):
+            leases = dict((current or {}).get('leases') or {})
+            leases.pop(lease_id, None)
+            return {'leases': leases}
+
+        try:
+            self.store.update(self._key, drop)
+        except Exception as e:
+            logger.warn(f"释放信号量 {self.name} 的租约失败，将在过期后回收: {e}")
+
+    @contextmanager
+    def hold(self):
+        lease_id = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(lease_id)
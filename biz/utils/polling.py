@@ -0,0 +1,82 @@
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Iterator, Tuple, TypeVar
+
+from biz.utils.log import logger
+
+T = TypeVar('T')
+
+
+def backoff_delays(initial: float = None, max_delay: float = None, factor: float = 2.0,
+                   jitter: float = 0.5) -> Iterator[float]:
+    """
+    指数退避的等待时间序列：initial, initial*factor, ...，不超过 max_delay
+    每个等待时间在 [delay*(1-jitter), delay] 之间随机，避免多个 worker 同时请求
+    """
+    delay = initial if initial is not None else float(os.getenv('GITLAB_POLL_INITIAL_DELAY', 0.25))
+    max_delay = max_delay if max_delay is not None else float(os.getenv('GITLAB_POLL_MAX_DELAY', 5))
+    while True:
+        yield delay * (1 - jitter * random.random())
+        delay = min(delay * factor, max_delay)
+
+
+def _deadline(timeout: float = None) -> float:
+    timeout = timeout if timeout is not None else float(os.getenv('GITLAB_POLL_TIMEOUT', 30))
+    return time.monotonic() + timeout
+
+
+def poll(fetch: Callable[[], T], is_ready: Callable[[T], bool], timeout: float = None,
+         description: str = '') -> Tuple[T, bool]:
+    """
+    轮询 fetch() 直到 is_ready(结果) 为 True 或超过 timeout 秒（GITLAB_POLL_TIMEOUT，默认 30 秒）
+    :return: (最后一次的结果, 是否就绪)
+    """
+    deadline = _deadline(timeout)
+    started_at = time.monotonic()
+    attempt = 0
+    for delay in backoff_delays():
+        attempt += 1
+        result = fetch()
+        if is_ready(result):
+            if attempt > 1:
+                logger.info(f"{description} 第 {attempt} 次请求就绪，等待 {time.monotonic() - started_at:.2f}s")
+            return result, True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning(f"{description} 在 {attempt} 次请求后仍未就绪，已超过等待时间")
+            return result, False
+        logger.info(f"{description} 未就绪，{min(delay, remaining):.2f}s 后重试（第 {attempt} 次）")
+        time.sleep(min(delay, remaining))
+
+
+async def async_poll(fetch: Callable[[], Awaitable[T]], is_ready: Callable[[T], bool], timeout: float = None,
+                     description: str = '') -> Tuple[T, bool]:
+    """poll 的异步版本"""
+    deadline = _deadline(timeout)
+    attempt = 0
+    for delay in backoff_delays():
+        attempt += 1
+        result = await fetch()
+        if is_ready(result):
+            return result, True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning(f"{description} 在 {attempt} 次请求后仍未就绪，已超过等待时间")
+            return result, False
+        logger.info(f"{description} 未就绪，{min(delay, remaining):.2f}s 后重试（第 {attempt} 次）")
+        await asyncio.sleep(min(delay, remaining))
+
+
+def merge_request_ready(merge_request: dict) -> bool:
+    """
+    根据 MR 详情判断 GitLab 是否已生成好 diff：
+    diff_refs 的 base_sha、head_sha、start_sha 齐全，且 merge_status/detailed_merge_status 不是 preparing
+    """
+    if not merge_request:
+        return False
+    diff_refs = merge_request.get('diff_refs') or {}
+    if not all(diff_refs.get(key) for key in ('base_sha', 'head_sha', 'start_sha')):
+        return False
+    return 'preparing' not in (merge_request.get('merge_status'), merge_request.get('detailed_merge_status'))
@@ -0,0 +1,59 @@
+import fnmatch
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Pattern, Tuple
+
+from biz.utils.log import logger
+
+
+def compile_branch_patterns(patterns: Iterable[str]) -> Optional[Pattern]:
+    """将保护分支的通配符（如 release/*）合并编译为一个正则，没有保护分支时返回 None"""
+    parts = [f"(?:{fnmatch.translate(pattern)})" for pattern in patterns if pattern]
+    return re.compile('|'.join(parts)) if parts else None
+
+
+class ProtectedBranchCache:
+    """
+    按项目缓存保护分支的匹配规则
+        1. 每个项目的保护分支列表编译为一个正则，判断目标分支时只做一次匹配
+        2. 缓存 PROTECTED_BRANCH_CACHE_TTL_SECONDS 秒（默认 300 秒），过期后重新获取；获取失败时不缓存
+        3. 保护分支变更时（如 GitHub 的 branch_protection_rule 事件）通过 invalidate 立即失效
+    """
+
+    def __init__(self, ttl_seconds: float = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv('PROTECTED_BRANCH_CACHE_TTL_SECONDS', 300))
+        self._entries: Dict[Tuple, Tuple[Optional[Pattern], float]] = {}
+        self._lock = threading.Lock()
+
+    def matcher(self, key: Tuple, loader: Callable[[], Optional[list]]) -> Optional[Pattern]:
+        """获取项目的保护分支正则，loader 返回保护分支名列表，失败时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[1] < self.ttl_seconds:
+            return entry[0]
+        patterns = loader()
+        if patterns is None:
+            return entry[0] if entry else None
+        compiled = compile_branch_patterns(patterns)
+        with self._lock:
+            self._entries[key] = (compiled, time.monotonic())
+        logger.debug(f"缓存 {key} 的保护分支: {patterns}")
+        return compiled
+
+    def is_protected(self, key: Tuple, branch: str, loader: Callable[[], Optional[list]]) -> bool:
+        compiled = self.matcher(key, loader)
+        return bool(compiled and branch and compiled.match(branch))
+
+    def invalidate(self, key: Tuple = None):
+        """使某个项目（不传时为全部项目）的缓存失效"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+protected_branch_cache = ProtectedBranchCache()
@@ -0,0 +1,238 @@
+import asyncio
+import email.utils
+import os
+import threading
+import time
+from typing import Mapping, Optional
+
+from biz.utils.log import logger
+from biz.utils.shared_state import get_state_store
+
+
+def _parse_retry_after(value: Optional[str], now: float) -> Optional[float]:
+    """Retry-After 可能是秒数，也可能是 HTTP 日期，返回可以重新请求的时间戳"""
+    if not value:
+        return None
+    try:
+        return now + max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_seconds(headers: Mapping[str, str], default: float = 1.0) -> float:
+    """429 响应需要等待的秒数"""
+    now = time.time()
+    retry_at = _parse_retry_after(headers.get('Retry-After'), now)
+    return max(0.0, retry_at - now) if retry_at is not None else default
+
+
+def is_rate_limited(status_code: int, headers: Mapping[str, str]) -> bool:
+    """429，或 GitHub 额度耗尽、触发二级限流时返回的 403"""
+    if status_code == 429:
+        return True
+    return status_code == 403 and (headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in headers)
+
+
+def _parse_reset(value: Optional[str], now: float) -> Optional[float]:
+    """RateLimit-Reset / X-RateLimit-Reset：GitLab、GitHub 均为时间戳，兼容以秒数表示的剩余时间"""
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    return reset if reset > 1e9 else now + reset
+
+
+class RateLimiter:
+    """
+    按 VCS host 的令牌桶限流，状态保存在共享存储中（QUEUE_DRIVER=rq 时为 Redis，否则为加文件锁的本地文件），多个 worker 共用
+        1. 每次请求前取一个令牌，速率 RATE_LIMIT_REQUESTS_PER_SECOND，桶容量 RATE_LIMIT_BURST，令牌不足时等待
+        2. 根据响应头 RateLimit-Remaining / X-RateLimit-Remaining 与 Reset，把剩余额度平摊到重置前的时间内，主动降速；
+           剩余额度不超过 RATE_LIMIT_RESERVE 时暂停到重置时间
+        3. 429、额度耗尽或触发二级限流的 403 响应按 Retry-After / Reset 暂停该 host 的所有请求
+    单次等待不超过 RATE_LIMIT_MAX_WAIT_SECONDS，超过时不再等待，由服务端决定是否拒绝
+    为减少共享存储的读写（本地文件时每次都要加锁重写整个文件）：
+        - 每次从共享存储最多取 RATE_LIMIT_LOCAL_BATCH 个令牌，多取的令牌在本进程内 1 秒内用完，之后作废
+        - 响应头显示额度充足、速率无需调整时 observe 不写共享存储
+        - 每个 host 的状态在 STATE_TTL 秒无更新后过期删除
+    """
+
+    STATE_TTL = 24 * 3600
+    LOCAL_TOKEN_SECONDS = 1.0
+
+    def __init__(self, store=None, rate: float = None, burst: float = None, reserve: int = None,
+                 max_wait: float = None, batch: int = None):
+        self._store = store
+        self.rate = rate if rate is not None else float(os.getenv('RATE_LIMIT_REQUESTS_PER_SECOND', 20))
+        self.burst = burst if burst is not None else float(os.getenv('RATE_LIMIT_BURST', 40))
+        self.reserve = reserve if reserve is not None else int(os.getenv('RATE_LIMIT_RESERVE', 10))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('RATE_LIMIT_MAX_WAIT_SECONDS', 60))
+        self.batch = max(1, batch if batch is not None else int(os.getenv('RATE_LIMIT_LOCAL_BATCH', 5)))
+        # host -> (本进程预取的令牌数, 作废时间)
+        self._local_tokens = {}
+        # host -> 最近一次在共享存储中看到的速率，用于判断 observe 是否需要写入
+        self._known_rates = {}
+        self._local_lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self._store or get_state_store()
+
+    @staticmethod
+    def _key(host: str) -> str:
+        return f"rate_limit:{host}"
+
+    def _refill(self, state: Optional[dict], now: float) -> dict:
+        state = dict(state or {})
+        rate = state.get('rate') or self.rate
+        tokens = state.get('tokens', self.burst)
+        elapsed = max(0.0, now - state.get('updated_at', now))
+        state['tokens'] = min(self.burst, tokens + elapsed * rate)
+        state['updated_at'] = now
+        return state
+
+    def _take_local(self, host: str) -> bool:
+        """从本进程预取的令牌中取一个"""
+        with self._local_lock:
+            tokens, expires_at = self._local_tokens.get(host, (0, 0.0))
+            if tokens <= 0 or expires_at <= time.monotonic():
+                self._local_tokens.pop(host, None)
+                return False
+            self._local_tokens[host] = (tokens - 1, expires_at)
+            return True
+
+    def _drop_local(self, host: str):
+        with self._local_lock:
+            self._local_tokens.pop(host, None)
+
+    def reserve_token(self, host: str) -> float:
+        """尝试取一个令牌：取到时返回 0，否则返回需要等待的秒数（不消耗令牌）"""
+        if self._take_local(host):
+            return 0.0
+        wait = 0.0
+        taken = 0
+
+        def take(current):
+            nonlocal wait, taken
+            now = time.time()
+            state = self._refill(current, now)
+            blocked_until = state.get('blocked_until') or 0
+            taken = 0
+            if blocked_until > now:
+                wait = blocked_until - now
+            elif state['tokens'] >= 1:
+                taken = min(self.batch, int(state['tokens']))
+                state['tokens'] -= taken
+                wait = 0.0
+            else:
+                wait = (1 - state['tokens']) / (state.get('rate') or self.rate)
+            return state
+
+        try:
+            state = self.store.update(self._key(host), take, ttl=self.STATE_TTL)
+        except Exception as e:
+            logger.warn(f"读取 {host} 的限流状态失败，不做限流: {e}")
+            return 0.0
+        with self._local_lock:
+            self._known_rates[host] = state.get('rate') or self.rate
+            if taken > 1:
+                self._local_tokens[host] = (taken - 1, time.monotonic() + self.LOCAL_TOKEN_SECONDS)
+        return wait
+
+    def acquire(self, host: str):
+        """请求前调用，令牌不足或 host 被暂停时阻塞等待"""
+        waited = 0.0
+        while True:
+            wait = self.reserve_token(host)
+            if wait <= 0:
+                break
+            if waited + wait > self.max_wait:
+                logger.warn(f"{host} 限流需要等待 {wait:.1f}s，超过最长等待时间，直接请求")
+                break
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            logger.info(f"{host} 触发限流，等待 {waited:.2f}s")
+
+    async def async_acquire(self, host: str):
+        """acquire 的异步版本，读写共享存储在线程池中执行，不阻塞事件循环"""
+        waited = 0.0
+        while True:
+            wait = 0.0 if self._take_local(host) else await asyncio.to_thread(self.reserve_token, host)
+            if wait <= 0 or waited + wait > self.max_wait:
+                break
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            logger.info(f"{host} 触发限流，等待 {waited:.2f}s")
+
+    def observe(self, host: str, status_code: int, headers: Mapping[str, str]):
+        """请求完成后调用，根据限流相关的响应头调整该 host 的速率或暂停时间"""
+        now = time.time()
+        try:
+            remaining = int(headers.get('RateLimit-Remaining') or headers.get('X-RateLimit-Remaining'))
+        except (TypeError, ValueError):
+            remaining = None
+        reset_at = _parse_reset(headers.get('RateLimit-Reset') or headers.get('X-RateLimit-Reset'), now)
+        retry_at = _parse_retry_after(headers.get('Retry-After'), now)
+        exhausted = is_rate_limited(status_code, headers)
+        if remaining is None and retry_at is None and not exhausted:
+            return
+
+        blocked_until = None
+        if exhausted:
+            blocked_until = retry_at or reset_at or now + 1
+        elif remaining is not None and remaining <= self.reserve and reset_at:
+            blocked_until = reset_at
+        rate = None
+        if remaining is not None and reset_at and reset_at > now:
+            # 剩余额度平摊到重置前的时间内
+            rate = max(0.1, min(self.rate, remaining / (reset_at - now)))
+        elif remaining is not None:
+            rate = self.rate
+        with self._local_lock:
+            known_rate = self._known_rates.get(host, self.rate)
+        if not blocked_until and (rate is None or abs(rate - known_rate) <= known_rate * 0.01):
+            # 额度充足且速率不变，不写共享存储
+            return
+        if blocked_until:
+            self._drop_local(host)
+
+        def adjust(current):
+            state = self._refill(current, now)
+            if blocked_until:
+                state['blocked_until'] = max(state.get('blocked_until') or 0, blocked_until)
+                state['tokens'] = 0.0
+            if rate is not None:
+                state['rate'] = rate
+            return state
+
+        try:
+            state = self.store.update(self._key(host), adjust, ttl=self.STATE_TTL)
+        except Exception as e:
+            logger.warn(f"更新 {host} 的限流状态失败: {e}")
+            return
+        with self._local_lock:
+            self._known_rates[host] = state.get('rate') or self.rate
+        if exhausted or (state.get('blocked_until') or 0) > now:
+            logger.warn(f"{host} 接口额度不足（status={status_code}, remaining={remaining}），"
+                        f"暂停请求 {state['blocked_until'] - now:.1f}s")
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """获取进程内共享的限流器，RATE_LIMIT_ENABLED 不为 1 时返回 None"""
+    global _rate_limiter
+    if os.getenv('RATE_LIMIT_ENABLED', '0') != '1':
+        return None
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter()
+    return _rate_limiter
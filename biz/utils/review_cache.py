@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from biz.utils.diff_parser import strip_line_numbers
+from biz.utils.log import logger
+
+class ReviewCache:
+    """
+    按内容寻址的 review 结果缓存（持久化到 sqlite，多进程共享）
+        key = 归一化的改动内容指纹 + 上下文（文件内容等）哈希 + 提示词版本 + 模型
+        1. 指纹去掉了改动点头部的行号，rebase、force-push、cherry-pick 到其他分支后仍能命中
+        2. TTL 过期淘汰 + 超过最大条目数时按最近访问时间（LRU）淘汰
+        3. 进程内统计命中、未命中、淘汰次数
+    """
+
+    def __init__(self, db_file: str = None, ttl_seconds: int = None, max_entries: int = None):
+        self.db_file = db_file or os.getenv('REVIEW_CACHE_DB', 'data/review_cache.db')
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv('REVIEW_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.getenv('REVIEW_CACHE_MAX_ENTRIES', 20000))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=10)
+
+    def _init_db(self):
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            review_result TEXT,
+                            created_at INTEGER,
+                            last_access INTEGER
+                        )
+                    ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_review_cache_last_access ON review_cache (last_access)')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"review 缓存初始化失败: {e}")
+
+    @staticmethod
+    def fingerprint(diff_text: str) -> str:
+        """去掉行号后的改动内容指纹，rebase、cherry-pick 后行号变化但改动内容不变"""
+        normalized = strip_line_numbers(diff_text)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def content_hash(text) -> str:
+        return hashlib.sha256(str(text or '').encode('utf-8')).hexdigest()
+
+    def make_key(self, diff_text: str, context, prompt_version: str, model: str) -> str:
+        parts = [self.fingerprint(diff_text), self.content_hash(context), prompt_version or '', model or '']
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT review_result, created_at FROM review_cache WHERE cache_key = ?', (key,))
+                row = cursor.fetchone()
+                if row and now - row[1] <= self.ttl_seconds:
+                    cursor.execute('UPDATE review_cache SET last_access = ? WHERE cache_key = ?', (now, key))
+                    conn.commit()
+                    self._count('hits')
+                    return row[0]
+                if row:
+                    # 已过期
+                    cursor.execute('DELETE FROM review_cache WHERE cache_key = ?', (key,))
+                    conn.commit()
+                    self._count('evictions')
+        except sqlite3.DatabaseError as e:
+            logger.error(f"读取 review 缓存失败: {e}")
+        self._count('misses')
+        return None
+
+    def put(self, key: str, review_result: str):
+        if not review_result:
+            return
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                        INSERT OR REPLACE INTO review_cache (cache_key, review_result, created_at, last_access)
+                        VALUES (?, ?, ?, ?)
+                    ''', (key, review_result, now, now))
+                # 超过最大条目数时，淘汰最久未访问的记录
+                cursor.execute('SELECT COUNT(*) FROM review_cache')
+                overflow = cursor.fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    cursor.execute('''
+                            DELETE FROM review_cache WHERE cache_key IN (
+                                SELECT cache_key FROM review_cache ORDER BY last_access ASC LIMIT ?
+                            )
+                        ''', (overflow,))
+                    self._count('evictions', overflow)
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"写入 review 缓存失败: {e}")
+
+    def purge_expired(self) -> int:
+        """清理所有过期的记录，返回清理的条数"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM review_cache WHERE created_at < ?', (int(time.time()) - self.ttl_seconds,))
+                conn.commit()
+                self._count('evictions', cursor.rowcount)
+                return cursor.rowcount
+        except sqlite3.DatabaseError as e:
+            logger.error(f"清理 review 缓存失败: {e}")
+            return 0
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+_review_cache = None
+_review_cache_lock = threading.Lock()
+
+
+def get_review_cache() -> Optional[ReviewCache]:
+    """获取进程内共享的 review 缓存，REVIEW_CACHE_ENABLED 不为 1 时返回 None"""
+    global _review_cache
+    if os.getenv('REVIEW_CACHE_ENABLED', '0') != '1':
+        return None
+    if _review_cache is None:
+        with _review_cache_lock:
+            if _review_cache is None:
+                _review_cache = ReviewCache()
+    return _review_cache
@@ -0,0 +1,133 @@
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from biz.utils.log import logger
+
+
+class FileStateStore:
+    """
+    基于文件锁的本地状态存储，适用于 QUEUE_DRIVER=async（同一台机器上的多个 worker 子进程）
+    所有数据保存在一个 json 文件中，读写时通过 fcntl 加锁保证跨进程的原子性
+    设置了 ttl 的 key 过期时间记录在 EXPIRES_KEY 下，每次写入时清理已过期的 key，避免文件无限增长
+    """
+
+    EXPIRES_KEY = '__expires_at__'
+
+    def __init__(self, state_file: str = None):
+        self.state_file = state_file or os.getenv('SHARED_STATE_FILE', 'data/shared_state.json')
+        self.lock_file = f"{self.state_file}.lock"
+        # 同一进程内的多个线程先用线程锁串行，再用文件锁跨进程串行
+        self._thread_lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, state: dict):
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(tmp_file, self.state_file)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._thread_lock, open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+            try:
+                state = self._read()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        expires_at = (state.get(self.EXPIRES_KEY) or {}).get(key)
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return state.get(key)
+
+    def _prune(self, state: dict, now: float) -> dict:
+        expires = state.get(self.EXPIRES_KEY) or {}
+        for key in [key for key, expires_at in expires.items() if expires_at <= now]:
+            state.pop(key, None)
+            expires.pop(key)
+        state[self.EXPIRES_KEY] = expires
+        return expires
+
+    def update(self, key: str, func: Callable[[Optional[Any]], Any], ttl: float = None) -> Any:
+        """
+        原子地读取 key 的当前值，写入 func(当前值) 并返回写入的值
+        ttl 不为空时 key 在 ttl 秒后过期（每次 update 重新计时），否则永不过期
+        """
+        with self._thread_lock, open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                state = self._read()
+                expires = self._prune(state, now)
+                value = func(state.get(key))
+                state[key] = value
+                if ttl:
+                    expires[key] = now + ttl
+                else:
+                    expires.pop(key, None)
+                if not expires:
+                    state.pop(self.EXPIRES_KEY)
+                self._write(state)
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class RedisStateStore:
+    """基于 Redis 的状态存储，适用于 QUEUE_DRIVER=rq（worker 可能分布在多台机器上）"""
+
+    def __init__(self, redis_client=None, prefix: str = 'ai_codereview:'):
+        if redis_client is None:
+            from redis import Redis
+            redis_client = Redis(os.getenv('REDIS_HOST', '127.0.0.1'), os.getenv('REDIS_PORT', 6379))
+        self.redis = redis_client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.redis.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def update(self, key: str, func: Callable[[Optional[Any]], Any], ttl: float = None) -> Any:
+        """通过 WATCH/MULTI 乐观锁实现原子的读-改-写，冲突时重试；ttl 不为空时由 Redis 在 ttl 秒后删除 key"""
+        from redis.exceptions import WatchError
+
+        full_key = self.prefix + key
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(full_key)
+                    current = pipe.get(full_key)
+                    value = func(json.loads(current) if current is not None else None)
+                    pipe.multi()
+                    pipe.set(full_key, json.dumps(value), ex=math.ceil(ttl) if ttl else None)
+                    pipe.execute()
+                    return value
+                except WatchError:
+                    continue
+
+
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """获取进程内共享的状态存储：QUEUE_DRIVER=rq 时使用 Redis，否则使用本地文件"""
+    global _state_store
+    if _state_store is None:
+        with _state_store_lock:
+            if _state_store is None:
+                if os.getenv('QUEUE_DRIVER', 'async') == 'rq':
+                    _state_store = RedisStateStore()
+                else:
+                    _state_store = FileStateStore()
+                logger.info(f"使用共享状态存储: {type(_state_store).__name__}")
+    return _state_store
@@ -0,0 +1,76 @@
+from unittest import TestCase, main
+
+from biz.utils.code_parser import GitDiffParser
+from biz.utils.diff_parser import count_changes, first_hunk, iter_file_diffs, parse_hunks, strip_line_numbers
+
+DIFF = (
+    "@@ -1,3 +1,4 @@ def main():\n"
+    " a = 1\n"
+    "-b = 2\n"
+    "+b = 3\n"
+    "+c = '@@ not a header'\n"
+    " d = 4\n"
+    "@@ -10 +11 @@\n"
+    "-x = 1\n"
+    "+x = 2\n"
+    "\\ No newline at end of file\n"
+)
+
+
+class TestDiffParser(TestCase):
+    def test_parse_hunks(self):
+        first, second = parse_hunks(DIFF)
+        self.assertEqual((first.old_start, first.old_count, first.new_start, first.new_count), (1, 3, 1, 4))
+        self.assertEqual(first.section, 'def main():')
+        self.assertEqual(first.removed, {2: 'b = 2'})
+        self.assertEqual(first.added, {2: 'b = 3', 3: "c = '@@ not a header'"})
+        self.assertEqual(first.first_added_line, 2)
+        # 省略行数的头部
+        self.assertEqual((second.old_start, second.old_count, second.new_start, second.new_count), (10, 1, 11, 1))
+        self.assertEqual((second.additions, second.deletions), (1, 1))
+        self.assertEqual(first.text(DIFF) + second.text(DIFF), DIFF)
+        self.assertTrue(second.text(DIFF).startswith('@@ -10 +11 @@'))
+
+    def test_count_changes(self):
+        self.assertEqual(count_changes(DIFF), (3, 2))
+        self.assertEqual(count_changes(''), (0, 0))
+        self.assertEqual(count_changes(None), (0, 0))
+
+    def test_hunk_lines(self):
+        first, _ = parse_hunks(DIFF)
+        self.assertEqual(list(first.lines(DIFF)),
+                         [(' ', 'a = 1'), ('-', 'b = 2'), ('+', 'b = 3'), ('+', "c = '@@ not a header'"),
+                          (' ', 'd = 4')])
+
+    def test_first_hunk(self):
+        hunk = first_hunk(DIFF)
+        self.assertEqual((hunk.new_start, hunk.new_count, hunk.additions, hunk.deletions), (1, 4, 2, 1))
+        self.assertIsNone(first_hunk(''))
+
+    def test_strip_line_numbers(self):
+        stripped = strip_line_numbers(DIFF)
+        self.assertTrue(stripped.startswith('@@ def main():\n a = 1\n'))
+        self.assertIn(" d = 4\n@@\n-x = 1", stripped)
+        # 行号变化后结果不变
+        self.assertEqual(strip_line_numbers(DIFF.replace('@@ -10 +11 @@', '@@ -20,1 +25,1 @@')), stripped)
+
+    def test_iter_file_diffs(self):
+        output = (
+            "diff --git a/new.py b/new.py\nnew file mode 100644\nindex 0000000..1111111\n"
+            "--- /dev/null\n+++ b/new.py\n@@ -0,0 +1,2 @@\n+a = 1\n+b = 2\n"
+            "diff --git a/old.py b/old.py\nindex 2222222..3333333 100644\n--- a/old.py\n+++ b/old.py\n" + DIFF
+        )
+        new_file, old_file = iter_file_diffs(output)
+        self.assertTrue(new_file.new_file)
+        self.assertEqual((new_file.old_path, new_file.additions, new_file.deletions), ('new.py', 2, 0))
+        self.assertEqual(old_file.to_dict(output)['diff'], DIFF)
+        self.assertEqual((old_file.additions, old_file.deletions), (3, 2))
+
+    def test_git_diff_parser(self):
+        parser = GitDiffParser(DIFF)
+        self.assertEqual(parser.get_old_code(), 'b = 2\nx = 1')
+        self.assertEqual(parser.get_new_code(), "b = 3\nc = '@@ not a header'\nx = 2")
+
+
+if __name__ == '__main__':
+    main()
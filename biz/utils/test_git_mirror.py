@@ -0,0 +1,130 @@
+import os
+import subprocess
+import tempfile
+import time
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.git_mirror import GitMirror, GitMirrorCache, GitMirrorError, mirror_lock
+
+
+def git(cwd: str, *args: str) -> str:
+    env = dict(os.environ, GIT_AUTHOR_NAME='test', GIT_AUTHOR_EMAIL='test@example.com',
+               GIT_COMMITTER_NAME='test', GIT_COMMITTER_EMAIL='test@example.com')
+    return subprocess.run(['git', *args], cwd=cwd, env=env, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def write(repo: str, path: str, content: str):
+    full_path = os.path.join(repo, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+class TestGitMirror(TestCase):
+    """使用本地仓库模拟 GitLab 的 MR：main 为目标分支，refs/merge-requests/1/head 为 MR 的 head"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.origin = os.path.join(self.tmp.name, 'origin')
+        os.makedirs(self.origin)
+        git(self.origin, 'init', '--quiet', '--initial-branch=main')
+        write(self.origin, 'app/main.py', 'def add(a, b):\n    return a + b\n')
+        write(self.origin, 'app/old_name.py', 'VALUE = 1\n')
+        write(self.origin, 'README.md', '# demo\n')
+        git(self.origin, 'add', '-A')
+        git(self.origin, 'commit', '--quiet', '-m', 'init')
+        self.base_sha = git(self.origin, 'rev-parse', 'HEAD')
+
+        git(self.origin, 'checkout', '--quiet', '-b', 'feature')
+        write(self.origin, 'app/main.py', 'def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n')
+        write(self.origin, 'app/new file.py', 'print("hello")\n')
+        git(self.origin, 'mv', 'app/old_name.py', 'app/new_name.py')
+        git(self.origin, 'rm', '--quiet', 'README.md')
+        git(self.origin, 'add', '-A')
+        git(self.origin, 'commit', '--quiet', '-m', 'feature')
+        self.head_sha = git(self.origin, 'rev-parse', 'HEAD')
+        git(self.origin, 'update-ref', 'refs/merge-requests/1/head', self.head_sha)
+        git(self.origin, 'checkout', '--quiet', 'main')
+
+        self.cache = GitMirrorCache(root=os.path.join(self.tmp.name, 'mirrors'), quota_bytes=1024 * 1024 * 1024)
+        self.mirror = self.cache.mirror('project_1', self.origin)
+        self.cache.fetch_merge_request(self.mirror, 1, 'main', shas=[self.head_sha, self.base_sha])
+
+    def tearDown(self):
+        self.mirror.close()
+        self.tmp.cleanup()
+
+    def test_diff(self):
+        diffs = {item['new_path']: item for item in self.mirror.diff(self.base_sha, self.head_sha)}
+        self.assertEqual(set(diffs), {'app/main.py', 'app/new file.py', 'app/new_name.py', 'README.md'})
+        self.assertTrue(diffs['app/main.py']['diff'].startswith('@@ -1,2 +1,6 @@'))
+        self.assertIn('+def sub(a, b):', diffs['app/main.py']['diff'])
+        self.assertTrue(diffs['app/new file.py']['new_file'])
+        self.assertTrue(diffs['README.md']['deleted_file'])
+        self.assertTrue(diffs['app/new_name.py']['renamed_file'])
+        self.assertEqual(diffs['app/new_name.py']['old_path'], 'app/old_name.py')
+        self.assertEqual(diffs['app/new_name.py']['diff'], '')
+
+    def test_file_content(self):
+        self.assertIn('def sub', self.mirror.file_content(self.head_sha, 'app/main.py'))
+        self.assertEqual(self.mirror.file_content(self.head_sha, 'app/new file.py'), 'print("hello")\n')
+        self.assertIsNone(self.mirror.file_content(self.head_sha, 'README.md'))
+        self.assertEqual(self.mirror.file_content(self.base_sha, 'README.md'), '# demo\n')
+
+    def test_file_content_unknown_ref(self):
+        """ref 不存在时不能当作文件不存在返回 None"""
+        with self.assertRaises(GitMirrorError):
+            self.mirror.file_content('0' * 40, 'app/main.py')
+
+    def test_token_not_in_argv(self):
+        mirror = GitMirror(self.mirror.path, self.origin, token='secret-token', ssl_verify=False)
+        with patch('biz.utils.git_mirror.subprocess.run', wraps=subprocess.run) as run:
+            self.assertTrue(mirror.has_commit(self.head_sha))
+        command, env = run.call_args.args[0], run.call_args.kwargs['env']
+        self.assertFalse(any('secret' in arg or 'extraHeader' in arg for arg in command))
+        configs = {env[f'GIT_CONFIG_KEY_{index}']: env[f'GIT_CONFIG_VALUE_{index}']
+                   for index in range(int(env['GIT_CONFIG_COUNT']))}
+        self.assertTrue(configs['http.extraHeader'].startswith('Authorization: Basic '))
+        self.assertEqual(configs['http.sslVerify'], 'false')
+
+    def test_incremental_fetch(self):
+        git(self.origin, 'checkout', '--quiet', 'feature')
+        write(self.origin, 'app/main.py', 'def add(a, b):\n    return b + a\n')
+        git(self.origin, 'commit', '--quiet', '-am', 'update')
+        new_head = git(self.origin, 'rev-parse', 'HEAD')
+        git(self.origin, 'update-ref', 'refs/merge-requests/1/head', new_head)
+
+        self.assertFalse(self.mirror.has_commit(new_head))
+        self.cache.fetch_merge_request(self.mirror, 1, 'main', shas=[new_head])
+        diffs = self.mirror.diff(self.head_sha, new_head)
+        self.assertEqual([item['new_path'] for item in diffs], ['app/main.py'])
+
+    def test_unknown_commit(self):
+        with self.assertRaises(GitMirrorError):
+            self.mirror.diff(self.base_sha, '0' * 40)
+
+    def test_lru_eviction(self):
+        other = self.cache.mirror('project_2', self.origin)
+        self.cache.fetch_merge_request(other, 1, 'main')
+        other.close()
+        # project_2 最近使用，配额只够保留一个 mirror 时删除 project_1
+        time.sleep(0.01)
+        self.cache.touch(other)
+        self.cache.quota_bytes = GitMirrorCache._dir_size(other.path)
+        evicted = self.cache.evict(keep=other.path)
+        self.assertEqual(evicted, [self.mirror.path])
+        self.assertFalse(os.path.exists(self.mirror.path))
+        self.assertTrue(os.path.exists(other.path))
+
+    def test_eviction_skips_mirror_being_read(self):
+        other = self.cache.mirror('project_2', self.origin)
+        self.cache.touch(other)
+        self.cache.quota_bytes = 0
+        with mirror_lock(self.mirror.path, shared=True):
+            self.assertEqual(self.cache.evict(keep=other.path), [])
+        self.assertTrue(os.path.exists(self.mirror.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.http_cache import HttpResponseCache
+from biz.utils.http_session import HttpClient
+
+
+class MockServer(BaseHTTPRequestHandler):
+    """带 ETag 的本地接口：If-None-Match 与当前 ETag 一致时返回 304"""
+    protocol_version = 'HTTP/1.1'
+    etag = 'W/"v1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('X-RateLimit-Remaining', '4999')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'path': self.path, 'etag': self.etag}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpResponseCache(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockServer)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = HttpResponseCache(db_file=os.path.join(self.tmp.name, 'http_cache.db'),
+                                       ttl_seconds=3600, max_bytes=1024 * 1024)
+        patcher = patch('biz.utils.http_session.get_http_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = HttpClient('test', verify_env='TEST_SSL_VERIFY')
+        MockServer.etag = 'W/"v1"'
+        MockServer.requests = []
+
+    def tearDown(self):
+        self.client.close()
+        self.tmp.cleanup()
+
+    def test_not_modified_served_from_cache(self):
+        first = self.client.get(f"{self.base_url}/branches", headers={'PRIVATE-TOKEN': 'a'})
+        second = self.client.get(f"{self.base_url}/branches", headers={'PRIVATE-TOKEN': 'a'})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second.headers['X-RateLimit-Remaining'], '4999')
+        self.assertEqual(MockServer.requests, [None, 'W/"v1"'])
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_changed_resource_refreshes_cache(self):
+        self.client.get(f"{self.base_url}/branches")
+        MockServer.etag = 'W/"v2"'
+        response = self.client.get(f"{self.base_url}/branches")
+        self.assertEqual(response.json()['etag'], 'W/"v2"')
+        self.assertEqual(self.client.get(f"{self.base_url}/branches").json()['etag'], 'W/"v2"')
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_token_and_params_are_part_of_key(self):
+        self.client.get(f"{self.base_url}/branches", headers={'PRIVATE-TOKEN': 'a'})
+        self.client.get(f"{self.base_url}/branches", headers={'PRIVATE-TOKEN': 'b'})
+        self.client.get(f"{self.base_url}/branches", params={'page': 2}, headers={'PRIVATE-TOKEN': 'a'})
+        self.assertEqual(MockServer.requests, [None, None, None])
+
+    def test_size_cap_evicts_least_recently_used(self):
+        self.client.get(f"{self.base_url}/a")
+        entry_size = len(self.client.get(f"{self.base_url}/b", cache=False).content)
+        self.cache.max_bytes = entry_size * 2
+        self.client.get(f"{self.base_url}/b")
+        self.client.get(f"{self.base_url}/c")
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertIsNone(self.cache.lookup(self.cache.make_key(f"{self.base_url}/a")))
+        self.assertIsNotNone(self.cache.lookup(self.cache.make_key(f"{self.base_url}/c")))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import os
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.hunk_classifier import COMMENT, VERSION_BUMP, WHITESPACE, TrivialHunkFilter
+
+
+def hunk(path: str, diff: str) -> dict:
+    return {'new_path': path, 'old_path': path, 'diff': diff}
+
+
+class TestTrivialHunkFilter(TestCase):
+    def setUp(self):
+        with patch.dict(os.environ, {'TRIVIAL_HUNK_FILTER_ENABLED': '1'}):
+            self.filter = TrivialHunkFilter()
+
+    def test_pointer_dereference_is_not_comment(self):
+        c_diff = "@@ -1,3 +1,3 @@ void reset(int *count)\n {\n-    *count = 0;\n+    *count = limit;\n }\n"
+        self.assertIsNone(self.filter.classify(hunk('counter.c', c_diff)))
+        go_diff = "@@ -1 +1 @@\n-*p = x\n+*p = y\n"
+        self.assertIsNone(self.filter.classify(hunk('main.go', go_diff)))
+
+    def test_block_comment(self):
+        diff = "@@ -1,4 +1,4 @@\n /**\n- * 旧的说明\n+ * 新的说明\n  */\n int a = 1;\n"
+        self.assertEqual(self.filter.classify(hunk('A.java', diff)), COMMENT)
+        # 改动点从块注释中间开始
+        diff = "@@ -5,3 +5,3 @@\n- * 旧的说明\n+ * 新的说明\n  */\n"
+        self.assertEqual(self.filter.classify(hunk('a.c', diff)), COMMENT)
+        # 块注释结束后同一行还有代码
+        diff = "@@ -1 +1 @@\n-/* a */ x = 1;\n+/* a */ x = 2;\n"
+        self.assertIsNone(self.filter.classify(hunk('a.js', diff)))
+        diff = "@@ -1 +1 @@\n-// old\n+// new\n"
+        self.assertEqual(self.filter.classify(hunk('a.ts', diff)), COMMENT)
+
+    def test_whitespace_inside_string_literal(self):
+        diff = '@@ -1 +1 @@\n-const s = "a b";\n+const s = "a  b";\n'
+        self.assertIsNone(self.filter.classify(hunk('a.js', diff)))
+        diff = '@@ -1 +1 @@\n-const s  =  "a b";\n+const s = "a b";\n'
+        self.assertEqual(self.filter.classify(hunk('a.js', diff)), WHITESPACE)
+
+    def test_version_bump(self):
+        diff = '@@ -1 +1 @@\n-__version__ = "1.2.3"\n+__version__ = "1.2.4"\n'
+        self.assertEqual(self.filter.classify(hunk('version.py', diff)), VERSION_BUMP)
+        diff = '@@ -1 +1 @@\n-<version>1.0.0-SNAPSHOT</version>\n+<version>1.0.1</version>\n'
+        self.assertEqual(self.filter.classify(hunk('pom.xml', diff)), VERSION_BUMP)
+        diff = '@@ -1 +1 @@\n-VERSION = OLD\n+VERSION = NEW\n'
+        self.assertIsNone(self.filter.classify(hunk('settings.py', diff)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+from unittest import TestCase, main
+
+from biz.utils.language_detector import detect_language, detect_language_from_content
+
+
+class TestLanguageDetector(TestCase):
+    def test_changes(self):
+        changes = [{'new_path': 'a.py'}, {'new_path': 'b.py'}, {'new_path': 'c.vue'}, {'old_path': 'd.txt'}]
+        self.assertEqual(detect_language(changes), 'python')
+        self.assertEqual(detect_language([{'new_path': 'api.proto'}]), 'protobuf')
+        self.assertEqual(detect_language([{'new_path': 'values.yml'}]), 'yaml')
+        self.assertEqual(detect_language([]), 'default')
+
+    def test_diff_text(self):
+        diff = ("diff --git a/web/App.vue b/web/App.vue\n--- a/web/App.vue\n+++ b/web/App.vue\n@@ -1 +1 @@\n-a\n+b\n"
+                "diff --git a/main.go b/main.go\n--- a/main.go\n+++ b/main.go\n@@ -1 +1 @@\n-a\n+b\n"
+                "diff --git a/util.go b/util.go\n--- a/util.go\n+++ b/util.go\n@@ -1 +1 @@\n-a\n+b\n")
+        self.assertEqual(detect_language(diff), 'go')
+        self.assertEqual(detect_language("--- a/x.java\n+++ b/x.java\n@@ -1 +1 @@\n-a\n+b\n"), 'java')
+
+    def test_content(self):
+        self.assertEqual(detect_language_from_content("def main():\n    return 1"), 'python')
+        self.assertEqual(detect_language_from_content("def f(): pass\nconst a = () => 1"), 'javascript')
+        self.assertEqual(detect_language_from_content("const a = 1\n<template><div/></template>"), 'vue')
+        self.assertEqual(detect_language_from_content("SELECT 1"), 'default')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase, main
+
+from biz.utils.leased_semaphore import LeasedSemaphore
+from biz.utils.shared_state import FileStateStore
+
+
+class TestLeasedSemaphore(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = FileStateStore(os.path.join(self.tmp.name, 'state.json'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_shared_between_instances(self):
+        """两个实例（相当于两个 worker 进程）共用同一个上限"""
+        first = LeasedSemaphore('llm', 2, store=self.store)
+        second = LeasedSemaphore('llm', 2, store=self.store)
+        lease = first.try_acquire()
+        self.assertIsNotNone(lease)
+        self.assertIsNotNone(second.try_acquire())
+        self.assertIsNone(first.try_acquire())
+        first.release(lease)
+        self.assertIsNotNone(second.try_acquire())
+        # 不同名称的信号量互不影响
+        self.assertIsNotNone(LeasedSemaphore('other', 1, store=self.store).try_acquire())
+
+    def test_expired_lease_reclaimed(self):
+        semaphore = LeasedSemaphore('llm', 1, lease_seconds=0.1, store=self.store)
+        self.assertIsNotNone(semaphore.try_acquire())
+        self.assertIsNone(semaphore.try_acquire())
+        time.sleep(0.15)
+        self.assertIsNotNone(semaphore.try_acquire())
+
+    def test_hold_limits_concurrency(self):
+        semaphore = LeasedSemaphore('llm', 2, store=self.store)
+        running, peak = 0, 0
+        lock = threading.Lock()
+
+        def work():
+            nonlocal running, peak
+            with semaphore.hold():
+                with lock:
+                    running += 1
+                    peak = max(peak, running)
+                time.sleep(0.05)
+                with lock:
+                    running -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak, 2)
+        self.assertEqual(self.store.get('semaphore:llm'), {'leases': {}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+from unittest import TestCase, main
+
+from biz.utils.protected_branches import ProtectedBranchCache, compile_branch_patterns
+
+
+class TestProtectedBranchCache(TestCase):
+    def setUp(self):
+        self.loads = 0
+        self.patterns = ['main', 'release/*', 'hotfix-?']
+
+    def loader(self):
+        self.loads += 1
+        return self.patterns
+
+    def test_compile_patterns(self):
+        compiled = compile_branch_patterns(self.patterns)
+        self.assertTrue(compiled.match('main'))
+        self.assertTrue(compiled.match('release/1.0'))
+        self.assertTrue(compiled.match('hotfix-1'))
+        self.assertFalse(compiled.match('main2'))
+        self.assertFalse(compiled.match('feature/release/1.0'))
+        self.assertIsNone(compile_branch_patterns([]))
+
+    def test_cached_until_invalidated(self):
+        cache = ProtectedBranchCache(ttl_seconds=300)
+        key = ('https://gitlab.example.com', 1)
+        self.assertTrue(cache.is_protected(key, 'release/2.0', self.loader))
+        self.assertFalse(cache.is_protected(key, 'dev', self.loader))
+        self.assertEqual(self.loads, 1)
+
+        self.patterns = ['dev']
+        cache.invalidate(key)
+        self.assertTrue(cache.is_protected(key, 'dev', self.loader))
+        self.assertEqual(self.loads, 2)
+
+    def test_expired(self):
+        cache = ProtectedBranchCache(ttl_seconds=0)
+        key = ('https://gitlab.example.com', 1)
+        cache.is_protected(key, 'main', self.loader)
+        cache.is_protected(key, 'main', self.loader)
+        self.assertEqual(self.loads, 2)
+
+    def test_no_protected_branches_cached(self):
+        cache = ProtectedBranchCache(ttl_seconds=300)
+        key = ('https://gitlab.example.com', 1)
+        self.patterns = []
+        self.assertFalse(cache.is_protected(key, 'main', self.loader))
+        self.assertFalse(cache.is_protected(key, 'main', self.loader))
+        self.assertEqual(self.loads, 1)
+
+    def test_load_failure_keeps_previous_rules(self):
+        cache = ProtectedBranchCache(ttl_seconds=0)
+        key = ('https://gitlab.example.com', 1)
+        self.assertTrue(cache.is_protected(key, 'main', self.loader))
+        self.assertTrue(cache.is_protected(key, 'main', lambda: None))
+        self.assertFalse(cache.is_protected(('https://gitlab.example.com', 2), 'main', lambda: None))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.http_session import HttpClient
+from biz.utils.rate_limiter import RateLimiter
+from biz.utils.shared_state import FileStateStore
+
+
+class MockServer(BaseHTTPRequestHandler):
+    """前 limited 次请求返回 429（Retry-After: 1），之后返回 200"""
+    protocol_version = 'HTTP/1.1'
+    limited = 0
+    calls = []
+
+    def _respond(self):
+        self.calls.append((self.command, time.monotonic()))
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if len(self.calls) <= self.limited:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+        else:
+            self.send_response(200)
+            self.send_header('RateLimit-Remaining', '1999')
+            self.send_header('RateLimit-Reset', str(int(time.time()) + 60))
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRateLimiter(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = FileStateStore(os.path.join(self.tmp.name, 'state.json'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_token_bucket(self):
+        limiter = RateLimiter(store=self.store, rate=10, burst=2)
+        self.assertEqual(limiter.reserve_token('gitlab.example.com'), 0)
+        self.assertEqual(limiter.reserve_token('gitlab.example.com'), 0)
+        self.assertGreater(limiter.reserve_token('gitlab.example.com'), 0)
+        # 不同 host 的令牌桶互不影响
+        self.assertEqual(limiter.reserve_token('api.github.com'), 0)
+        started_at = time.monotonic()
+        limiter.acquire('gitlab.example.com')
+        self.assertGreater(time.monotonic() - started_at, 0.05)
+
+    def test_shared_between_limiters(self):
+        """不同进程中的限流器通过共享存储看到同一个令牌桶"""
+        RateLimiter(store=self.store, rate=1, burst=1).reserve_token('gitlab.example.com')
+        other = RateLimiter(store=FileStateStore(self.store.state_file), rate=1, burst=1)
+        self.assertGreater(other.reserve_token('gitlab.example.com'), 0.5)
+
+    def test_low_remaining_blocks_until_reset(self):
+        limiter = RateLimiter(store=self.store, reserve=10)
+        reset_at = time.time() + 30
+        limiter.observe('api.github.com', 200, {'X-RateLimit-Remaining': '3', 'X-RateLimit-Reset': str(reset_at)})
+        self.assertGreater(limiter.reserve_token('api.github.com'), 25)
+
+    def test_remaining_quota_spread_until_reset(self):
+        limiter = RateLimiter(store=self.store, rate=100, burst=1)
+        limiter.observe('gitlab.example.com', 200, {'RateLimit-Remaining': '100', 'RateLimit-Reset': '50'})
+        self.assertAlmostEqual(self.store.get('rate_limit:gitlab.example.com')['rate'], 2, delta=0.1)
+
+    def test_retry_after(self):
+        limiter = RateLimiter(store=self.store)
+        limiter.observe('gitlab.example.com', 429, {'Retry-After': '5'})
+        self.assertGreater(limiter.reserve_token('gitlab.example.com'), 4)
+
+
+    def test_local_batch(self):
+        """一次从共享存储预取多个令牌，之后在本进程内消耗"""
+        limiter = RateLimiter(store=self.store, rate=1, burst=10, batch=5)
+        for _ in range(5):
+            self.assertEqual(limiter.reserve_token('gitlab.example.com'), 0)
+        self.assertAlmostEqual(self.store.get('rate_limit:gitlab.example.com')['tokens'], 5, delta=0.1)
+        self.assertEqual(limiter.reserve_token('gitlab.example.com'), 0)
+        self.assertAlmostEqual(self.store.get('rate_limit:gitlab.example.com')['tokens'], 0, delta=0.1)
+
+    def test_observe_without_change_skips_store(self):
+        limiter = RateLimiter(store=self.store, rate=10, reserve=10)
+        limiter.observe('gitlab.example.com', 200, {'RateLimit-Remaining': '1999', 'RateLimit-Reset': '60'})
+        self.assertIsNone(self.store.get('rate_limit:gitlab.example.com'))
+
+    def test_expired_state_pruned(self):
+        limiter = RateLimiter(store=self.store)
+        with patch.object(RateLimiter, 'STATE_TTL', 0.05):
+            limiter.reserve_token('gitlab.example.com')
+        time.sleep(0.1)
+        self.assertIsNone(self.store.get('rate_limit:gitlab.example.com'))
+        limiter.reserve_token('api.github.com')
+        self.assertNotIn('rate_limit:gitlab.example.com', self.store._read())
+
+
+class TestHttpClientRateLimit(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), MockServer)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/api/v4/projects/1/notes"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.limiter = RateLimiter(store=FileStateStore(os.path.join(self.tmp.name, 'state.json')))
+        patcher = patch('biz.utils.http_session.get_rate_limiter', return_value=self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = HttpClient('test', verify_env='TEST_SSL_VERIFY')
+        MockServer.calls = []
+
+    def tearDown(self):
+        self.client.close()
+        self.tmp.cleanup()
+
+    def test_post_waits_and_retries_on_429(self):
+        MockServer.limited = 1
+        response = self.client.post(self.url, json={'body': 'hello'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(MockServer.calls), 2)
+        self.assertGreaterEqual(MockServer.calls[1][1] - MockServer.calls[0][1], 0.9)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from biz.utils.token_util import (EstimateTokenizer, TokenizerRegistry, TransformersTokenizer, estimate_tokens,
+                                  get_tokenizer)
+
+
+class TestTokenUtil(TestCase):
+    def test_estimate(self):
+        tokenizer = EstimateTokenizer(chars_per_token=4)
+        self.assertEqual(tokenizer.count(''), 0)
+        self.assertEqual(tokenizer.count('abcdefgh'), 2)
+        self.assertEqual(tokenizer.count('abcd中文'), 3)
+        self.assertEqual(estimate_tokens('x' * 400), 100)
+
+    def test_estimate_truncate(self):
+        tokenizer = EstimateTokenizer(chars_per_token=4)
+        text = 'abcd' * 10 + '中文' * 10
+        self.assertEqual(tokenizer.truncate(text, 100), text)
+        self.assertEqual(tokenizer.truncate(text, 5), 'abcd' * 5)
+        self.assertEqual(tokenizer.truncate(text, 12), 'abcd' * 10 + '中文')
+
+    def test_registry_caches_per_model(self):
+        registry = TokenizerRegistry()
+        with patch.object(TokenizerRegistry, '_create', side_effect=lambda provider, model: EstimateTokenizer()) \
+                as create:
+            first = registry.get('openai', 'gpt-4o-mini')
+            self.assertIs(registry.get('openai', 'gpt-4o-mini'), first)
+            self.assertIsNot(registry.get('qwen', 'qwen-turbo'), first)
+            self.assertEqual(create.call_count, 2)
+
+    def test_qwen_tokenizer_fallback(self):
+        with patch.dict('os.environ', {'QWEN_TOKENIZER': '/nonexistent/qwen-tokenizer'}), \
+                patch.object(TransformersTokenizer, '__init__', side_effect=OSError('not found')) as load, \
+                patch('tiktoken.get_encoding', side_effect=ConnectionError('offline')):
+            tokenizer = TokenizerRegistry().get('qwen', 'qwen-turbo')
+        load.assert_called_once_with('/nonexistent/qwen-tokenizer')
+        self.assertIsInstance(tokenizer, EstimateTokenizer)
+
+    def test_default_provider(self):
+        with patch.dict('os.environ', {'LLM_PROVIDER': 'deepseek', 'DEEPSEEK_API_MODEL': 'deepseek-chat'}), \
+                patch('biz.utils.token_util.tokenizer_registry') as registry:
+            get_tokenizer()
+        registry.get.assert_called_once_with('deepseek', 'deepseek-chat')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,212 @@
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
 import tiktoken
 
+from biz.utils.log import logger
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class Tokenizer:
+    """分词器：count、truncate 基于 encode、decode 实现"""
+    name = ''
+
+    def encode(self, text: str) -> List[int]:
+        raise NotImplementedError
+
+    def decode(self, tokens: List[int]) -> str:
+        raise NotImplementedError
+
+    def count(self, text: str) -> int:
+        return len(self.encode(text)) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encode(text)
+        if len(tokens) > max_tokens:
+            return self.decode(tokens[:max_tokens])
+        return text
+
+
+class TiktokenTokenizer(Tokenizer):
+    """OpenAI 系列模型的 tiktoken 编码，其他没有专门分词器的模型也使用 cl100k_base 近似"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self.name = encoding.name
+
+    def encode(self, text: str) -> List[int]:
+        # diff 中可能包含 <|endoftext|> 等特殊 token 的字面量，按普通文本处理
+        return self.encoding.encode(text, disallowed_special=())
+
+    def decode(self, tokens: List[int]) -> str:
+        return self.encoding.decode(tokens)
+
+
+class TransformersTokenizer(Tokenizer):
+    """transformers 的分词器（如 Qwen），transformers 导入、分词器加载较慢，只在首次使用时加载"""
+
+    def __init__(self, name_or_path: str):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+        self.name = name_or_path
+
+    def encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def decode(self, tokens: List[int]) -> str:
+        return self.tokenizer.decode(tokens)
+
+
+class EstimateTokenizer(Tokenizer):
+    """按字符估算 token 数，不做分词；编码表无法加载时作为回退，也用于只需大致数量的预算判断"""
+    name = 'estimate'
+
+    def __init__(self, chars_per_token: float = None):
+        self.chars_per_token = chars_per_token or float(os.getenv('TOKEN_ESTIMATE_CHARS_PER_TOKEN', 4))
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        # ASCII（英文、代码）约 chars_per_token 个字符一个 token，中文等其他字符约一个字符一个 token
+        ascii_chars = len(text.encode('ascii', 'ignore'))
+        return math.ceil(ascii_chars / self.chars_per_token) + len(text) - ascii_chars
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        # 估算值随前缀长度单调递增，二分查找不超过 max_tokens 的最长前缀
+        low, high = 0, min(len(text), math.ceil(max_tokens * self.chars_per_token))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
 
-def count_tokens(text: str) -> int:
+class TokenizerRegistry:
+    """
+    进程级的分词器注册表，key 为 (provider, model)，首次使用时加载，之后复用
+        1. Qwen（provider 为 qwen 或模型名以 qwen 开头）且配置了 QWEN_TOKENIZER 时，使用 transformers 加载对应分词器
+        2. 其他模型使用 tiktoken.encoding_for_model，未知模型使用 cl100k_base
+        3. 分词器加载失败（如无法下载编码表）时回退到按字符估算，并记录日志
+    """
+
+    def __init__(self):
+        self._tokenizers: Dict[Tuple[str, str], Tokenizer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str = None, model: str = None) -> Tokenizer:
+        key = (provider or '', model or '')
+        tokenizer = self._tokenizers.get(key)
+        if tokenizer is None:
+            with self._lock:
+                tokenizer = self._tokenizers.get(key)
+                if tokenizer is None:
+                    tokenizer = self._create(*key)
+                    logger.info(f"加载分词器: provider={key[0]}, model={key[1]} -> {tokenizer.name}")
+                    self._tokenizers[key] = tokenizer
+        return tokenizer
+
+    @staticmethod
+    def _create(provider: str, model: str) -> Tokenizer:
+        qwen_tokenizer = os.getenv('QWEN_TOKENIZER', '')
+        if qwen_tokenizer and (provider == 'qwen' or model.lower().startswith('qwen')):
+            try:
+                return TransformersTokenizer(qwen_tokenizer)
+            except Exception as e:
+                logger.warn(f"加载 Qwen 分词器 {qwen_tokenizer} 失败，使用 tiktoken: {e}")
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding(DEFAULT_ENCODING)
+            except KeyError:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            return TiktokenTokenizer(encoding)
+        except Exception as e:
+            logger.warn(f"加载 tiktoken 编码表失败，按字符估算 token 数: {e}")
+            return EstimateTokenizer()
+
+    def clear(self):
+        with self._lock:
+            self._tokenizers.clear()
+
+
+tokenizer_registry = TokenizerRegistry()
+_estimator = EstimateTokenizer()
+
+
+def get_tokenizer(provider: str = None, model: str = None) -> Tokenizer:
+    """获取模型对应的分词器，不传 provider、model 时使用当前配置的 LLM（LLM_PROVIDER 及其模型）"""
+    if provider is None and model is None:
+        # 延迟导入，避免与 LLM 客户端循环引用
+        from biz.llm.factory import Factory
+
+        provider, model = Factory.registry_key()
+    return tokenizer_registry.get(provider, model)
+
+
+def count_tokens(text: str, provider: str = None, model: str = None) -> int:
     """
     计算文本的 token 数量。
 
     Args:
         text (str): 输入文本。
+        provider (str): LLM 供应商，默认为当前配置的 LLM_PROVIDER。
+        model (str): 模型名称，默认为当前供应商配置的模型。
 
     Returns:
         int: token 数量。
     """
-    encoding = tiktoken.get_encoding("cl100k_base")  # 适用于 OpenAI GPT 系列
-    return len(encoding.encode(text))
+    return get_tokenizer(provider, model).count(text)
+
+
+def token_estimate_exact() -> bool:
+    """TOKEN_ESTIMATE_MODE=exact 时 estimate_tokens 使用当前模型的分词器计算"""
+    return os.getenv('TOKEN_ESTIMATE_MODE', 'chars') == 'exact'
+
+
+def token_estimate_label() -> str:
+    """estimate_tokens 的计算方式，用于日志、评论中标明 token 数是否为估算值"""
+    return "分词器计数" if token_estimate_exact() else "按字符估算"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数量，不做分词，用于批量合并、预算等只需要大致数量的判断。
+    TOKEN_ESTIMATE_MODE=exact 时改为使用当前模型的分词器精确计算。
+    """
+    if token_estimate_exact():
+        return count_tokens(text)
+    return _estimator.count(text)
 
 
-def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: str = "cl100k_base") -> str:
+def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: Optional[str] = None,
+                            provider: str = None, model: str = None) -> str:
     """
     根据最大 token 数量截断文本。
 
     Args:
         text (str): 需要截断的原始文本。
         max_tokens (int): 最大 token 数量。
-        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
+        encoding_name (str): 指定 tiktoken 编码器名称（如 "cl100k_base"），不指定时使用模型对应的分词器。
+        provider (str): LLM 供应商，默认为当前配置的 LLM_PROVIDER。
+        model (str): 模型名称，默认为当前供应商配置的模型。
 
     Returns:
         str: 截断后的文本。
     """
-    # 获取编码器
-    encoding = tiktoken.get_encoding(encoding_name)
-
-    # 将文本编码为 tokens
-    tokens = encoding.encode(text)
-
-    # 如果 tokens 数量超过最大限制，则截断
-    if len(tokens) > max_tokens:
-        truncated_tokens = tokens[:max_tokens]
-        truncated_text = encoding.decode(truncated_tokens)
-        return truncated_text
-
-    return text
+    if encoding_name:
+        tokenizer = TiktokenTokenizer(tiktoken.get_encoding(encoding_name))
+    else:
+        tokenizer = get_tokenizer(provider, model)
+    return tokenizer.truncate(text, max_tokens)
 
 if __name__ == '__main__':
     text = "Hello, world! This is a test text for token counting."
     print(count_tokens(text))  # 输出：11
-    print(truncate_text_by_tokens(text, 5))  # 输出："Hello, world!"
\ No newline at end of file
+    print(truncate_text_by_tokens(text, 5))  # 输出："Hello, world!"
@@ -0,0 +1,15 @@
+"""
+pytest 公共配置：共享状态文件、HTTP 缓存、review 缓存与日志写到临时目录，运行测试不在仓库目录中生成运行时文件
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix='ai-codereview-test-')
+atexit.register(shutil.rmtree, _tmp_dir, True)
+
+os.environ['SHARED_STATE_FILE'] = os.path.join(_tmp_dir, 'shared_state.json')
+os.environ['HTTP_CACHE_DB'] = os.path.join(_tmp_dir, 'http_cache.db')
+os.environ['REVIEW_CACHE_DB'] = os.path.join(_tmp_dir, 'review_cache.db')
+os.environ['LOG_FILE'] = os.path.join(_tmp_dir, 'app.log')